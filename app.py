@@ -1,8 +1,9 @@
 import os
+import json
 from log_config import setup_logging
 import logging
 
-from flask import Flask, render_template, redirect, url_for, request, session, flash, send_file
+from flask import Flask, Response, render_template, redirect, url_for, request, session, flash, send_file
 from werkzeug.utils import safe_join
 from dotenv import load_dotenv
 
@@ -13,8 +14,13 @@ load_dotenv()
 DOWNLOAD_FOLDER = os.path.abspath('result-files')
 
 from get_excel_data_curr.main import process
+from get_excel_data_curr.single_flight import query_flight, query_key
+from get_excel_data_curr.ConfigTool import ConfigTool
+from get_excel_data_curr.progress import END_STAGE, sse_stream
+from get_excel_data_curr import admission
 from database.db import Database
 from scheduler.scheduler import SchedulerManager
+from scheduler.query_jobs import QueryJobManager, estimate_cost
 from routes.admin import admin_bp
 from routes.auth import login_required
 
@@ -29,6 +35,10 @@ setup_logging()
 # 初始化数据库
 db = Database()
 
+# 页面查询后台任务（按用户公平调度，管理页面手动触发的任务也经过同一队列）
+query_jobs = QueryJobManager(db)
+app.config['QUERY_JOBS'] = query_jobs
+
 # 注册管理页面 Blueprint
 app.register_blueprint(admin_bp)
 
@@ -109,14 +119,58 @@ def query():
             data['buildings'] = [b for b in requested if b in allowed]
             if not data['buildings']:
                 return {'status': 'error', 'message': '没有可操作的楼栋权限'}
+        try:
+            cost = estimate_cost(data)
+        except (TypeError, ValueError):
+            return {'status': 'error', 'message': '日期格式错误，应为 YYYY-MM-DD'}, 400
         buildings = ','.join(data.get('buildings', []))
         db.create_operation_log(username, 'query', f'查询楼栋: {buildings}', request.remote_addr)
-        # 加工数据
-        result = process(data)
-        logging.debug(f"Processed result: {result}")
+        # 取数请求槽位和等待队列都已占满时直接返回繁忙，不再排队
+        busy = admission.busy_response()
+        if busy:
+            return busy, 503, {'Retry-After': str(busy['retry_after'])}
+        # 异步模式：提交后台任务后立即返回任务 ID，页面轮询 /jobs/<id>
+        if ConfigTool(db).get_query_async_enabled():
+            job_id = query_jobs.submit(username, data)
+            return {'status': 'queued', 'job_id': job_id}
+        # 加工数据（经按用户公平调度的队列执行；启用报表缓存时楼栋和时间窗口相同的并发请求共用一次执行结果）
+        key = query_key(data, ConfigTool(db).get_report_cache_enabled())
+        result, shared = query_jobs.scheduler.call(
+            username, lambda: query_flight.do(key, lambda: process(data)), cost=cost)
+        logging.debug(f"Processed result: {result}, shared: {shared}")
+        if result.get('status') == 'busy':
+            return result, 503, {'Retry-After': str(result['retry_after'])}
         return result
 
 
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    job = query_jobs.get(job_id)
+    # 只能查看自己提交的任务（管理员除外）
+    if not job or (job['username'] != session['username'] and session.get('role') != 'admin'):
+        return {'status': 'error', 'message': '任务不存在'}, 404
+    return {'status': 'success', 'job': job}
+
+
+@app.route('/jobs/<job_id>/events')
+@login_required
+def job_events(job_id):
+    """以 SSE 推送任务的实时进度（登录、分页取数、写入报表），任务结束时推送 end 事件后关闭"""
+    job = query_jobs.get(job_id)
+    if not job or (job['username'] != session['username'] and session.get('role') != 'admin'):
+        return {'status': 'error', 'message': '任务不存在'}, 404
+    if job['state'] in ('success', 'failed'):
+        # 已结束的任务（包括重启前结束的）直接推送结束事件
+        event = {'stage': END_STAGE, 'state': job['state'], 'message': job['message'], 'file_name': job['file_name']}
+        stream = iter([f"data: {json.dumps(event, ensure_ascii=False)}\n\n"])
+    else:
+        stream = sse_stream(job_id)
+    # X-Accel-Buffering 关闭 nginx 缓冲，事件到达即推送
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/download/<path:filename>')
 def download_file(filename):
     try:
@@ -147,6 +201,12 @@ def init_scheduler():
     return sm
 
 
+def init_query_jobs():
+    """重新入队上次服务停止时未完成的查询任务"""
+    return query_jobs.recover()
+
+
 if __name__ == '__main__':
     init_scheduler()
+    init_query_jobs()
     app.run(host='0.0.0.0', port=80)
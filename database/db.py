@@ -402,3 +402,164 @@ class Database:
         finally:
             conn.close()
 
+
+    # ==================== 出入记录缓存相关 ====================
+
+    def save_inout_records(self, building, rows):
+        """
+        保存楼栋的出入记录，(楼栋, 通行时间, 学号) 相同的记录只保留一条
+        :param rows: dict 或 InoutRecord 列表
+        :return: 新插入的记录数
+        """
+        values = [
+            (building, row['passTimeText'], str(row['userId']), json.dumps(dict(row), ensure_ascii=False))
+            for row in rows
+        ]
+        conn = self._get_conn()
+        try:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO inout_records (building, pass_time, user_id, record_json) VALUES (?, ?, ?, ?)",
+                values
+            )
+            conn.commit()
+            return conn.total_changes - before
+        finally:
+            conn.close()
+
+    def get_inout_records(self, building, begin_time, end_time):
+        """查询楼栋在 [begin_time, end_time] 内的出入记录，按通行时间升序"""
+        conn = self._get_conn()
+        try:
+            rows = conn.execute(
+                """SELECT record_json FROM inout_records
+                   WHERE building = ? AND pass_time >= ? AND pass_time <= ?
+                   ORDER BY pass_time""",
+                (building, begin_time, end_time)
+            ).fetchall()
+            return [json.loads(r['record_json']) for r in rows]
+        finally:
+            conn.close()
+
+    def count_inout_records(self, building, begin_time, end_time):
+        """统计楼栋在 [begin_time, end_time] 内的本地记录数"""
+        conn = self._get_conn()
+        try:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM inout_records WHERE building = ? AND pass_time >= ? AND pass_time <= ?",
+                (building, begin_time, end_time)
+            ).fetchone()
+            return row[0]
+        finally:
+            conn.close()
+
+    def delete_inout_records(self, building, begin_time, end_time):
+        """删除楼栋在 [begin_time, end_time] 内的本地记录（整窗口重新同步前调用）"""
+        conn = self._get_conn()
+        try:
+            conn.execute(
+                "DELETE FROM inout_records WHERE building = ? AND pass_time >= ? AND pass_time <= ?",
+                (building, begin_time, end_time)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def add_sync_window(self, building, begin_time, end_time, record_count=0):
+        """记录已完整同步的时间窗口"""
+        conn = self._get_conn()
+        try:
+            conn.execute(
+                """INSERT INTO inout_sync_windows (building, begin_time, end_time, record_count) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(building, begin_time, end_time)
+                   DO UPDATE SET record_count = excluded.record_count, synced_at = datetime('now','localtime')""",
+                (building, begin_time, end_time, record_count)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_sync_windows(self, building, begin_time, end_time):
+        """查询与 [begin_time, end_time] 有交集的已同步窗口，按开始时间升序"""
+        conn = self._get_conn()
+        try:
+            rows = conn.execute(
+                """SELECT * FROM inout_sync_windows
+                   WHERE building = ? AND begin_time <= ? AND end_time >= ?
+                   ORDER BY begin_time""",
+                (building, end_time, begin_time)
+            ).fetchall()
+            return [dict(r) for r in rows]
+        finally:
+            conn.close()
+
+    # ==================== 页面查询后台任务相关 ====================
+
+    def create_query_job(self, job_id, username, request_data):
+        conn = self._get_conn()
+        try:
+            conn.execute(
+                "INSERT INTO query_jobs (id, username, request_json) VALUES (?, ?, ?)",
+                (job_id, username, json.dumps(request_data, ensure_ascii=False))
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def update_query_job(self, job_id, **kwargs):
+        allowed = {'status', 'progress', 'message', 'file_name'}
+        fields = {k: v for k, v in kwargs.items() if k in allowed}
+        if not fields:
+            return False
+        set_clause = ', '.join(f"{k} = ?" for k in fields)
+        values = list(fields.values()) + [job_id]
+        conn = self._get_conn()
+        try:
+            conn.execute(
+                f"UPDATE query_jobs SET {set_clause}, updated_at = datetime('now','localtime') WHERE id = ?",
+                values
+            )
+            conn.commit()
+            return True
+        finally:
+            conn.close()
+
+    def get_query_job(self, job_id):
+        conn = self._get_conn()
+        try:
+            row = conn.execute("SELECT * FROM query_jobs WHERE id = ?", (job_id,)).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def get_expired_query_jobs(self, max_age_hours):
+        """获取已结束（success/failed）且超过 max_age_hours 小时未更新的后台任务"""
+        conn = self._get_conn()
+        try:
+            rows = conn.execute(
+                """SELECT * FROM query_jobs
+                   WHERE status IN ('success', 'failed') AND updated_at < datetime('now', 'localtime', ?)""",
+                (f'-{int(max_age_hours)} hours',)
+            ).fetchall()
+            return [dict(r) for r in rows]
+        finally:
+            conn.close()
+
+    def delete_query_job(self, job_id):
+        conn = self._get_conn()
+        try:
+            conn.execute("DELETE FROM query_jobs WHERE id = ?", (job_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_unfinished_query_jobs(self):
+        """获取未完成（pending/running）的后台任务，按提交时间升序"""
+        conn = self._get_conn()
+        try:
+            rows = conn.execute(
+                "SELECT * FROM query_jobs WHERE status IN ('pending', 'running') ORDER BY created_at, rowid"
+            ).fetchall()
+            return [dict(r) for r in rows]
+        finally:
+            conn.close()
@@ -72,3 +72,44 @@ CREATE TABLE IF NOT EXISTS operation_logs (
     created_at TIMESTAMP DEFAULT (datetime('now','localtime'))
 );
 
+
+-- 出入记录本地缓存表（公寓系统接口返回的原始记录）
+CREATE TABLE IF NOT EXISTS inout_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    building TEXT NOT NULL,               -- 楼栋编号，对应 bid_dict 的 key
+    pass_time TEXT NOT NULL,              -- passTimeText，格式 YYYY-MM-DD HH:MM:SS
+    user_id TEXT NOT NULL,                -- userId
+    record_json TEXT NOT NULL,            -- 原始记录 JSON
+    created_at TIMESTAMP DEFAULT (datetime('now','localtime')),
+    UNIQUE(building, pass_time, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_inout_records_user ON inout_records(user_id);
+
+-- 出入记录已同步的时间窗口（窗口内的记录已完整保存在 inout_records 中）
+CREATE TABLE IF NOT EXISTS inout_sync_windows (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    building TEXT NOT NULL,               -- 楼栋编号
+    begin_time TEXT NOT NULL,             -- 窗口开始时间 YYYY-MM-DD HH:MM:SS（含）
+    end_time TEXT NOT NULL,               -- 窗口结束时间 YYYY-MM-DD HH:MM:SS（含）
+    record_count INTEGER NOT NULL DEFAULT 0,  -- 同步时接口返回的记录数
+    synced_at TIMESTAMP DEFAULT (datetime('now','localtime')),
+    UNIQUE(building, begin_time, end_time)
+);
+
+CREATE INDEX IF NOT EXISTS idx_inout_sync_windows_building ON inout_sync_windows(building, begin_time, end_time);
+
+-- 页面查询后台任务（POST /query 异步执行，服务重启后未完成的任务重新入队）
+CREATE TABLE IF NOT EXISTS query_jobs (
+    id TEXT PRIMARY KEY,                  -- 任务 ID（uuid）
+    username TEXT,                        -- 提交任务的用户
+    request_json TEXT NOT NULL,           -- process() 的请求数据 JSON
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending/running/success/failed
+    progress INTEGER NOT NULL DEFAULT 0,  -- 进度百分比 0-100
+    message TEXT,                         -- 当前阶段说明或失败原因
+    file_name TEXT,                       -- 生成的报表路径
+    created_at TIMESTAMP DEFAULT (datetime('now','localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now','localtime'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_query_jobs_status ON query_jobs(status);
@@ -30,6 +30,22 @@ class ConfigTool:
             self.logger.warning(f"配置项 {key} 的值不是有效 JSON: {e}")
             return default if default is not None else {}
 
+    def _get_int(self, key, default, minimum=None):
+        """从数据库读取整数配置值，不是有效整数时返回 default，小于 minimum 时按 minimum 处理"""
+        try:
+            val = int(self._get(key))
+        except (ValueError, TypeError):
+            return default
+        return val if minimum is None else max(val, minimum)
+
+    def _get_float(self, key, default, minimum=None):
+        """从数据库读取小数配置值，规则同 _get_int"""
+        try:
+            val = float(self._get(key))
+        except (ValueError, TypeError):
+            return default
+        return val if minimum is None else max(val, minimum)
+
     def get_username(self):
         """获取公寓系统用户名"""
         return self._get('tust_username', '')
@@ -40,11 +56,135 @@ class ConfigTool:
 
     def get_pagesize(self):
         """获取分页大小"""
-        val = self._get('pagesize', '20')
-        try:
-            return int(val)
-        except (ValueError, TypeError):
-            return 20
+        return self._get_int('pagesize', 20)
+
+    def get_probe_page_size(self):
+        """获取楼栋首次请求的条数（同时取 total 和首页数据），小于 pagesize 时按 pagesize 处理"""
+        return self._get_int('probe_page_size', 100, minimum=1)
+
+    def get_page_fetch_workers(self):
+        """获取单个楼栋并发拉取分页的线程数上限，1 表示顺序拉取"""
+        return self._get_int('page_fetch_workers', 4, minimum=1)
+
+    def get_building_fetch_workers(self):
+        """获取同时拉取的楼栋数上限，1 表示逐栋顺序拉取"""
+        return self._get_int('building_fetch_workers', 4, minimum=1)
+
+    def get_night_fetch_workers(self):
+        """获取跨多天查询时同时查询的夜数上限，1 表示逐晚顺序查询"""
+        return self._get_int('night_fetch_workers', 2, minimum=1)
+
+    def get_group_fetch_ratio(self):
+        """
+        获取整楼群查询的阈值：楼群内被选中楼栋占比达到该值（且至少 2 栋）时，
+        按整个楼群查询一次再在本地按楼栋拆分；大于 1 表示不启用（默认）。
+        接口记录的 buildingId 未与配置的楼栋 ID 核对前不要启用
+        """
+        return self._get_float('group_fetch_ratio', 2.0)
+
+    def get_record_store_enabled(self):
+        """是否启用出入记录本地缓存（true/false）"""
+        return str(self._get('record_store_enabled', 'true')).lower() == 'true'
+
+    def get_record_sync_lag_minutes(self):
+        """获取公寓系统入库延迟（分钟），距同步时刻不足该时长的数据下次查询时重新拉取"""
+        return self._get_int('record_sync_lag_minutes', 10, minimum=0)
+
+    def get_record_probe_hours(self):
+        """获取需要探测变化的缓存窗口范围（小时）：结束时间在最近该小时数内的窗口复用前先比较 total，0 表示不探测"""
+        return self._get_int('record_probe_hours', 24, minimum=0)
+
+    def get_excel_write_only_threshold(self):
+        """获取报表切换为流式只写模式的行数阈值，0 表示始终使用普通模式"""
+        return self._get_int('excel_write_only_threshold', 5000, minimum=0)
+
+    def get_report_cache_enabled(self):
+        """是否复用相同输入已生成的报表"""
+        return str(self._get('report_cache_enabled', 'true')).lower() == 'true'
+
+    def get_report_cache_max_mb(self):
+        """获取报表缓存总大小上限（MB）"""
+        return self._get_int('report_cache_max_mb', 200, minimum=1)
+
+    def get_report_cache_max_age_hours(self):
+        """获取报表缓存保留时长（小时），超过该时长未被使用的报表删除"""
+        return self._get_int('report_cache_max_age_hours', 72, minimum=1)
+
+    def get_prefetch_enabled(self):
+        """是否在 end_time 之后预取上一晚全部楼栋数据（需同时启用调度器）"""
+        return str(self._get('prefetch_enabled', 'true')).lower() == 'true'
+
+    def get_prefetch_delay_minutes(self):
+        """获取预取任务在 end_time 之后延迟执行的分钟数，应不小于 record_sync_lag_minutes"""
+        return self._get_int('prefetch_delay_minutes', 15, minimum=0)
+
+    def get_browser_slots(self):
+        """获取同时运行的 Chrome 登录数上限"""
+        return self._get_int('browser_slots', 1, minimum=1)
+
+    def get_browser_max_waiting(self):
+        """获取浏览器登录槽位占满时允许排队的请求数，超出时直接返回繁忙"""
+        return self._get_int('browser_max_waiting', 4, minimum=0)
+
+    def get_upstream_slots(self):
+        """获取同时进行的公寓系统取数请求数上限"""
+        return self._get_int('upstream_slots', 16, minimum=1)
+
+    def get_upstream_max_waiting(self):
+        """获取取数请求槽位占满时允许排队的请求数，超出时直接返回繁忙"""
+        return self._get_int('upstream_max_waiting', 64, minimum=0)
+
+    def get_upstream_adaptive_enabled(self):
+        """是否按响应时间和异常自动调整公寓系统请求并发数（upstream_slots 作为上限）"""
+        return str(self._get('upstream_adaptive_enabled', 'true')).lower() == 'true'
+
+    def get_upstream_min_slots(self):
+        """获取自适应并发的下限"""
+        return self._get_int('upstream_min_slots', 2, minimum=1)
+
+    def get_upstream_latency_target_seconds(self):
+        """获取自适应并发的目标平均响应时间（秒），超过时降低并发"""
+        return self._get_float('upstream_latency_target_seconds', 3.0, minimum=0.1)
+
+    def get_upstream_adaptive_level(self):
+        """获取上次自适应调整学到的并发数，未保存过时返回 None"""
+        return self._get_int('upstream_adaptive_level', None, minimum=1)
+
+    def get_admission_wait_seconds(self):
+        """获取排队等待槽位的最长秒数，超时后返回繁忙"""
+        return self._get_int('admission_wait_seconds', 60, minimum=1)
+
+    def get_upstream_connect_timeout(self):
+        """获取公寓系统单次请求的连接超时上限（秒）"""
+        return self._get_int('upstream_connect_timeout', 5, minimum=1)
+
+    def get_upstream_read_timeout(self):
+        """获取公寓系统单次请求的读取超时上限（秒）"""
+        return self._get_int('upstream_read_timeout', 30, minimum=1)
+
+    def get_query_deadline_seconds(self):
+        """获取一次查询从登录到生成报表的处理时限（秒），0 表示不限时"""
+        return self._get_int('query_deadline_seconds', 600, minimum=0)
+
+    def get_query_async_enabled(self):
+        """/query 是否以后台任务方式执行（立即返回任务 ID，页面轮询进度）"""
+        return str(self._get('query_async_enabled', 'true')).lower() == 'true'
+
+    def get_query_job_workers(self):
+        """获取同时执行的 /query 后台任务数上限"""
+        return self._get_int('query_job_workers', 2, minimum=1)
+
+    def get_http_pool_size(self):
+        """获取公寓系统接口 HTTP 连接池大小"""
+        return self._get_int('http_pool_size', 20, minimum=1)
+
+    def get_http_retry_total(self):
+        """获取接口连接失败或 502/503/504 时的重试次数"""
+        return self._get_int('http_retry_total', 2, minimum=0)
+
+    def get_session_validate_interval(self):
+        """获取 sid 复用前免校验的时间窗口（秒），0 表示每次复用都校验"""
+        return self._get_int('session_validate_interval', 30, minimum=0)
 
     def get_data_cfg(self):
         """获取学院名称映射（JSON）"""
@@ -70,6 +210,19 @@ class ConfigTool:
         """获取运行环境"""
         return self._get('env', 'test')
 
+    def get_login_mode(self):
+        """
+        获取公寓系统登录方式。
+        http: 仅使用 requests 直接提交 CAS 表单
+        selenium: 仅使用无头 Chrome 登录
+        auto: 先走 HTTP 登录，失败后回退到 Chrome（默认）
+        """
+        mode = (self._get('login_mode', 'auto') or 'auto').strip().lower()
+        if mode not in ('http', 'selenium', 'auto'):
+            self.logger.warning(f"配置项 login_mode 的值无效: {mode}，使用 auto")
+            return 'auto'
+        return mode
+
     def get_driver_location(self):
         """
         获取 ChromeDriver 路径。
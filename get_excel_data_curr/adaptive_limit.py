@@ -0,0 +1,133 @@
+"""
+公寓系统请求并发数的自适应调整（AIMD：加性增、乘性减）。
+t3 每次取数请求结束后调用 observe()：请求成功且平均响应时间不超过目标值时，每累计 level 次成功把并发数加 1；
+请求超时、连接失败、HTTP 状态异常、被重定向到 CAS 登录页或平均响应时间超过目标值时并发数减半，
+在减半之前发出的请求随后报告的异常不再重复减半；平均响应时间至少积累 level 个样本后才参与判断，单个慢请求不会触发减半。调整结果直接作用于 admission.upstream_slots 的槽位上限，
+有变化时由调用方写回 system_config，服务重启后从学到的并发数开始。
+"""
+import logging
+import math
+import threading
+import time
+
+from get_excel_data_curr import admission
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_LIMIT = 2
+DEFAULT_LATENCY_TARGET = 3
+DECREASE_FACTOR = 0.5
+LATENCY_EWMA_ALPHA = 0.2
+
+
+class AdaptiveLimit:
+    def __init__(self, slots):
+        """
+        :param slots: 被调整上限的 admission.Slots
+        """
+        self.slots = slots
+        self.enabled = False
+        self.min_limit = DEFAULT_MIN_LIMIT
+        self.max_limit = slots.limit
+        self.latency_target = DEFAULT_LATENCY_TARGET
+        self.level = None
+        self._lock = threading.Lock()
+        self._successes = 0
+        self._decreased_at = 0.0
+        self._latency = None
+        self._latency_samples = 0
+        self._saved_level = None
+        self.increases = 0
+        self.decreases = 0
+        self.last_signal = None
+
+    def configure(self, enabled, min_limit, max_limit, latency_target=DEFAULT_LATENCY_TARGET, saved_level=None):
+        """
+        按配置调整并发数范围
+        :param max_limit: 并发数上限，即配置的 upstream_slots；未启用时始终使用该值
+        :param saved_level: system_config 中保存的上次学到的并发数，只在首次配置时采用
+        :return: 当前应使用的槽位上限
+        """
+        with self._lock:
+            self.enabled = enabled
+            self.min_limit = max(1, min(min_limit, max_limit))
+            self.max_limit = max_limit
+            self.latency_target = latency_target
+            if not enabled:
+                self.level = max_limit
+            elif self.level is None:
+                self.level = min(max(saved_level or max_limit, self.min_limit), max_limit)
+                self._saved_level = saved_level or self.level
+                logger.info(f"公寓系统请求自适应并发从 {self.level} 开始（范围 {self.min_limit}-{max_limit}）")
+            else:
+                self.level = min(max(self.level, self.min_limit), max_limit)
+            return self.level
+
+    def observe(self, started, latency, ok, signal=None):
+        """
+        报告一次请求的结果
+        :param started: 请求开始时的 time.monotonic()
+        :param latency: 请求耗时（秒）
+        :param ok: 请求是否正常返回
+        :param signal: 异常说明，如 超时、HTTP 503、CAS 重定向，用于日志和统计
+        """
+        with self._lock:
+            if not self.enabled:
+                return
+            if ok:
+                self._latency = latency if self._latency is None else \
+                    (1 - LATENCY_EWMA_ALPHA) * self._latency + LATENCY_EWMA_ALPHA * latency
+                self._latency_samples += 1
+                if self._latency_samples >= self.level and self._latency > self.latency_target:
+                    ok = False
+                    signal = f"平均响应 {self._latency:.1f} 秒"
+            if ok:
+                self._successes += 1
+                if self._successes >= self.level and self.level < self.max_limit:
+                    self._set_level(self.level + 1)
+                    self.increases += 1
+            elif started >= self._decreased_at:
+                # 上次减半之前发出的请求反映的是旧并发数下的情况，不再重复减半
+                self.last_signal = signal
+                self._decreased_at = time.monotonic()
+                self._successes = 0
+                # 减半后重新统计响应时间，避免旧的慢请求拖住恢复
+                self._latency = None
+                self._latency_samples = 0
+                if self.level > self.min_limit:
+                    logger.warning(f"公寓系统请求异常（{signal}），并发数从 {self.level} 减半")
+                    self._set_level(max(self.min_limit, math.floor(self.level * DECREASE_FACTOR)))
+                    self.decreases += 1
+
+    def _set_level(self, level):
+        self.level = level
+        self._successes = 0
+        self.slots.set_limit(level)
+
+    def pop_changed_level(self):
+        """
+        自上次保存以来学到的并发数有变化时返回新值并记为已保存，否则返回 None
+        """
+        with self._lock:
+            if not self.enabled or self.level is None or self.level == self._saved_level:
+                return None
+            self._saved_level = self.level
+            return self.level
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'level': self.level,
+                'min_limit': self.min_limit,
+                'max_limit': self.max_limit,
+                'latency_target_seconds': self.latency_target,
+                'avg_latency_seconds': round(self._latency, 3) if self._latency is not None else None,
+                'increases': self.increases,
+                'decreases': self.decreases,
+                'last_signal': self.last_signal,
+            }
+
+
+# 全进程共用：调整 admission.upstream_slots 的槽位上限
+upstream_limit = AdaptiveLimit(admission.upstream_slots)
@@ -0,0 +1,204 @@
+"""
+准入控制。
+浏览器登录和公寓系统取数请求各有一组并发槽位，槽位占满时排队等待；
+等待队列已满或等待超时时抛出 AdmissionBusy，调用方返回"系统繁忙，请 X 秒后重试"，
+避免高峰期同时启动过多 Chrome 进程、发出过多请求拖垮服务器。
+公寓系统取数按查询准入：查询开始取数前用 admit() 检查一次，通过后把当前上下文标记为已准入，
+该查询之后的分页请求（包括 progress.submit 提交到线程池的子任务）占用槽位时只排队、不计入等待队列上限、
+不受 wait_seconds 限制，只等到处理时限为止，已完成的楼栋不会因为后续分页排队而整体作废。
+"""
+import contextvars
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BROWSER_SLOTS = 1
+DEFAULT_BROWSER_MAX_WAITING = 4
+DEFAULT_UPSTREAM_SLOTS = 16
+DEFAULT_UPSTREAM_MAX_WAITING = 64
+DEFAULT_WAIT_SECONDS = 60
+
+_admitted = contextvars.ContextVar('admitted', default=False)
+
+
+class AdmissionBusy(Exception):
+    """槽位已满且无法排队，retry_after 为建议的重试等待秒数"""
+
+    def __init__(self, name, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"系统繁忙（{name}已满），请 {retry_after} 秒后重试")
+
+
+class Slots:
+    def __init__(self, name, limit, max_waiting, wait_seconds):
+        """
+        :param name: 槽位名称，用于日志和提示
+        :param limit: 同时占用的槽位上限
+        :param max_waiting: 排队等待的上限，超出时立即拒绝
+        :param wait_seconds: 排队最长等待秒数，超时后拒绝
+        """
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.wait_seconds = wait_seconds
+        self._cond = threading.Condition()
+        self.in_use = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._avg_hold = None
+
+    def configure(self, limit, max_waiting, wait_seconds):
+        with self._cond:
+            if (limit, max_waiting, wait_seconds) != (self.limit, self.max_waiting, self.wait_seconds):
+                logger.info(f"{self.name}槽位已配置: limit={limit}, max_waiting={max_waiting}, "
+                            f"wait_seconds={wait_seconds}")
+            self.limit = limit
+            self.max_waiting = max_waiting
+            self.wait_seconds = wait_seconds
+            self._cond.notify_all()
+
+    def set_limit(self, limit):
+        """只调整槽位上限（自适应并发使用），上限降低时已占用的槽位不受影响"""
+        with self._cond:
+            self.limit = limit
+            self._cond.notify_all()
+
+    def _retry_after(self):
+        # 按最近的平均占用时长估算排在最后的请求还需等待多久，未有统计时按 1 秒估算
+        hold = self._avg_hold or 1.0
+        return max(1, math.ceil(hold * (self.waiting + 1) / self.limit))
+
+    def _reject(self, reason):
+        self.rejected += 1
+        retry_after = self._retry_after()
+        logger.warning(f"{self.name}{reason}，拒绝请求（占用 {self.in_use}/{self.limit}，排队 {self.waiting}）")
+        raise AdmissionBusy(self.name, retry_after)
+
+    def acquire(self, max_wait=None):
+        """
+        占用一个槽位，必要时排队等待
+        :param max_wait: 本次最多排队的秒数，不超过 wait_seconds；None 表示按 wait_seconds。
+                         已准入的查询只按 max_wait 等待，None 表示一直等到有空闲槽位
+        :return: 占用开始时刻，传给 release
+        :raises AdmissionBusy: 等待队列已满或等待超时；已准入的查询只在 max_wait 用完时抛出
+        """
+        in_query = _admitted.get()
+        with self._cond:
+            if self.in_use >= self.limit:
+                if not in_query and self.waiting >= self.max_waiting:
+                    self._reject("等待队列已满")
+                if in_query:
+                    wait_seconds = max_wait
+                else:
+                    wait_seconds = self.wait_seconds if max_wait is None else min(max_wait, self.wait_seconds)
+                self.waiting += 1
+                try:
+                    ready = self._cond.wait_for(lambda: self.in_use < self.limit, timeout=wait_seconds)
+                finally:
+                    self.waiting -= 1
+                if not ready:
+                    self._reject(f"排队超过 {round(wait_seconds, 1):g} 秒")
+            self.in_use += 1
+            self.admitted += 1
+        return time.monotonic()
+
+    def release(self, started):
+        held = time.monotonic() - started
+        with self._cond:
+            self.in_use -= 1
+            self._avg_hold = held if self._avg_hold is None else 0.8 * self._avg_hold + 0.2 * held
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, max_wait=None):
+        started = self.acquire(max_wait)
+        try:
+            yield
+        finally:
+            self.release(started)
+
+    def saturated(self):
+        """槽位和等待队列都已占满，新请求会被立即拒绝"""
+        with self._cond:
+            return self.in_use >= self.limit and self.waiting >= self.max_waiting
+
+    def check(self):
+        """
+        不占用槽位，只检查是否还能接收新的查询
+        :raises AdmissionBusy: 槽位和等待队列都已占满
+        """
+        with self._cond:
+            if self.in_use >= self.limit and self.waiting >= self.max_waiting:
+                self._reject("等待队列已满")
+
+    def retry_after(self):
+        with self._cond:
+            return self._retry_after()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'in_use': self.in_use,
+                'max_waiting': self.max_waiting,
+                'waiting': self.waiting,
+                'wait_seconds': self.wait_seconds,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'avg_hold_seconds': round(self._avg_hold, 3) if self._avg_hold is not None else None,
+            }
+
+
+# 全进程共用：同时运行的 Chrome 登录数、同时进行的公寓系统取数请求数
+browser_slots = Slots('浏览器登录', DEFAULT_BROWSER_SLOTS, DEFAULT_BROWSER_MAX_WAITING, DEFAULT_WAIT_SECONDS)
+upstream_slots = Slots('公寓系统请求', DEFAULT_UPSTREAM_SLOTS, DEFAULT_UPSTREAM_MAX_WAITING, DEFAULT_WAIT_SECONDS)
+
+
+def configure(browser_limit=DEFAULT_BROWSER_SLOTS, browser_max_waiting=DEFAULT_BROWSER_MAX_WAITING,
+              upstream_limit=DEFAULT_UPSTREAM_SLOTS, upstream_max_waiting=DEFAULT_UPSTREAM_MAX_WAITING,
+              wait_seconds=DEFAULT_WAIT_SECONDS):
+    """按配置调整两组槽位，已占用的槽位不受影响"""
+    browser_slots.configure(browser_limit, browser_max_waiting, wait_seconds)
+    upstream_slots.configure(upstream_limit, upstream_max_waiting, wait_seconds)
+
+
+def admit():
+    """
+    查询开始取数前检查一次公寓系统请求槽位，通过后把当前上下文标记为已准入
+    :return: 传给 unbind 恢复
+    :raises AdmissionBusy: 槽位和等待队列都已占满
+    """
+    upstream_slots.check()
+    return _admitted.set(True)
+
+
+def unbind(token):
+    _admitted.reset(token)
+
+
+def is_admitted():
+    """当前上下文是否属于已准入的查询"""
+    return _admitted.get()
+
+
+def busy_response():
+    """
+    取数请求已无法排队时返回繁忙提示，否则返回 None
+    :return: dict 或 None
+    """
+    if not upstream_slots.saturated():
+        return None
+    error = AdmissionBusy(upstream_slots.name, upstream_slots.retry_after())
+    return {'msg': str(error), 'status': 'busy', 'retry_after': error.retry_after}
+
+
+def stats():
+    return {
+        'browser': browser_slots.stats(),
+        'upstream': upstream_slots.stats(),
+    }
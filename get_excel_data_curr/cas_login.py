@@ -0,0 +1,154 @@
+"""
+基于 requests 的 CAS 登录，不启动浏览器直接获取公寓系统的 sid。
+"""
+import logging
+import time
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import requests
+
+from get_excel_data_curr import deadline, progress
+
+logger = logging.getLogger(__name__)
+
+# 单次 HTTP 请求超时（秒），与 Selenium 等待时间保持一致；查询绑定处理时限时不超过剩余时间
+REQUEST_TIMEOUT = 10
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36"
+
+# 登录失败的类型：网络或服务端临时异常可以重试；账号密码被拒绝时重试和改用浏览器都无意义；
+# 登录表单不是纯 HTML 表单（如密码需页面脚本加密）时 HTTP 登录无法完成，应直接改用浏览器
+RETRYABLE = 'retryable'
+BAD_CREDENTIALS = 'bad_credentials'
+UNSUPPORTED_FORM = 'unsupported_form'
+
+# 表单中出现这些字段名（不区分大小写）说明密码由页面脚本加密后提交，如 pwdEncryptSalt
+ENCRYPTION_FIELD_MARKERS = ('salt', 'encrypt')
+
+
+class _LoginFormParser(HTMLParser):
+    """解析 CAS 登录页，取出包含 username 输入框的表单及其全部 input（含 lt/execution 等隐藏字段）"""
+
+    def __init__(self):
+        super().__init__()
+        self.forms = []
+        self._current = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'form':
+            self._current = {'action': attrs.get('action') or '', 'fields': {}}
+            self.forms.append(self._current)
+        elif tag == 'input' and self._current is not None:
+            name = attrs.get('name')
+            if not name:
+                return
+            input_type = (attrs.get('type') or 'text').lower()
+            if input_type in ('checkbox', 'radio') and 'checked' not in attrs:
+                return
+            self._current['fields'][name] = attrs.get('value') or ''
+
+    def handle_endtag(self, tag):
+        if tag == 'form':
+            self._current = None
+
+    def login_form(self):
+        for form in self.forms:
+            if 'username' in form['fields']:
+                return form
+        return None
+
+
+def _is_cas_login_page(response):
+    return '/cas/login' in (getattr(response, 'url', '') or '')
+
+
+def _cookies_from_session(session):
+    """转成与 Selenium driver.get_cookies() 相同的结构，sid 排在最前"""
+    cookies = [{'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path} for c in session.cookies]
+    cookies.sort(key=lambda c: c['name'] != 'sid')
+    return cookies
+
+
+def _unsupported_form_reason(form):
+    """HTTP 登录无法直接提交该表单时返回原因，否则返回 None"""
+    if form is None:
+        return "登录页未找到登录表单，请检查页面的 HTML 结构"
+    if 'password' not in form['fields']:
+        return "登录表单没有 password 字段，密码可能由页面脚本处理"
+    for name in form['fields']:
+        if any(marker in name.lower() for marker in ENCRYPTION_FIELD_MARKERS):
+            return f"登录表单含 {name} 字段，密码需由页面脚本加密后提交"
+    return None
+
+
+def _login_once(session, login_url, username, password):
+    """
+    执行一次 CAS 表单登录
+    :return: tuple(success: bool, message: str, failure: 失败类型，成功时为 None)
+    """
+    response = session.get(login_url, timeout=deadline.cap(REQUEST_TIMEOUT), verify=False)
+    if response.status_code != 200:
+        return (False, f"登录页状态异常: {response.status_code}", RETRYABLE)
+    if not _is_cas_login_page(response) and session.cookies.get('sid'):
+        return (True, "登录成功", None)
+
+    parser = _LoginFormParser()
+    parser.feed(response.text)
+    form = parser.login_form()
+    reason = _unsupported_form_reason(form)
+    if reason:
+        return (False, reason, UNSUPPORTED_FORM)
+
+    fields = dict(form['fields'])
+    fields['username'] = username
+    fields['password'] = password
+    action_url = urljoin(response.url, form['action']) if form['action'] else response.url
+
+    response = session.post(action_url, data=fields, timeout=deadline.cap(REQUEST_TIMEOUT), verify=False)
+    if _is_cas_login_page(response):
+        # 仍停留在 CAS 登录页说明账号或密码被拒绝，重试无意义
+        return (False, "登录失败，公寓系统用户名或密码错误", BAD_CREDENTIALS)
+    if not session.cookies.get('sid'):
+        return (False, "登录后未获取到 sid", RETRYABLE)
+    return (True, "登录成功", None)
+
+
+def login_with_requests(login_url, username, password, max_retries=3, retry_delay=5):
+    """
+    带重试的 HTTP 登录函数，只重试 RETRYABLE 类型的失败
+    :param login_url: 登录页面 URL（会被重定向到 CAS）
+    :param username: 用户名
+    :param password: 密码
+    :param max_retries: 最大重试次数
+    :param retry_delay: 重试间隔（秒）
+    :return: tuple(success: bool, message: str, cookies: list or None, failure: 失败类型，成功时为 None)，
+             前三项与 main._login_with_retry 的返回值一致
+    """
+    message = "超过最大重试次数"
+    for attempt in range(1, max_retries + 1):
+        logger.info(f"HTTP 登录尝试 {attempt}/{max_retries}")
+        progress.emit('login', f"登录公寓系统（第 {attempt}/{max_retries} 次尝试）", attempt=attempt,
+                      max_attempts=max_retries)
+        session = requests.Session()
+        session.headers['User-Agent'] = USER_AGENT
+        try:
+            success, message, failure = _login_once(session, login_url, username, password)
+            if success:
+                logger.info("HTTP 登录成功")
+                progress.emit('login', "登录成功", attempt=attempt, max_attempts=max_retries)
+                return (True, message, _cookies_from_session(session), None)
+            if failure != RETRYABLE:
+                logger.warning(f"HTTP 登录失败且不可重试: {message}")
+                return (False, message, None, failure)
+        except requests.RequestException as e:
+            message = f"登录异常: {str(e)}"
+        finally:
+            session.close()
+
+        if attempt < max_retries:
+            logger.warning(f"第 {attempt} 次 HTTP 登录失败: {message}，{retry_delay} 秒后重试...")
+            time.sleep(deadline.cap(retry_delay))
+
+    return (False, message, None, RETRYABLE)
@@ -0,0 +1,90 @@
+"""
+查询处理时限。
+process() 开始时按 query_deadline_seconds 创建时限并绑定到当前上下文，登录、每次分页请求和生成报表共用同一个时限：
+每次请求的连接/读取超时取配置上限与剩余时间份额的较小值，时限用完后由 t3.check_deadline() 抛出 DataFetchError。
+提交到线程池的子任务通过 progress.submit() 复制调用方上下文，与调用方共用时限；
+未绑定时限时（如定时预取）只使用连接/读取超时上限，请求不会无限等待。
+"""
+import contextvars
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+MIN_TIMEOUT = 0.05  # 剩余时间不足时仍给出的最小超时，避免传给 requests 的超时为 0
+
+_current = contextvars.ContextVar('deadline', default=None)
+_connect_timeout = DEFAULT_CONNECT_TIMEOUT
+_read_timeout = DEFAULT_READ_TIMEOUT
+
+
+class Deadline:
+    def __init__(self, seconds):
+        """
+        :param seconds: 从现在起的处理时限（秒）
+        """
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+def configure(connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT):
+    """按配置调整单次请求的连接/读取超时上限"""
+    global _connect_timeout, _read_timeout
+    if (connect_timeout, read_timeout) != (_connect_timeout, _read_timeout):
+        logger.info(f"请求超时已配置: connect={connect_timeout}, read={read_timeout}")
+    _connect_timeout = connect_timeout
+    _read_timeout = read_timeout
+
+
+def start(seconds):
+    """
+    创建时限并绑定到当前上下文
+    :param seconds: 处理时限（秒），不大于 0 表示不限时
+    :return: 传给 unbind 恢复
+    """
+    return _current.set(Deadline(seconds) if seconds > 0 else None)
+
+
+def unbind(token):
+    _current.reset(token)
+
+
+def current():
+    """当前上下文绑定的 Deadline，未绑定时返回 None"""
+    return _current.get()
+
+
+def remaining():
+    """当前时限的剩余秒数，未绑定时限时返回 None"""
+    deadline = _current.get()
+    return None if deadline is None else deadline.remaining()
+
+
+def cap(seconds):
+    """不超过当前时限剩余时间的等待秒数，未绑定时限时原样返回"""
+    left = remaining()
+    if left is None:
+        return seconds
+    return max(min(seconds, left), MIN_TIMEOUT)
+
+
+def request_timeout(attempts=1):
+    """
+    单次请求的超时，传给 requests 的 timeout 参数
+    :param attempts: 剩余的尝试次数（含本次）；绑定时限时剩余时间平分给这些尝试，每次的连接与读取超时之和不超过其份额
+    :return: tuple(连接超时, 读取超时)
+    """
+    left = remaining()
+    if left is None:
+        return _connect_timeout, _read_timeout
+    share = left / attempts
+    connect = min(_connect_timeout, share / 2)
+    return max(connect, MIN_TIMEOUT), max(min(_read_timeout, share - connect), MIN_TIMEOUT)
@@ -0,0 +1,100 @@
+"""
+取数计划：根据每个楼群被选中的楼栋比例，决定按楼栋逐个查询还是按整个楼群查询一次后在本地拆分。
+"""
+import logging
+from collections import OrderedDict
+
+import get_excel_data_curr.t3 as t3
+
+logger = logging.getLogger(__name__)
+
+GROUP_NAMES = {
+    t3.GROUP_ZHONGYUAN: '中院',
+    t3.GROUP_XIYUAN: '西院',
+}
+
+# 接口返回记录中标识所属楼栋的字段，对应 bid_dict 中的楼栋内部 ID
+BUILDING_ID_FIELD = 'buildingId'
+
+
+class FetchTask:
+    """
+    一次取数任务
+    kind='building' 时 buildings 只有一个楼栋；kind='group' 时整楼群查询，结果按 buildings 拆分
+    """
+
+    def __init__(self, kind, buildings, group_id=None, share=1.0):
+        self.kind = kind
+        self.buildings = buildings  # OrderedDict {楼栋编号: 楼栋内部 ID}
+        self.group_id = group_id
+        self.share = share  # 选中楼栋占楼群楼栋数的比例，整楼群查询时用于检查拆分结果
+
+    @property
+    def label(self):
+        if self.kind == 'group':
+            return f"{GROUP_NAMES.get(self.group_id, self.group_id)}楼群"
+        return next(iter(self.buildings))
+
+    def __repr__(self):
+        return f"FetchTask({self.kind}, {list(self.buildings.keys())})"
+
+
+def plan_fetch(selected, all_buildings, group_ratio):
+    """
+    生成取数计划
+    :param selected: 本次选中的楼栋 {楼栋编号: 楼栋内部 ID}
+    :param all_buildings: 配置中的全部楼栋 {楼栋编号: 楼栋内部 ID}，用于计算楼群选中比例
+    :param group_ratio: 楼群内选中比例达到该值（且至少 2 栋）时整楼群查询；大于 1 表示不启用
+    :return: FetchTask 列表
+    """
+    group_totals = {}
+    for b_num in all_buildings:
+        group_id = t3.get_building_group_id(b_num)
+        group_totals[group_id] = group_totals.get(group_id, 0) + 1
+
+    selected_by_group = OrderedDict()
+    for b_num, bid in selected.items():
+        group_id = t3.get_building_group_id(b_num)
+        selected_by_group.setdefault(group_id, OrderedDict())[b_num] = bid
+
+    tasks = []
+    for group_id, buildings in selected_by_group.items():
+        total = group_totals.get(group_id, len(buildings)) or len(buildings)
+        if len(buildings) >= 2 and len(buildings) / total >= group_ratio:
+            tasks.append(FetchTask('group', buildings, group_id=group_id, share=len(buildings) / total))
+        else:
+            for b_num, bid in buildings.items():
+                tasks.append(FetchTask('building', OrderedDict([(b_num, bid)])))
+    logger.info(f"取数计划: {tasks}")
+    return tasks
+
+
+def split_rows_by_building(rows, buildings, min_share=0.0):
+    """
+    把整楼群查询的结果按楼栋拆分，未选中楼栋的记录直接丢弃
+    :param rows: 整楼群查询返回的记录
+    :param buildings: 选中的楼栋 {楼栋编号: 楼栋内部 ID}
+    :param min_share: 拆到选中楼栋的记录至少占全部记录的比例，通常为选中楼栋占楼群的比例
+    :return: {楼栋编号: 记录列表}；无法可靠拆分时返回 None，由调用方改为逐栋查询：
+             记录缺少楼栋字段、有记录但没有一条属于选中楼栋（楼栋字段与 bid_dict 格式不一致）、
+             或拆到选中楼栋的记录明显少于其应占的份额
+    """
+    b_num_by_bid = {bid: b_num for b_num, bid in buildings.items()}
+    result = OrderedDict((b_num, []) for b_num in buildings)
+    matched = 0
+    for row in rows:
+        bid = row.get(BUILDING_ID_FIELD)
+        if not bid:
+            logger.warning(f"整楼群查询的记录缺少 {BUILDING_ID_FIELD} 字段，无法按楼栋拆分")
+            return None
+        b_num = b_num_by_bid.get(str(bid))
+        if b_num is not None:
+            result[b_num].append(row)
+            matched += 1
+    if rows and matched == 0:
+        logger.warning(f"整楼群查询的 {len(rows)} 条记录没有一条属于选中楼栋，{BUILDING_ID_FIELD} 可能与配置的楼栋 ID 不一致")
+        return None
+    if matched < len(rows) * min_share:
+        logger.warning(f"整楼群查询只有 {matched}/{len(rows)} 条记录属于选中楼栋，低于选中比例 {min_share:.2f}")
+        return None
+    return result
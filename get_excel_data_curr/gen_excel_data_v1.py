@@ -4,195 +4,292 @@ from log_config import setup_logging
 import logging
 
 from openpyxl import load_workbook, Workbook
-from openpyxl.styles import Alignment, Border, Side, PatternFill
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Side, PatternFill, NamedStyle
 from openpyxl.utils import get_column_letter
-from collections import defaultdict
-from operator import itemgetter
+
+import get_excel_data_curr.t3 as t3
+from get_excel_data_curr import progress
 
 setup_logging()  # 多次调用不会重复配置
 
-def process_data(data):
-    # 创建一个字典，用于存储最终结果
-    result = {}
+HEADERS = ['日期', '学院', '学号', '姓名', '宿舍号', '年级', '培养层次', '晚归时间']
+REQUIRED_FIELDS = ['passTimeText', 'schoolInstituteName', 'userId', 'userName', 'roomName', 'grade', 'studentType']
+ROW_HEIGHT = 24
+CELL_STYLE_NAME = 'late_return_cell'
+PROGRESS_EVERY_ROWS = 500  # 每写入该行数发布一次进度事件
+
+class LatestByUser:
+    """
+    按 userId 只保留 passTimeText 最大的一条记录，逐条比较，不保存其余记录。
+    时间相同时保留先到达的记录；输出顺序为各 userId 首次出现的顺序
+    """
+
+    def __init__(self):
+        self._latest = {}
 
-    # 遍历外层的字典
-    for key, records in data.items():
-        # 创建一个字典，用于存储按userId分组的数据
-        grouped_data = defaultdict(list)
+    def add(self, record):
+        user_id = record['userId']
+        current = self._latest.get(user_id)
+        if current is None or record['passTimeText'] > current['passTimeText']:
+            self._latest[user_id] = record
 
-        # 遍历每个记录
+    def update(self, records):
+        """records 可以是列表或生成器"""
         for record in records:
-            # 按userId将记录添加到相应的分组中
-            grouped_data[record['userId']].append(record)
+            self.add(record)
+        return self
 
-        # 对每个userId的记录按passTimeText降序排序，并保留最新的记录
-        all_data = []
-        for user_id, records in grouped_data.items():
-            # 按passTimeText降序排序
-            records.sort(key=itemgetter('passTimeText'), reverse=True)
-            # 保留最新的记录
-            latest_record = records[0]
-            # 去重，只保留passTimeText最大的一条数据
-            grouped_data[user_id] = [latest_record]
-            all_data.append(latest_record)
+    def records(self):
+        return list(self._latest.values())
+
+
+def process_data(data):
+    """
+    每个楼栋内按 userId 去重，只保留最新一条记录
+    :param data: {楼栋编号: 记录列表或记录生成器}
+    :return: {楼栋编号: 去重后的记录列表}
+    """
+    return {key: LatestByUser().update(records).records() for key, records in data.items()}
 
-        # 将处理后的数据添加到结果字典中，保留外层的key
-        result[key] = all_data
 
-    return result
+# 楼栋编号与显示名不一致的楼栋，其余楼栋显示名即编号
+BUILDING_SHOW = {
+    11: '11A',
+    12: '11B',
+    13: '12A',
+    14: '12B',
+    15: '13',
+    16: '14',
+    17: '15',
+    18: '16',
+    19: '17A',
+    20: '17B',
+}
+
+STUDENT_TYPE_SHOW = {'本科生': '本科', '研究生': '研究生'}
+
 
 def convert_building_show(bid):
-    if bid == 11:
-        return '11A'
-    elif bid == 12:
-        return '11B'
-    elif bid == 13:
-        return '12A'
-    elif bid == 14:
-        return '12B'
-    elif bid == 15:
-        return '13'
-    elif bid == 16:
-        return '14'
-    elif bid == 17:
-        return '15'
-    elif bid == 18:
-        return '16'
-    elif bid == 19:
-        return '17A'
-    elif bid == 20:
-        return '17B'
-    else:
-        return str(bid)
+    return BUILDING_SHOW.get(bid, str(bid))
+
+
+def build_building_show(b_nums):
+    """生成本次报表用到的楼栋显示名表 {楼栋编号: 显示名}"""
+    return {b_num: convert_building_show(int(b_num)) for b_num in b_nums}
 
-def gen_excel_data_v1(ret_dict, username, data_cfg=None, request_data=None):
+
+class RowTransform:
     """
-    生成 Excel 晚归数据文件。
-    :param ret_dict: 各楼栋的晚归数据
-    :param username: 用户名（用于文件路径）
-    :param data_cfg: 学院名称映射字典，从调用方传入
-    :param request_data: 请求数据（包含 startDate, endDate 等）
+    报表行转换：每条记录的各列只计算一次，排序和写入共用。
+    学院简称按学院全称缓存，日期列（M.D）按日期缓存，日期和时间都由 passTimeText 切片得到
     """
-    if data_cfg is None:
-        data_cfg = {}
-    if len(ret_dict) == 0:
-        logging.debug('ret_dict is None')
-        return
 
-    # 创建一个新的工作簿
+    def __init__(self, data_cfg):
+        self.data_cfg = data_cfg
+        self._institutes = {}
+        self._dates = {}
+
+    def institute(self, institute_name):
+        try:
+            return self._institutes[institute_name]
+        except KeyError:
+            pass
+        if institute_name and institute_name in self.data_cfg:
+            value = self.data_cfg[institute_name]
+        elif len(institute_name) >= 2:
+            value = institute_name[0:2] + institute_name[-2:]
+        else:
+            value = institute_name
+        self._institutes[institute_name] = value
+        return value
+
+    def date(self, pass_time_text):
+        # passTimeText 格式 YYYY-MM-DD HH:MM:SS
+        day = pass_time_text[:10]
+        try:
+            return self._dates[day]
+        except KeyError:
+            value = self._dates[day] = f"{int(day[5:7])}.{int(day[8:10])}"
+            return value
+
+    def __call__(self, row, building_show):
+        """
+        :param building_show: 记录所属楼栋的显示名，用于宿舍号列
+        :return: 报表一行的各列取值
+        """
+        pass_time_text = str(row.get('passTimeText', ''))
+        # 培养层次：直接使用API返回的studentType字段
+        student_type = row.get('studentType', '')
+        return [
+            self.date(pass_time_text) if pass_time_text else '',
+            self.institute(row.get('schoolInstituteName', '')),
+            str(row.get('userId', '')),
+            str(row.get('userName', '')),
+            '{}-{}'.format(building_show, str(row.get('roomName', ''))),
+            str(row.get('grade', '')),
+            STUDENT_TYPE_SHOW.get(student_type) or student_type or '本科',
+            # 晚归时间列
+            pass_time_text[10:16] if len(pass_time_text) >= 16 else '',
+        ]
+
+def _cell_style():
+    """所有单元格共用的命名样式：居中对齐、细实线边框"""
+    style = NamedStyle(name=CELL_STYLE_NAME)
+    style.alignment = Alignment(horizontal='center', vertical='center')
+    side = Side(border_style='thin', color='000000')
+    style.border = Border(left=side, right=side, top=side, bottom=side)
+    return style
+
+
+def _check_fields(row):
+    """检测关键字段缺失，记录异常数据到日志"""
+    missing = [f for f in REQUIRED_FIELDS if f not in row or row[f] is None]
+    if missing:
+        logging.warning(f"数据记录缺少字段 {missing}，完整数据: {row}")
+
+
+def _write_row(sheet, idx, values, column_widths):
+    """写入一行并应用样式和行高，同时更新各列最大长度"""
+    for col_idx, value in enumerate(values, 1):
+        cell = sheet.cell(row=idx, column=col_idx, value=value)
+        cell.style = CELL_STYLE_NAME
+        if len(value) > column_widths[col_idx - 1]:
+            column_widths[col_idx - 1] = len(value)
+    sheet.row_dimensions[idx].height = ROW_HEIGHT
+
+
+class _RowProgress:
+    """
+    统计各 sheet 累计写入的行数，每 PROGRESS_EVERY_ROWS 行及全部写完时发布进度事件；
+    开始写入时和每 PROGRESS_EVERY_ROWS 行检查处理时限，用完时抛出 t3.DeadlineExceededError
+    """
+
+    def __init__(self, sheets):
+        t3.check_deadline('生成报表')
+        self.total = sum(len(report_rows) for _, report_rows in sheets)
+        self.written = 0
+
+    def add(self):
+        self.written += 1
+        if self.written % PROGRESS_EVERY_ROWS == 0:
+            t3.check_deadline('生成报表')
+        if self.written % PROGRESS_EVERY_ROWS == 0 or self.written == self.total:
+            progress.emit('excel', f"已写入 {self.written}/{self.total} 行", rows=self.written, total=self.total)
+
+
+def _render_workbook(sheets):
+    """
+    普通模式：整个工作表保存在内存中，写入时同步记录列宽
+    :param sheets: [(sheet 名称, 报表行列表)]
+    """
     new_workbook = Workbook()
+    new_workbook.add_named_style(_cell_style())
+    new_workbook.remove(new_workbook.active)
+    row_progress = _RowProgress(sheets)
 
-    all_data = []
+    for sheet_title, report_rows in sheets:
+        new_sheet1 = new_workbook.create_sheet(sheet_title)
+        column_widths = [0] * len(HEADERS)
+        _write_row(new_sheet1, 1, HEADERS, column_widths)
 
-    for bid, ret_data in ret_dict.items():
-        for row in ret_data:
-            row['roomName'] = '{}-{}'.format(convert_building_show(int(bid)), str(row['roomName']))
+        idx = 2
+        for values in report_rows:
+            _write_row(new_sheet1, idx, values, column_widths)
+            row_progress.add()
+            idx += 1
+
+        # 列宽按写入过程中记录的最大长度一次性设置
+        for col_idx, max_length in enumerate(column_widths, 1):
+            new_sheet1.column_dimensions[get_column_letter(col_idx)].width = (max_length + 2) * 2
+    return new_workbook
 
-    # 调用函数处理数据
+
+def _render_write_only(sheets):
+    """
+    流式模式：基于 openpyxl 只写工作簿，行写入后立即落到临时文件，不保留单元格对象。
+    只写模式要求列宽在写入行之前确定，因此先遍历一遍计算列宽
+    :param sheets: [(sheet 名称, 报表行列表)]
+    """
+    new_workbook = Workbook(write_only=True)
+    new_workbook.add_named_style(_cell_style())
+    row_progress = _RowProgress(sheets)
+
+    for sheet_title, report_rows in sheets:
+        new_sheet1 = new_workbook.create_sheet(sheet_title)
+
+        column_widths = [len(header) for header in HEADERS]
+        for values in report_rows:
+            for col_idx, value in enumerate(values):
+                if len(value) > column_widths[col_idx]:
+                    column_widths[col_idx] = len(value)
+        for col_idx, max_length in enumerate(column_widths, 1):
+            new_sheet1.column_dimensions[get_column_letter(col_idx)].width = (max_length + 2) * 2
+        # 只写模式下逐行设置行高会为每行保留一个对象，改用工作表默认行高
+        new_sheet1.sheet_format.defaultRowHeight = ROW_HEIGHT
+        new_sheet1.sheet_format.customHeight = True
+
+        def styled(values):
+            cells = []
+            for value in values:
+                cell = WriteOnlyCell(new_sheet1, value=value)
+                cell.style = CELL_STYLE_NAME
+                cells.append(cell)
+            return cells
+
+        new_sheet1.append(styled(HEADERS))
+        for values in report_rows:
+            new_sheet1.append(styled(values))
+            row_progress.add()
+    return new_workbook
+
+
+def _build_report_rows(ret_dict, building_show, transform):
+    """楼栋内按学生去重、转换各列并排序，返回报表行列表"""
+    # 各楼栋的记录只遍历一次，可以是列表也可以是逐条产出记录的生成器；
+    # t3.iter_pages 按页产出记录列表，需先用 itertools.chain.from_iterable 展开
     ret_dict_new = process_data(ret_dict)
 
+    # 每条记录的各列只计算一次，排序键直接复用学院列
+    keyed_rows = []
     for bid, ret_data in ret_dict_new.items():
-        all_data += ret_data
+        for row in ret_data:
+            _check_fields(row)
+            values = transform(row, building_show[bid])
+            # 日期和时间直接用 passTimeText 字符串排序（格式 YYYY-MM-DD HH:MM:SS，天然支持字典序）
+            keyed_rows.append((values[1], row.get('passTimeText', ''), values))
 
     # 排序：先按学院升序，再按日期升序，最后按晚归时间升序
-    def sort_key(row):
-        # 学院：使用映射后的名称排序
-        institute = row.get('schoolInstituteName', '')
-        if institute in data_cfg:
-            institute_name = data_cfg[institute]
-        else:
-            institute_name = institute[0:2] + institute[-2:] if len(institute) >= 2 else institute
-        # 日期和时间直接用 passTimeText 字符串排序（格式 YYYY-MM-DD HH:MM:SS，天然支持字典序）
-        pass_time = row.get('passTimeText', '')
-        return (institute_name, pass_time)
-
-    all_data.sort(key=sort_key)
+    keyed_rows.sort(key=lambda item: (item[0], item[1]))
+    return [values for _, _, values in keyed_rows]
 
-    new_sheet1 = new_workbook.active
 
+def _building_sheet_title(building_show):
     # 生成sheet名称，Excel sheet名称最多31个字符
-    sheet_title = '-'.join(convert_building_show(int(bid)) for bid in ret_dict.keys())
+    sheet_title = '-'.join(building_show.values())
     if len(sheet_title) > 31:
         # 名称过长时，显示第一个和最后一个楼栋，中间用省略号
-        building_list = [convert_building_show(int(bid)) for bid in ret_dict.keys()]
+        building_list = list(building_show.values())
         sheet_title = f"{building_list[0]}至{building_list[-1]}栋({len(building_list)}栋)"
         if len(sheet_title) > 31:
             sheet_title = sheet_title[:31]
-    new_sheet1.title = sheet_title
-
-    new_sheet1['A1'] = '日期'
-    new_sheet1['B1'] = '学院'
-    new_sheet1['C1'] = '学号'
-    new_sheet1['D1'] = '姓名'
-    new_sheet1['E1'] = '宿舍号'
-    new_sheet1['F1'] = '年级'
-    new_sheet1['G1'] = '培养层次'
-    new_sheet1['H1'] = '晚归时间'
-
-    required_fields = ['passTimeText', 'schoolInstituteName', 'userId', 'userName', 'roomName', 'grade', 'studentType']
-
-    idx = 2
-    for row in all_data:
-        # 检测关键字段缺失，记录异常数据到日志
-        missing = [f for f in required_fields if f not in row or row[f] is None]
-        if missing:
-            logging.warning(f"数据记录缺少字段 {missing}，完整数据: {row}")
-
-        # 日期列
-        pass_time_text = str(row.get('passTimeText', ''))
-        if pass_time_text:
-            date_time = datetime.datetime.strptime(pass_time_text, "%Y-%m-%d %H:%M:%S")
-            formatted_date = f"{date_time.month}.{date_time.day}"
-        else:
-            formatted_date = ''
-        new_sheet1[f'A{idx}'] = formatted_date
-
-        # 学院列
-        institute_name = row.get('schoolInstituteName', '')
-        if institute_name and institute_name in data_cfg:
-            new_value = data_cfg[institute_name]
-        elif len(institute_name) >= 2:
-            new_value = institute_name[0:2] + institute_name[-2:]
-        else:
-            new_value = institute_name
-        new_sheet1[f'B{idx}'] = new_value
+    return sheet_title
 
-        # 学号列
-        new_sheet1[f'C{idx}'] = str(row.get('userId', ''))
 
-        # 姓名列
-        new_sheet1[f'D{idx}'] = str(row.get('userName', ''))
-
-        # 宿舍号列
-        room_name = str(row.get('roomName', ''))
-        new_sheet1[f'E{idx}'] = room_name
-
-        # 年级列
-        new_sheet1[f'F{idx}'] = str(row.get('grade', ''))
-
-        # 培养层次：直接使用API返回的studentType字段
-        student_type = row.get('studentType', '')
-        if student_type == '本科生':
-            new_sheet1[f'G{idx}'] = '本科'
-        elif student_type == '研究生':
-            new_sheet1[f'G{idx}'] = '研究生'
-        else:
-            new_sheet1[f'G{idx}'] = student_type or '本科'
-
-        # 晚归时间列
-        new_sheet1[f'H{idx}'] = pass_time_text[10:16] if len(pass_time_text) >= 16 else ''
-
-        # 设置样式
-        set_style(new_sheet1)
-
-        idx += 1
+def _save_report(sheets, username, output_dir, write_only_threshold):
+    total_rows = sum(len(report_rows) for _, report_rows in sheets)
+    if write_only_threshold and total_rows > write_only_threshold:
+        logging.info(f"报表共 {total_rows} 行，超过 {write_only_threshold} 行，使用流式只写模式")
+        new_workbook = _render_write_only(sheets)
+    else:
+        new_workbook = _render_workbook(sheets)
 
     ## 保存修改后的工作簿
     # 使用前一天日期生成文件名（晚归数据是前一天晚上的）
     yesterday = datetime.datetime.now() - datetime.timedelta(days=1)
     formatted_date = f"{yesterday.year}.{yesterday.month}.{yesterday.day}"
 
-    path = f"./result-files/{username}"
+    path = output_dir or f"./result-files/{username}"
     if not os.path.exists(path):
         os.makedirs(path)
         logging.debug(f'======================path[{path}]不存在，创建成功========================')
@@ -209,31 +306,44 @@ def gen_excel_data_v1(ret_dict, username, data_cfg=None, request_data=None):
     return file_path
 
 
-def set_style(new_sheet1):
-    # 设置单元格对齐样式
-    align = Alignment(horizontal='center', vertical='center')
-    # 设置单元格边框样式
-    border = Border(left=Side(border_style='thin', color='000000'),
-                    right=Side(border_style='thin', color='000000'),
-                    top=Side(border_style='thin', color='000000'),
-                    bottom=Side(border_style='thin', color='000000'))
-    # 遍历工作表中的所有单元格并设置样式
-    for row in new_sheet1.iter_rows():
-        for cell in row:
-            cell.alignment = align
-            cell.border = border
-    # 设置行高为24
-    for row in new_sheet1.iter_rows():
-        new_sheet1.row_dimensions[row[0].row].height = 24
-    # 设置自适应列宽
-    for col in new_sheet1.columns:
-        max_length = 0
-        column = get_column_letter(col[0].column)  # 获取列字母
-        for cell in col:
-            try:  # 需要尝试因为如果单元格为空将会导致错误
-                if len(str(cell.value)) > max_length:
-                    max_length = len(cell.value)
-            except:
-                pass
-        adjusted_width = (max_length + 2) * 2
-        new_sheet1.column_dimensions[column].width = adjusted_width
+def gen_excel_data_v1(ret_dict, username, data_cfg=None, request_data=None, output_dir=None,
+                      write_only_threshold=0):
+    """
+    生成 Excel 晚归数据文件。
+    :param ret_dict: 各楼栋的晚归数据 {楼栋编号: 记录列表或逐条产出记录的生成器（不是 t3.iter_pages 的分页生成器）}
+    :param username: 用户名（用于文件路径）
+    :param data_cfg: 学院名称映射字典，从调用方传入
+    :param request_data: 请求数据（包含 startDate, endDate 等）
+    :param output_dir: 输出目录，默认 ./result-files/<username>（报表缓存写入自己的目录）
+    :param write_only_threshold: 去重后行数超过该值时使用流式只写模式，0 表示始终使用普通模式
+    """
+    if data_cfg is None:
+        data_cfg = {}
+    if len(ret_dict) == 0:
+        logging.debug('ret_dict is None')
+        return
+
+    building_show = build_building_show(ret_dict.keys())
+    report_rows = _build_report_rows(ret_dict, building_show, RowTransform(data_cfg))
+    return _save_report([(_building_sheet_title(building_show), report_rows)], username, output_dir,
+                        write_only_threshold)
+
+
+def gen_excel_nights(nights, username, data_cfg=None, output_dir=None, write_only_threshold=0):
+    """
+    多天查询按夜生成 Excel，每晚一个 sheet，每晚内按学生去重
+    :param nights: [(sheet 名称, 当晚各楼栋数据 {楼栋编号: 记录列表})]，按日期顺序
+    其余参数同 gen_excel_data_v1
+    """
+    if data_cfg is None:
+        data_cfg = {}
+    if not nights:
+        logging.debug('nights is None')
+        return
+
+    transform = RowTransform(data_cfg)
+    sheets = []
+    for sheet_title, ret_dict in nights:
+        building_show = build_building_show(ret_dict.keys())
+        sheets.append((sheet_title, _build_report_rows(ret_dict, building_show, transform)))
+    return _save_report(sheets, username, output_dir, write_only_threshold)
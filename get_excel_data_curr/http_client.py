@@ -0,0 +1,82 @@
+"""
+公寓系统接口共用的 HTTP 连接池。
+所有楼栋、并发的 Web 查询和定时任务共用同一个 requests.Session，复用 keep-alive 连接。
+"""
+import logging
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 20
+DEFAULT_RETRY_TOTAL = 2
+DEFAULT_RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (502, 503, 504)
+
+_lock = threading.Lock()
+_session = None
+_no_retry_session = None
+_settings = None
+
+
+def _build_session(pool_size, retry_total, retry_backoff):
+    retry = Retry(
+        total=retry_total,
+        connect=retry_total,
+        read=retry_total,
+        backoff_factor=retry_backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET']),
+        # 重试耗尽后返回最后一次响应，由调用方按状态码给出 DataFetchError
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    # sid 每次请求显式传入，会话本身不保存任何 cookie，避免不同登录态互相串用
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+def configure(pool_size=DEFAULT_POOL_SIZE, retry_total=DEFAULT_RETRY_TOTAL, retry_backoff=DEFAULT_RETRY_BACKOFF):
+    """
+    按配置调整连接池大小和重试策略，配置未变化时保持现有连接
+    :param pool_size: 连接池容量（同一主机最多保持的连接数）
+    :param retry_total: 连接失败或 502/503/504 时的重试次数
+    :param retry_backoff: 重试退避因子（秒）
+    """
+    global _session, _no_retry_session, _settings
+    settings = (pool_size, retry_total, retry_backoff)
+    with _lock:
+        if _session is not None and _settings == settings:
+            return
+        # 旧会话可能仍有请求在进行，不主动关闭，由垃圾回收释放
+        _session = _build_session(*settings)
+        _no_retry_session = _build_session(pool_size, 0, retry_backoff)
+        _settings = settings
+    logger.info(f"HTTP 连接池已配置: pool_size={pool_size}, retry_total={retry_total}, retry_backoff={retry_backoff}")
+
+
+def get_session(retry=True):
+    """
+    获取共享的 requests.Session，未配置时使用默认参数创建
+    :param retry: False 时返回不做自动重试的会话，由调用方逐次重试（如需要在每次重试前检查处理时限）
+    """
+    if _session is None:
+        configure()
+    return _session if retry else _no_retry_session
+
+
+def retry_policy():
+    """
+    当前的重试配置
+    :return: tuple(重试次数, 退避因子)
+    """
+    if _settings is None:
+        configure()
+    return _settings[1], _settings[2]
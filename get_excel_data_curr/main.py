@@ -1,6 +1,7 @@
 import traceback
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -8,8 +9,14 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
 import get_excel_data_curr.t3 as t3
+import get_excel_data_curr.cas_login as cas_login
+import get_excel_data_curr.fetch_planner as fetch_planner
+from get_excel_data_curr import adaptive_limit, admission, deadline, http_client, progress
 from get_excel_data_curr.ConfigTool import ConfigTool
-from get_excel_data_curr.gen_excel_data_v1 import gen_excel_data_v1
+from get_excel_data_curr.gen_excel_data_v1 import gen_excel_data_v1, gen_excel_nights
+from get_excel_data_curr.session_store import session_store
+from get_excel_data_curr.record_store import RecordStore
+from get_excel_data_curr.report_cache import report_cache, report_key
 from selenium.webdriver.chrome.service import Service
 from database.db import Database
 
@@ -17,6 +24,10 @@ from database.db import Database
 # 重试配置
 MAX_LOGIN_RETRIES = 3  # 最大重试次数
 RETRY_DELAY = 5  # 重试间隔（秒）
+PAGE_LOAD_TIMEOUT = 30  # 浏览器加载登录页的超时（秒），不超过处理时限的剩余时间
+
+# 登录 URL（未登录时会被重定向到 CAS 登录页）
+LOGIN_URL = "http://gygl.tust.edu.cn:8080/da-roadgate-resident/index"
 
 logger = logging.getLogger(__name__)
 
@@ -49,19 +60,21 @@ def _login_with_retry(driver, login_url, username, password):
     :return: tuple(success: bool, message: str, cookies: list or None)
     """
     for attempt in range(1, MAX_LOGIN_RETRIES + 1):
+        t3.check_deadline('登录')
         logger.info(f"登录尝试 {attempt}/{MAX_LOGIN_RETRIES}")
+        progress.emit('login', f"登录公寓系统（第 {attempt}/{MAX_LOGIN_RETRIES} 次尝试）", attempt=attempt,
+                      max_attempts=MAX_LOGIN_RETRIES)
         
         try:
-            # 打开登录页面
-            driver.get(login_url)
-            
-            # 等待页面加载完成并定位元素
+            # 打开登录页面并等待页面加载完成、定位元素；页面加载受处理时限约束，避免 driver.get 长时间卡住
             try:
-                WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.NAME, "username")))
+                driver.set_page_load_timeout(deadline.cap(PAGE_LOAD_TIMEOUT))
+                driver.get(login_url)
+                WebDriverWait(driver, deadline.cap(10)).until(EC.presence_of_element_located((By.NAME, "username")))
             except TimeoutException:
                 if attempt < MAX_LOGIN_RETRIES:
                     logger.warning(f"第 {attempt} 次登录失败: 页面加载超时，{RETRY_DELAY} 秒后重试...")
-                    time.sleep(RETRY_DELAY)
+                    time.sleep(deadline.cap(RETRY_DELAY))
                     continue
                 else:
                     return (False, "页面加载超时，已达最大重试次数", None)
@@ -86,15 +99,16 @@ def _login_with_retry(driver, login_url, username, password):
             
             # 磉待登录成功（页面标题变化）
             try:
-                WebDriverWait(driver, 10).until(EC.title_contains("公寓出入安全分析系统"))
+                WebDriverWait(driver, deadline.cap(10)).until(EC.title_contains("公寓出入安全分析系统"))
                 print("登录成功！login_url}")
+                progress.emit('login', "登录成功", attempt=attempt, max_attempts=MAX_LOGIN_RETRIES)
                 # 获取 cookie
                 cookies = driver.get_cookies()
                 return (True, "登录成功", cookies)
             except TimeoutException:
                 if attempt < MAX_LOGIN_RETRIES:
                     logger.warning(f"第 {attempt} 次登录失败: 登录后页面加载超时，{RETRY_DELAY} 秒后重试...")
-                    time.sleep(RETRY_DELAY)
+                    time.sleep(deadline.cap(RETRY_DELAY))
                     continue
                 else:
                     return (False, "登录后页面加载超时，已达最大重试次数", None)
@@ -102,7 +116,7 @@ def _login_with_retry(driver, login_url, username, password):
         except Exception as e:
             if attempt < MAX_LOGIN_RETRIES:
                 logger.warning(f"第 {attempt} 次登录失败: {str(e)}， {RETRY_DELAY} 秒后重试...")
-                time.sleep(RETRY_DELAY)
+                time.sleep(deadline.cap(RETRY_DELAY))
                 continue
             else:
                 return (False, f"登录异常: {str(e)}", None)
@@ -110,82 +124,327 @@ def _login_with_retry(driver, login_url, username, password):
     return (False, "超过最大重试次数", None)
 
 
-def process(data=None):
-    """主处理函数，带登录重试机制"""
-    # 从数据库读取配置
-    config_tool = _get_config_tool()
-    
-    # 登录信息
-    username = config_tool.get_username()
-    password = config_tool.get_password()
-    
-    if username == '' or password == '':
-        return {
-            'msg': '公寓系统用户信息为空，请在管理页面检查配置',
-            'status': 'false',
-        }
-    
-    verify(config_tool)
-    
-    # 登录 URL
-    login_url = "http://gygl.tust.edu.cn:8080/da-roadgate-resident/index"
-    
+def _login_with_browser(config_tool, login_url, username, password):
+    """启动无头 Chrome 完成登录，返回值同 _login_with_retry"""
     # 设置 Chrome 选项
     options = webdriver.ChromeOptions()
     options.add_argument("--headless")
     options.add_argument("--disable-gpu")
     options.add_argument("--no-sandbox")
     options.add_argument('--disable-dev-shm-usage')
-    
+
     binary_location = config_tool.get_binary_location()
     driver_location = config_tool.get_driver_location()
-    
+
     if binary_location != "":
         options.browser_version = "stable"
         options.binary_location = binary_location
-    if driver_location != "":
-        service = Service(driver_location)
-        driver = webdriver.Chrome(service=service, options=options)
-    else:
-        driver = webdriver.Chrome(options=options)
-    
+
+    # 同时运行的 Chrome 数受浏览器槽位限制，槽位占满且无法排队时抛出 AdmissionBusy
+    with admission.browser_slots.slot():
+        # 等待浏览器槽位可能用完时限，用完时不再启动 Chrome
+        t3.check_deadline('登录')
+        if driver_location != "":
+            service = Service(driver_location)
+            driver = webdriver.Chrome(service=service, options=options)
+        else:
+            driver = webdriver.Chrome(options=options)
+
+        try:
+            return _login_with_retry(driver, login_url, username, password)
+        finally:
+            driver.quit()
+
+
+def _login(config_tool, login_url, username, password):
+    """
+    按 system_config 中的 login_mode 选择登录方式
+    :return: tuple(success: bool, message: str, cookies: list or None)
+    """
+    t3.check_deadline('登录')
+    login_mode = config_tool.get_login_mode()
+    if login_mode in ('http', 'auto'):
+        success, message, cookies, failure = cas_login.login_with_requests(
+            login_url, username, password, max_retries=MAX_LOGIN_RETRIES, retry_delay=RETRY_DELAY)
+        # 账号密码被拒绝时浏览器登录同样会失败，不再占用浏览器槽位
+        if success or login_mode == 'http' or failure == cas_login.BAD_CREDENTIALS:
+            return (success, message, cookies)
+        logger.warning(f"HTTP 登录失败（{message}），回退到浏览器登录")
+    return _login_with_browser(config_tool, login_url, username, password)
+
+
+def _extract_sid(cookies):
+    """从 cookie 列表中取出 sid，找不到时沿用第一个 cookie"""
+    for cookie in cookies:
+        if cookie.get('name') == 'sid':
+            return cookie['value']
+    return cookies[0]['value']
+
+
+def _fetch_one_building(cookie, bid, b_num, data, fetch_options, store=None):
+    """拉取单个楼栋数据并计时，返回 (rows, error_msg, elapsed)；传入 store 时只补拉本地缺失的时间段"""
+    start = time.time()
+    try:
+        if store is not None:
+            rows = store.fetch(cookie, bid, b_num, data, fetch_options)
+        else:
+            rows = t3.deal(cookie, bid, b_num, data, **fetch_options)
+        return rows, None, time.time() - start
+    except t3.DataFetchError as e:
+        if isinstance(e, t3.SessionExpiredError):
+            session_store.invalidate(cookie)
+        return None, f"楼栋{b_num}: {e}", time.time() - start
+
+
+def _fetch_group(cookie, task, data, fetch_options, store=None):
+    """整楼群查询一次后按楼栋拆分，返回 {楼栋编号: (rows, error_msg, elapsed)}"""
+    start = time.time()
+    synced_at = datetime.now()
+    try:
+        rows = t3.deal(cookie, '', task.label, data, building_group_id=task.group_id, **fetch_options)
+    except t3.DataFetchError as e:
+        if isinstance(e, t3.SessionExpiredError):
+            session_store.invalidate(cookie)
+        elapsed = time.time() - start
+        return {b_num: (None, f"楼栋{b_num}: {e}", elapsed) for b_num in task.buildings}
+
+    split = fetch_planner.split_rows_by_building(rows, task.buildings, min_share=task.share)
+    if split is None:
+        logger.warning(f"{task.label}无法按楼栋拆分，改为逐栋查询")
+        return {b_num: _fetch_one_building(cookie, bid, b_num, data, fetch_options, store)
+                for b_num, bid in task.buildings.items()}
+    if store is not None:
+        begin_time, end_time = t3.query_window(data)
+        for b_num, b_rows in split.items():
+            store.save(b_num, b_rows, begin_time, end_time, synced_at=synced_at)
+    elapsed = time.time() - start
+    return {b_num: (b_rows, None, elapsed) for b_num, b_rows in split.items()}
+
+
+def _run_fetch_task(cookie, task, data, fetch_options, store=None):
+    if task.kind == 'group':
+        return _fetch_group(cookie, task, data, fetch_options, store)
+    b_num, bid = next(iter(task.buildings.items()))
+    return {b_num: _fetch_one_building(cookie, bid, b_num, data, fetch_options, store)}
+
+
+def _fetch_buildings(cookie, bid_dict, data, fetch_options, building_workers, all_bid_dict=None, group_ratio=2,
+                     store=None):
+    """
+    按取数计划并发拉取多个楼栋的数据，共用同一个 sid
+    :param bid_dict: 选中的楼栋 {楼栋编号: 楼栋内部 ID}
+    :param fetch_options: 透传给 t3.deal 的分页参数（page_size / max_workers / probe_size）
+    :param building_workers: 同时执行的取数任务数上限，1 表示逐个顺序拉取
+    :param all_bid_dict: 配置中的全部楼栋，用于判断是否整楼群查询；None 时等同 bid_dict
+    :param group_ratio: 楼群内选中比例达到该值时整楼群查询，大于 1 表示不启用
+    :param store: RecordStore 实例，传入时已完整缓存的楼栋探测无变化即读本地，其余楼栋只补拉缺失时间段
+    :return: tuple(ret_dict, fetch_errors)，ret_dict 保持 bid_dict 的楼栋顺序
+    """
+    start = time.time()
+    tasks = []
+    pending = bid_dict
+    if store is not None:
+        # 已完整缓存的楼栋逐栋处理（读本地或探测变化），不参与整楼群查询
+        begin_time, end_time = t3.query_window(data)
+        cached = [b_num for b_num in bid_dict if store.is_covered(b_num, begin_time, end_time)]
+        tasks = [fetch_planner.FetchTask('building', {b_num: bid_dict[b_num]}) for b_num in cached]
+        pending = {b_num: bid for b_num, bid in bid_dict.items() if b_num not in cached}
+        if cached:
+            logger.info(f"楼栋 {','.join(cached)} 已完整缓存")
+
+    tasks += fetch_planner.plan_fetch(pending, all_bid_dict or bid_dict, group_ratio)
+    workers = max(1, min(building_workers, len(tasks)))
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [progress.submit(executor, _run_fetch_task, cookie, task, data, fetch_options, store)
+                   for task in tasks]
+        for future in futures:
+            results.update(future.result())
+
+    ret_dict = {}
+    fetch_errors = []
+    for b_num in bid_dict:
+        rows, error_msg, elapsed = results[b_num]
+        if error_msg is None:
+            ret_dict[b_num] = rows
+            logger.info(f"楼栋{b_num}取数完成，共{len(rows)}条，耗时 {elapsed:.2f} 秒")
+        else:
+            fetch_errors.append(error_msg)
+            logger.error(f"楼栋取数失败: {error_msg}（耗时 {elapsed:.2f} 秒）")
+    logger.info(f"{len(bid_dict)}个楼栋取数总耗时 {time.time() - start:.2f} 秒"
+                f"（{len(tasks)}个取数任务，并发数 {workers}）")
+    return ret_dict, fetch_errors
+
+
+def _acquire_sid(config_tool):
+    """
+    校验账号配置并获取公寓系统 sid（优先复用进程内缓存，失效时再登录）
+    :return: tuple(success: bool, message: str, sid: str or None)
+    """
+    username = config_tool.get_username()
+    password = config_tool.get_password()
+
+    if username == '' or password == '':
+        return False, '公寓系统用户信息为空，请在管理页面检查配置', None
+
+    verify(config_tool)
+
+    # 共享连接池按配置调整（配置未变化时复用现有连接）
+    http_client.configure(pool_size=config_tool.get_http_pool_size(), retry_total=config_tool.get_http_retry_total())
+    # 启用自适应并发时取数请求槽位上限取学到的并发数，upstream_slots 作为上限
+    upstream_limit = adaptive_limit.upstream_limit.configure(
+        config_tool.get_upstream_adaptive_enabled(), config_tool.get_upstream_min_slots(),
+        config_tool.get_upstream_slots(), latency_target=config_tool.get_upstream_latency_target_seconds(),
+        saved_level=config_tool.get_upstream_adaptive_level())
+    admission.configure(browser_limit=config_tool.get_browser_slots(),
+                        browser_max_waiting=config_tool.get_browser_max_waiting(),
+                        upstream_limit=upstream_limit,
+                        upstream_max_waiting=config_tool.get_upstream_max_waiting(),
+                        wait_seconds=config_tool.get_admission_wait_seconds())
+    deadline.configure(connect_timeout=config_tool.get_upstream_connect_timeout(),
+                       read_timeout=config_tool.get_upstream_read_timeout())
+
+    def login_func():
+        success, message, cookies = _login(config_tool, LOGIN_URL, username, password)
+        return (success, message, _extract_sid(cookies) if success else None)
+
+    # 登录方式为 HTTP 或浏览器，均带重试
+    return session_store.get_sid(login_func, t3.is_session_valid, config_tool.get_session_validate_interval())
+
+
+def _save_upstream_level(config_tool):
+    """自适应并发学到的并发数有变化时写回 system_config，服务重启后从该值开始"""
+    level = adaptive_limit.upstream_limit.pop_changed_level()
+    if level is None:
+        return
     try:
-        # 使用带重试的登录函数
-        success, message, cookies = _login_with_retry(driver, login_url, username, password)
+        config_tool.db.set_config('upstream_adaptive_level', str(level), '自适应并发学到的公寓系统请求并发数（自动维护）')
+        logger.info(f"已保存公寓系统请求并发数: {level}")
+    except Exception as e:
+        logger.warning(f"保存公寓系统请求并发数失败: {e}")
+
+
+def _get_fetch_options(config_tool):
+    """从配置获取透传给 t3.deal 的分页参数"""
+    return {
+        'page_size': config_tool.get_pagesize(),
+        'max_workers': config_tool.get_page_fetch_workers(),
+        'probe_size': config_tool.get_probe_page_size(),
+    }
+
+
+def _get_record_store(config_tool):
+    """按配置创建出入记录本地缓存，未启用时返回 None"""
+    if not config_tool.get_record_store_enabled():
+        return None
+    return RecordStore(config_tool.db, sync_lag_minutes=config_tool.get_record_sync_lag_minutes(),
+                       probe_hours=config_tool.get_record_probe_hours())
+
+
+def _get_report_cache(config_tool):
+    """按配置创建报表缓存，未启用时返回 None"""
+    if not config_tool.get_report_cache_enabled():
+        return None
+    report_cache.configure(max_bytes=config_tool.get_report_cache_max_mb() * 1024 * 1024,
+                           max_age_hours=config_tool.get_report_cache_max_age_hours())
+    return report_cache
+
+
+def _fetch_nights(cookie, nights, bid_dict, fetch_options, building_workers, night_workers, **kwargs):
+    """
+    逐晚取数，多晚并行；每晚的时间窗口在本地缓存中独立记录
+    :param nights: t3.split_nights 拆分后的请求列表
+    :param night_workers: 同时查询的夜数上限
+    :param kwargs: 透传给 _fetch_buildings 的 all_bid_dict/group_ratio/store
+    :return: [(夜间请求, ret_dict, fetch_errors)]，与 nights 顺序一致
+    """
+    if len(nights) == 1:
+        return [(nights[0],) + _fetch_buildings(cookie, bid_dict, nights[0], fetch_options, building_workers, **kwargs)]
+
+    logger.info(f"查询跨 {len(nights)} 晚，按晚拆分查询")
+    workers = max(1, min(night_workers, len(nights)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [progress.submit(executor, _fetch_buildings, cookie, bid_dict, night, fetch_options, building_workers,
+                                   **kwargs)
+                   for night in nights]
+        return [(night,) + future.result() for night, future in zip(nights, futures)]
+
+
+def _generate_report(config_tool, records, data_cfg, data, render, output_dir=None):
+    """
+    生成报表，相同输入已生成过时直接复用
+    :param records: 计入报表缓存键的记录
+    :param render: 函数 render(output_dir, write_only_threshold)，output_dir 为 None 表示写入用户目录
+    :param output_dir: 未启用报表缓存时的输出目录，None 表示用户目录
+    """
+    write_only_threshold = config_tool.get_excel_write_only_threshold()
+    cache = _get_report_cache(config_tool)
+    if cache is None:
+        return render(output_dir, write_only_threshold)
+    return cache.get_or_create(report_key(records, data_cfg, data),
+                               lambda report_dir: render(report_dir, write_only_threshold))
+
+
+def _report_progress(on_progress, percent, message):
+    """调用方传入进度回调时报告当前阶段"""
+    if on_progress is not None:
+        on_progress(percent, message)
+
+
+def process(data=None, on_progress=None, output_dir=None):
+    """
+    主处理函数，带登录重试机制
+    :param on_progress: 可选的进度回调 on_progress(百分比, 阶段说明)，后台任务用于更新任务进度
+    :param output_dir: 未启用报表缓存时报表的输出目录，默认 ./result-files/<username>；
+                       启用时报表写入缓存目录，按内容哈希区分，不使用该参数
+    """
+    # 从数据库读取配置
+    config_tool = _get_config_tool()
+    # 登录、分页取数和生成报表共用同一个处理时限，用完后以 DataFetchError 结束
+    deadline_token = deadline.start(config_tool.get_query_deadline_seconds())
+
+    try:
+        _report_progress(on_progress, 10, '登录公寓系统')
+        success, message, value_ = _acquire_sid(config_tool)
         
         if not success:
-            driver.quit()
             return {
                 'msg': message,
                 'status': 'false',
             }
         
-        # 获取 cookie 值
-        value_ = cookies[0]['value']
-        
         bid_dict = config_tool.get_bid_dict()
         new_bid_dict = {}
         for idx in data['buildings']:
             new_bid_dict[idx] = bid_dict[idx]
         
-        # 从配置获取 page_size 和 data_cfg
-        page_size = config_tool.get_pagesize()
+        # 从配置获取分页参数和 data_cfg
+        fetch_options = _get_fetch_options(config_tool)
         data_cfg = config_tool.get_data_cfg()
         
-        # 循环查n个公寓数据
+        # 并发查询n个公寓数据（选中楼群大部分楼栋时整楼群查询）；跨多天的查询按晚拆分，多晚并行
         print("数据处理中，具体进度如下：")
-        ret_dict = {}
-        fetch_errors = []
-        for b_num, bid in new_bid_dict.items():
-            try:
-                ret_data = t3.deal(value_, bid, b_num, data, page_size=page_size)
-                ret_dict[b_num] = ret_data
-            except t3.DataFetchError as e:
-                error_msg = f"楼栋{b_num}: {e}"
-                fetch_errors.append(error_msg)
-                logger.error(f"楼栋取数失败: {error_msg}")
-
-        if not ret_dict:
+        _report_progress(on_progress, 30, '查询出入记录')
+        store = _get_record_store(config_tool)
+        nights = t3.split_nights(data)
+        # 整个查询只在开始取数前准入一次，之后各楼栋、各分页的请求排队等待槽位直到处理时限，不再单独拒绝
+        admission_token = admission.admit()
+        try:
+            night_results = _fetch_nights(
+                value_, nights, new_bid_dict, fetch_options, config_tool.get_building_fetch_workers(),
+                config_tool.get_night_fetch_workers(),
+                all_bid_dict=bid_dict, group_ratio=config_tool.get_group_fetch_ratio(), store=store)
+        finally:
+            admission.unbind(admission_token)
+
+        if len(nights) == 1:
+            _, ret_dict, fetch_errors = night_results[0]
+            night_dicts = [(None, ret_dict)] if ret_dict else []
+        else:
+            fetch_errors = [f"{t3.night_label(night)} {error}" for night, _, errors in night_results for error in errors]
+            night_dicts = [(t3.night_label(night), ret_dict) for night, ret_dict, _ in night_results if ret_dict]
+
+        if not night_dicts:
             msg = "所有楼栋取数失败：" + "；".join(fetch_errors)
             logger.error(msg)
             return {
@@ -196,14 +455,40 @@ def process(data=None):
         if fetch_errors:
             logger.warning(f"部分楼栋取数失败，继续生成成功楼栋报表：{'；'.join(fetch_errors)}")
         
-        # 生成excel数据
-        file_name = gen_excel_data_v1(ret_dict, data['username'], data_cfg=data_cfg, request_data=data)
+        # 生成excel数据（相同输入已生成过时直接复用）；多晚查询每晚一个 sheet
+        _report_progress(on_progress, 80, '生成报表')
+        if len(nights) == 1:
+            file_name = _generate_report(
+                config_tool, ret_dict, data_cfg, data,
+                lambda report_dir, threshold: gen_excel_data_v1(ret_dict, data['username'], data_cfg=data_cfg,
+                                                                request_data=data, output_dir=report_dir,
+                                                                write_only_threshold=threshold),
+                output_dir)
+        else:
+            file_name = _generate_report(
+                config_tool, dict(night_dicts), data_cfg, data,
+                lambda report_dir, threshold: gen_excel_nights(night_dicts, data['username'], data_cfg=data_cfg,
+                                                               output_dir=report_dir, write_only_threshold=threshold),
+                output_dir)
         
         return {
             'file_name': file_name,
             'status': 'success',
         }
         
+    except admission.AdmissionBusy as e:
+        logger.warning(f"查询被准入控制拒绝: {e}")
+        return {
+            'msg': str(e),
+            'status': 'busy',
+            'retry_after': e.retry_after,
+        }
+    except t3.DeadlineExceededError as e:
+        logger.error(f"处理超时: {e}")
+        return {
+            'msg': str(e),
+            'status': 'false',
+        }
     except Exception as e:
         traceback.print_exc()
         print(f"处理失败: {e}")
@@ -211,6 +496,48 @@ def process(data=None):
             'msg': str(e),
             'status': 'false',
         }
-        
     finally:
-        driver.quit()
+        deadline.unbind(deadline_token)
+        _save_upstream_level(config_tool)
+
+
+def prefetch():
+    """
+    预取上一晚全部楼栋的出入记录写入本地缓存（由定时任务在 end_time 之后调用），
+    之后默认日期范围的查询可直接命中缓存
+    :return: dict(status, msg, window, buildings, failed)
+    """
+    config_tool = _get_config_tool()
+    store = _get_record_store(config_tool)
+    if store is None:
+        return {'msg': '出入记录缓存未启用（record_store_enabled != true），跳过预取', 'status': 'false'}
+
+    data = {'startTime': config_tool.get_beginTime(), 'endTime': config_tool.get_endTime()}
+    window = list(t3.query_window(data))
+    try:
+        success, message, value_ = _acquire_sid(config_tool)
+        if not success:
+            return {'msg': message, 'status': 'false', 'window': window}
+
+        bid_dict = config_tool.get_bid_dict()
+        # 预取不限时，准入后的分页请求一直排队到有空闲槽位，不会因页面查询高峰而中途失败
+        admission_token = admission.admit()
+        try:
+            ret_dict, fetch_errors = _fetch_buildings(
+                value_, bid_dict, data, _get_fetch_options(config_tool), config_tool.get_building_fetch_workers(),
+                all_bid_dict=bid_dict, group_ratio=config_tool.get_group_fetch_ratio(), store=store)
+        finally:
+            admission.unbind(admission_token)
+        failed = [b_num for b_num in bid_dict if b_num not in ret_dict]
+        return {
+            'msg': "；".join(fetch_errors),
+            'status': 'success' if ret_dict else 'false',
+            'window': window,
+            'buildings': list(ret_dict.keys()),
+            'failed': failed,
+        }
+    except Exception as e:
+        logger.error(f"预取失败: {e}")
+        return {'msg': str(e), 'status': 'false', 'window': window}
+    finally:
+        _save_upstream_level(config_tool)
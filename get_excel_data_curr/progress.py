@@ -0,0 +1,161 @@
+"""
+查询进度事件总线。
+登录、分页取数、生成报表时发布进度事件，页面按后台任务 ID 订阅，经 SSE 实时推送。
+发布方不需要知道任务 ID：后台任务执行前用 bind() 把任务 ID 绑定到当前上下文，
+提交到线程池的子任务通过 submit() 继承调用方的绑定；未绑定时 emit() 直接返回。
+订阅方应先确认任务存在再订阅（app.py 的 /jobs/<job_id>/events 对未知任务返回 404）；
+未发布过事件的频道在最后一个订阅者离开时删除，长时间无事件且无订阅者的频道在打开新频道时清理。
+"""
+import contextvars
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+END_STAGE = 'end'
+
+_current_channel = contextvars.ContextVar('progress_channel', default=None)
+
+
+class _Channel:
+    def __init__(self, history):
+        self.history = deque(maxlen=history)
+        self.subscribers = []
+        self.closed = False
+        self.active_at = time.monotonic()
+
+
+class ProgressBus:
+    def __init__(self, history=200, closed_channels=100, idle_seconds=3600):
+        """
+        :param history: 每个频道保留的最近事件数，晚订阅的页面先收到这些事件
+        :param closed_channels: 保留已结束频道的个数，任务结束后才订阅也能收到结束事件
+        :param idle_seconds: 未结束的频道超过该秒数没有新事件且没有订阅者时删除
+        """
+        self.history = history
+        self.closed_channels = closed_channels
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._closed = OrderedDict()
+
+    def _open_channel(self, channel):
+        ch = self._channels.get(channel) or self._closed.get(channel)
+        if ch is None:
+            self._expire_idle()
+            ch = self._channels[channel] = _Channel(self.history)
+        return ch
+
+    def _expire_idle(self):
+        """删除长时间无事件且无订阅者的未结束频道，如任务异常退出未调用 close() 留下的频道"""
+        now = time.monotonic()
+        for channel, ch in list(self._channels.items()):
+            if not ch.subscribers and now - ch.active_at > self.idle_seconds:
+                del self._channels[channel]
+
+    def publish(self, channel, event):
+        with self._lock:
+            ch = self._open_channel(channel)
+            ch.active_at = time.monotonic()
+            ch.history.append(event)
+            for subscriber in ch.subscribers:
+                subscriber.put(event)
+
+    def close(self, channel, event):
+        """发布结束事件并关闭频道，之后的订阅只回放历史事件"""
+        event = dict(event, stage=END_STAGE)
+        with self._lock:
+            ch = self._open_channel(channel)
+            ch.history.append(event)
+            for subscriber in ch.subscribers:
+                subscriber.put(event)
+            ch.subscribers = []
+            ch.closed = True
+            self._channels.pop(channel, None)
+            self._closed[channel] = ch
+            while len(self._closed) > self.closed_channels:
+                self._closed.popitem(last=False)
+
+    def subscribe(self, channel):
+        """
+        订阅频道
+        :return: queue.Queue，已有的历史事件已放入队列
+        """
+        subscriber = queue.Queue()
+        with self._lock:
+            ch = self._open_channel(channel)
+            for event in ch.history:
+                subscriber.put(event)
+            if not ch.closed:
+                ch.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, channel, subscriber):
+        with self._lock:
+            ch = self._channels.get(channel)
+            if ch is not None and subscriber in ch.subscribers:
+                ch.subscribers.remove(subscriber)
+                if not ch.subscribers and not ch.history:
+                    # 只因订阅而打开、从未发布过事件的频道，之后发布时会重新打开
+                    del self._channels[channel]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'open_channels': len(self._channels),
+                'closed_channels': len(self._closed),
+                'subscribers': sum(len(ch.subscribers) for ch in self._channels.values()),
+            }
+
+
+# 全进程共用的进度事件总线
+progress_bus = ProgressBus()
+
+
+def bind(channel):
+    """把当前上下文的进度事件发布到 channel，返回值传给 unbind 恢复"""
+    return _current_channel.set(channel)
+
+
+def unbind(token):
+    _current_channel.reset(token)
+
+
+def emit(stage, message, **fields):
+    """
+    发布进度事件，当前上下文未绑定频道时不做任何事
+    :param stage: login/page/building/excel 等阶段标识
+    :param message: 页面直接显示的说明
+    """
+    channel = _current_channel.get()
+    if channel is None:
+        return
+    event = {'stage': stage, 'message': message, 'time': time.strftime('%H:%M:%S')}
+    event.update(fields)
+    progress_bus.publish(channel, event)
+
+
+def submit(executor, fn, *args, **kwargs):
+    """提交到线程池，子任务复制调用方上下文：发布的进度事件与调用方使用同一频道，并共用同一个处理时限"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def sse_stream(channel, keepalive_seconds=15):
+    """
+    按 SSE 格式逐条产出频道事件，收到结束事件后停止；空闲时定期发送注释行保持连接
+    :return: 生成器，每次产出一段 text/event-stream 文本
+    """
+    subscriber = progress_bus.subscribe(channel)
+    try:
+        while True:
+            try:
+                event = subscriber.get(timeout=keepalive_seconds)
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+            if event['stage'] == END_STAGE:
+                return
+    finally:
+        progress_bus.unsubscribe(channel, subscriber)
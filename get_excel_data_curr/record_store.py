@@ -0,0 +1,159 @@
+"""
+出入记录本地缓存。
+按 (楼栋, 时间窗口) 记录已完整同步的范围，重复或重叠的查询只向公寓系统请求缺失的时间段。
+"""
+import logging
+from datetime import datetime, timedelta
+
+import get_excel_data_curr.t3 as t3
+from get_excel_data_curr.records import project_rows
+
+logger = logging.getLogger(__name__)
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _shift(time_text, seconds):
+    return (datetime.strptime(time_text, TIME_FORMAT) + timedelta(seconds=seconds)).strftime(TIME_FORMAT)
+
+
+def subtract_ranges(begin, end, covered):
+    """
+    计算 [begin, end] 中未被 covered 覆盖的时间段（闭区间，精确到秒）
+    :param covered: [(begin_time, end_time), ...]
+    :return: [(begin_time, end_time), ...]
+    """
+    gaps = []
+    cursor = begin
+    for w_begin, w_end in sorted(covered):
+        if w_end < cursor:
+            continue
+        if w_begin > end:
+            break
+        if w_begin > cursor:
+            gaps.append((cursor, _shift(w_begin, -1)))
+        cursor = max(cursor, _shift(w_end, 1))
+        if cursor > end:
+            return gaps
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def window_request(requst_data, begin_time, end_time):
+    """复制请求数据并把查询窗口替换为 [begin_time, end_time]"""
+    sub_request = dict(requst_data)
+    sub_request['startDate'], sub_request['startTime'] = begin_time[:10], begin_time[11:]
+    sub_request['endDate'], sub_request['endTime'] = end_time[:10], end_time[11:]
+    return sub_request
+
+
+class RecordStore:
+    def __init__(self, db, sync_lag_minutes=10, probe_hours=24):
+        """
+        :param db: Database 实例
+        :param sync_lag_minutes: 公寓系统入库延迟（分钟），距同步时刻不足该时长的数据不标记为已同步
+        :param probe_hours: 结束时间在最近该小时数内的已缓存窗口，复用前先探测 total 是否变化；0 表示不探测
+        """
+        self.db = db
+        self.sync_lag_minutes = sync_lag_minutes
+        self.probe_hours = probe_hours
+
+    def missing_ranges(self, b_num, begin_time, end_time):
+        windows = self.db.get_sync_windows(b_num, begin_time, end_time)
+        return subtract_ranges(begin_time, end_time, [(w['begin_time'], w['end_time']) for w in windows])
+
+    def is_covered(self, b_num, begin_time, end_time):
+        return not self.missing_ranges(b_num, begin_time, end_time)
+
+    def load(self, b_num, begin_time, end_time):
+        return project_rows(self.db.get_inout_records(b_num, begin_time, end_time))
+
+    def save(self, b_num, rows, begin_time, end_time, synced_at=None):
+        """
+        保存 [begin_time, end_time] 的完整抓取结果，只把已稳定（早于同步时刻减入库延迟）的部分标记为已同步
+        :param synced_at: 发起抓取的时刻，默认当前时间
+        """
+        storable = [r for r in rows if r.get('passTimeText') and r.get('userId') is not None]
+        self.db.save_inout_records(b_num, storable)
+        if len(storable) != len(rows):
+            logger.warning(f"楼栋{b_num}有{len(rows) - len(storable)}条记录缺少 passTimeText/userId，窗口不标记为已同步")
+            return
+
+        final_until = ((synced_at or datetime.now()) - timedelta(minutes=self.sync_lag_minutes)).strftime(TIME_FORMAT)
+        complete_end = min(end_time, final_until)
+        if complete_end < begin_time:
+            return
+        record_count = sum(1 for r in storable if r['passTimeText'] <= complete_end)
+        self.db.add_sync_window(b_num, begin_time, complete_end, record_count)
+
+    def fetch(self, cookie, bid, b_num, requst_data, fetch_options):
+        """
+        先查本地缓存，只向公寓系统请求缺失的时间段
+        :param fetch_options: 透传给 t3.deal 的分页参数
+        :return: 窗口内的全部记录
+        """
+        begin_time, end_time = t3.query_window(requst_data)
+        gaps = self.missing_ranges(b_num, begin_time, end_time)
+        if not gaps:
+            return self.revalidate(cookie, bid, b_num, requst_data, fetch_options)
+
+        if gaps == [(begin_time, end_time)]:
+            # 本地没有任何已同步数据，直接返回接口结果
+            synced_at = datetime.now()
+            rows = t3.deal(cookie, bid, b_num, requst_data, **fetch_options)
+            self.save(b_num, rows, begin_time, end_time, synced_at=synced_at)
+            return rows
+
+        logger.info(f"楼栋{b_num} [{begin_time}, {end_time}] 部分命中本地缓存，补拉 {gaps}")
+        for gap_begin, gap_end in gaps:
+            synced_at = datetime.now()
+            rows = t3.deal(cookie, bid, b_num, window_request(requst_data, gap_begin, gap_end), **fetch_options)
+            self.save(b_num, rows, gap_begin, gap_end, synced_at=synced_at)
+        return self.load(b_num, begin_time, end_time)
+
+    def needs_probe(self, end_time):
+        if self.probe_hours <= 0:
+            return False
+        recent_from = (datetime.now() - timedelta(hours=self.probe_hours)).strftime(TIME_FORMAT)
+        return end_time >= recent_from
+
+    def synced_count(self, b_num, begin_time, end_time):
+        """
+        [begin_time, end_time] 内同步时接口返回的原始记录数（去重前），与接口 total 直接可比
+        :return: int；已同步窗口超出查询范围或相互重叠、无法得出该范围的原始条数时返回 None
+        """
+        windows = self.db.get_sync_windows(b_num, begin_time, end_time)
+        for w in windows:
+            if (w['begin_time'], w['end_time']) == (begin_time, end_time):
+                return w['record_count']
+        cursor = begin_time
+        for w in windows:
+            if w['begin_time'] < cursor or w['end_time'] > end_time:
+                return None
+            cursor = _shift(w['end_time'], 1)
+        return sum(w['record_count'] for w in windows)
+
+    def revalidate(self, cookie, bid, b_num, requst_data, fetch_options):
+        """
+        复用已完整缓存的窗口：近期窗口先用 limit=1 请求比较接口 total 与同步时记录的原始条数，
+        一致直接读本地，否则整窗口重新拉取。
+        不按 offset 只补拉尾部：接口未保证按通行时间升序返回，新增记录不一定排在末尾
+        """
+        begin_time, end_time = t3.query_window(requst_data)
+        if not self.needs_probe(end_time):
+            logger.info(f"楼栋{b_num} [{begin_time}, {end_time}] 命中本地缓存")
+            return self.load(b_num, begin_time, end_time)
+
+        total = t3.fetch_total(cookie, bid, b_num, requst_data)
+        synced_count = self.synced_count(b_num, begin_time, end_time)
+        if total == synced_count:
+            logger.info(f"楼栋{b_num} [{begin_time}, {end_time}] 命中本地缓存（total={total} 未变化）")
+            return self.load(b_num, begin_time, end_time)
+
+        logger.info(f"楼栋{b_num} 同步时 {synced_count} 条与接口 total={total} 不一致，整窗口重新拉取")
+        synced_at = datetime.now()
+        rows = t3.deal(cookie, bid, b_num, requst_data, **fetch_options)
+        self.db.delete_inout_records(b_num, begin_time, end_time)
+        self.save(b_num, rows, begin_time, end_time, synced_at=synced_at)
+        return rows
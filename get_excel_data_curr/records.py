@@ -0,0 +1,77 @@
+"""
+出入记录的紧凑表示。
+接口返回的每条记录带有几十个字段，报表和本地缓存只用到其中少数几个；
+在 t3 取数时即投影为 InoutRecord，重复度高的字段值（学院、年级、培养层次）做字符串驻留。
+"""
+import sys
+
+# 下游用到的字段：gen_excel_data_v1 的各列、record_store 的去重键、fetch_planner 的楼栋拆分
+FIELDS = ('userId', 'userName', 'passTimeText', 'roomName', 'schoolInstituteName', 'grade', 'studentType',
+          'buildingId')
+INTERNED_FIELDS = frozenset(['schoolInstituteName', 'grade', 'studentType', 'buildingId'])
+
+
+class InoutRecord:
+    """
+    只保存 FIELDS 中字段的记录，支持 record['userId']、record.get()、'x' in record 等字典式访问。
+    接口未返回的字段视为不存在（'x' in record 为 False），与原始 dict 行为一致
+    """
+    __slots__ = FIELDS
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, row):
+        record = cls.__new__(cls)
+        for key in FIELDS:
+            if key in row:
+                record[key] = row[key]
+        return record
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key in INTERNED_FIELDS and type(value) is str:
+            value = sys.intern(value)
+        try:
+            setattr(self, key, value)
+        except AttributeError:
+            raise KeyError(f"InoutRecord 不支持字段 {key}") from None
+
+    def __contains__(self, key):
+        return key in FIELDS and hasattr(self, key)
+
+    def get(self, key, default=None):
+        if key not in FIELDS:
+            return default
+        return getattr(self, key, default)
+
+    def keys(self):
+        return [key for key in FIELDS if hasattr(self, key)]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.keys()}
+
+    def __eq__(self, other):
+        if isinstance(other, (InoutRecord, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"InoutRecord({self.to_dict()})"
+
+
+def project_rows(rows):
+    """把接口返回的原始记录投影为 InoutRecord 列表"""
+    return [InoutRecord.from_dict(row) for row in rows]
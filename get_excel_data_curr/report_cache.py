@@ -0,0 +1,159 @@
+"""
+生成报表缓存。
+以 (请求参数, 取回的记录, 学院映射) 的哈希为键保存生成好的 Excel，相同输入直接复用同一文件，不再重新渲染。
+缓存目录按最近使用时间淘汰：超过保留时长或总大小超限时删除最久未用的报表。
+process() 共用模块级的 report_cache，淘汰由同一把锁串行执行；读取和淘汰时条目可能已被并发删除，按未命中处理。
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import get_excel_data_curr.t3 as t3
+from get_excel_data_curr.records import InoutRecord
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = './result-files/_cache'
+
+
+def _json_default(obj):
+    if isinstance(obj, InoutRecord):
+        return obj.to_dict()
+    return str(obj)
+
+
+def report_key(ret_dict, data_cfg, request_data):
+    """
+    计算报表缓存键
+    :param ret_dict: 各楼栋的记录 {楼栋编号: 记录列表}，楼栋顺序影响 sheet 名称，一并计入；
+                     多晚查询传 {夜间标签: 当晚的 ret_dict}
+    :param data_cfg: 学院名称映射
+    :param request_data: 请求数据，只取影响报表内容的查询窗口
+    """
+    yesterday = datetime.now() - timedelta(days=1)
+    payload = {
+        'window': list(t3.query_window(request_data)),
+        # 文件名使用生成当天的前一天日期
+        'file_date': yesterday.strftime('%Y-%m-%d'),
+        'buildings': list(ret_dict.keys()),
+        'records': ret_dict,
+        'data_cfg': data_cfg or {},
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=_json_default)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ReportCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=200 * 1024 * 1024, max_age_hours=72):
+        """
+        :param cache_dir: 缓存根目录，每个键一个子目录
+        :param max_bytes: 缓存总大小上限（字节）
+        :param max_age_hours: 超过该时长未被使用的报表删除
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_hours = max_age_hours
+        self._lock = threading.Lock()
+
+    def configure(self, max_bytes, max_age_hours):
+        """按配置调整大小上限和保留时长，下次淘汰时生效"""
+        self.max_bytes = max_bytes
+        self.max_age_hours = max_age_hours
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        """命中时返回报表路径并刷新最近使用时间，否则返回 None"""
+        entry_dir = self._entry_dir(key)
+        try:
+            files = [f for f in os.listdir(entry_dir) if f.endswith('.xlsx')]
+        except FileNotFoundError:
+            return None
+        if not files:
+            return None
+        try:
+            os.utime(entry_dir)
+        except FileNotFoundError:
+            # 列出文件后条目被并发淘汰
+            return None
+        return f"{entry_dir}/{files[0]}"
+
+    def get_or_create(self, key, render):
+        """
+        :param render: 函数，参数为输出目录，生成报表并返回文件路径
+        :return: 报表文件路径
+        """
+        cached = self.get(key)
+        if cached:
+            logger.info(f"报表缓存命中: {key[:12]}")
+            return cached
+
+        # 先在临时目录生成，再整体改名，其他请求不会读到未写完的文件
+        tmp_dir = self._entry_dir(f"{key}.tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            file_path = render(tmp_dir)
+            if not file_path:
+                return file_path
+            try:
+                os.rename(tmp_dir, self._entry_dir(key))
+            except OSError:
+                # 相同报表已由并发请求写入
+                cached = self.get(key)
+                if cached:
+                    return cached
+                raise
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        self.evict(keep=key)
+        return f"{self._entry_dir(key)}/{os.path.basename(file_path)}"
+
+    def _entry_stat(self, entry_dir):
+        """:return: tuple(最近使用时间, 大小)；条目已被删除时返回 None"""
+        try:
+            size = sum(os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir))
+            return os.path.getmtime(entry_dir), size
+        except FileNotFoundError:
+            return None
+
+    def evict(self, keep=None):
+        """
+        删除超过保留时长的报表，再按最近使用时间从旧到新删除直到总大小不超过上限
+        :param keep: 不淘汰的键，即刚生成、即将返回给调用方的报表；单个报表超过大小上限时也保留
+        """
+        with self._lock:
+            try:
+                names = os.listdir(self.cache_dir)
+            except FileNotFoundError:
+                return
+            entries = []
+            for name in names:
+                entry_dir = self._entry_dir(name)
+                if '.tmp-' in name or name == keep or not os.path.isdir(entry_dir):
+                    continue
+                stat = self._entry_stat(entry_dir)
+                if stat is not None:
+                    entries.append(stat + (entry_dir,))
+
+            expire_before = time.time() - self.max_age_hours * 3600
+            kept = self._entry_stat(self._entry_dir(keep)) if keep else None
+            total = sum(size for _, size, _ in entries) + (kept[1] if kept else 0)
+            for used_at, size, entry_dir in sorted(entries):
+                if used_at >= expire_before and total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+                logger.info(f"报表缓存淘汰: {os.path.basename(entry_dir)[:12]}")
+
+
+# 全进程共用的报表缓存，process() 每次按配置调整上限后使用
+report_cache = ReportCache()
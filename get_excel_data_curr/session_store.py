@@ -0,0 +1,91 @@
+"""
+进程内共享的公寓系统登录态（sid）缓存。
+/query 请求与定时任务共用同一个 sid，过期时在锁内重新登录，避免重复登录。
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sid = None
+        self._login_at = None
+        self._validated_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.login_failures = 0
+        self.invalidations = 0
+
+    def get_sid(self, login_func, validate_func, validate_interval=0):
+        """
+        获取可用的 sid，必要时重新登录
+        :param login_func: 无参函数，返回 tuple(success, message, sid)
+        :param validate_func: 校验 sid 是否仍有效的函数，参数为 sid，返回 bool
+        :param validate_interval: 距上次校验不足该秒数时直接复用，0 表示每次都校验
+        :return: tuple(success: bool, message: str, sid: str or None)
+        """
+        with self._lock:
+            if self._sid is not None:
+                now = time.time()
+                if now - self._validated_at < validate_interval:
+                    self.hits += 1
+                    return (True, "复用已有登录态", self._sid)
+                # 只有实际校验通过才刷新校验时间，持续有请求时也会每隔 validate_interval 校验一次
+                if self._safe_validate(validate_func):
+                    self._validated_at = now
+                    self.hits += 1
+                    return (True, "复用已有登录态", self._sid)
+                logger.info("缓存的 sid 已失效，重新登录")
+                self._sid = None
+
+            self.misses += 1
+            success, message, sid = login_func()
+            if not success:
+                self.login_failures += 1
+                return (False, message, None)
+
+            self._sid = sid
+            self._login_at = time.time()
+            self._validated_at = self._login_at
+            self.refreshes += 1
+            return (True, message, sid)
+
+    def _safe_validate(self, validate_func):
+        try:
+            return bool(validate_func(self._sid))
+        except Exception as e:
+            logger.warning(f"校验 sid 时发生异常，视为失效: {e}")
+            return False
+
+    def invalidate(self, sid=None):
+        """
+        作废缓存的 sid
+        :param sid: 仅当缓存值等于该 sid 时才作废，避免误删其他线程刚刷新的 sid；None 表示无条件作废
+        """
+        with self._lock:
+            if self._sid is not None and (sid is None or sid == self._sid):
+                self._sid = None
+                self._validated_at = 0.0
+                self.invalidations += 1
+
+    def stats(self):
+        """返回命中/未命中/刷新次数等统计信息"""
+        with self._lock:
+            return {
+                'has_session': self._sid is not None,
+                'login_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self._login_at)) if self._login_at else None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'login_failures': self.login_failures,
+                'invalidations': self.invalidations,
+            }
+
+
+# 进程级单例，Web 请求和定时任务共用
+session_store = SessionStore()
@@ -0,0 +1,93 @@
+"""
+相同查询合并执行（single-flight）。
+楼栋和时间窗口都相同的并发 /query 请求只执行一次 process()，其余请求等待并共用同一结果。
+只在报表缓存启用时合并：共用的报表位于报表缓存目录，按内容哈希命名且不会被改写；
+未启用时报表写在发起者用户目录下按日期命名的文件，会被发起者之后的查询覆盖，不能交给其他请求。
+"""
+import logging
+import threading
+
+import get_excel_data_curr.t3 as t3
+
+logger = logging.getLogger(__name__)
+
+
+def query_key(data, report_cache_enabled=True):
+    """
+    查询请求的合并键：(排序后的楼栋, 开始时刻, 结束时刻)
+    未传日期时按 t3.query_window 的规则补全，跨天前后的默认查询不会被合并
+    :param report_cache_enabled: 报表缓存是否启用，未启用时返回 None，该请求不参与合并
+    """
+    if not report_cache_enabled:
+        return None
+    begin_time, end_time = t3.query_window(data)
+    return (tuple(sorted(data.get('buildings', []))), begin_time, end_time)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, func):
+        """
+        执行 func，同一 key 已有执行中的调用时等待其结果
+        :param key: 合并键，None 表示不合并，直接执行
+        :param func: 无参函数
+        :return: tuple(result, shared)，shared 为 True 表示结果来自其他请求发起的调用
+        """
+        if key is None:
+            return func(), False
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            logger.info(f"相同查询正在执行，等待其结果: {key}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            if call.waiters:
+                logger.info(f"查询 {key} 的结果由 {call.waiters + 1} 个请求共用")
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+            }
+
+
+# 全进程共用的 /query 合并器
+query_flight = SingleFlight()
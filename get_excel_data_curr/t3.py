@@ -1,14 +1,57 @@
 import requests
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from get_excel_data_curr import adaptive_limit, admission, deadline, http_client
+from get_excel_data_curr import progress
+from get_excel_data_curr.records import project_rows
 
 logger = logging.getLogger(__name__)
 
 
+API_URL = "http://gygl.tust.edu.cn:8080/da-roadgate-resident/inout/inout_record/get_inout_list_paged_json"
+CAMPUS_ID = "2852cbacb09b6b110f4bb162b636e204"
+
+# 楼群 ID
+# 中院: 1-14 (1栋到12B栋)
+# 西院: 15-20 (13栋到17B栋)
+GROUP_ZHONGYUAN = "851c0092fe8a5c4969fd9e8e2b5200e9"
+GROUP_XIYUAN = "5760ba66b341e2bb968ea7b990fa873d"
+
+HEADERS = {
+    "Accept": "application/json, text/javascript, */*; q=0.01",
+    "Accept-Language": "zh-CN,zh;q=0.9",
+    "Content-Type": "application/json",
+    "Proxy-Connection": "keep-alive",
+    "Referer": "http://gygl.tust.edu.cn:8080/da-roadgate-resident/index",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36",
+    "X-Requested-With": "XMLHttpRequest"
+}
+
+
 class DataFetchError(Exception):
     """Raised when a building data API request did not return usable JSON data."""
 
 
+class SessionExpiredError(DataFetchError):
+    """Raised when the API redirects to the CAS login page, i.e. the sid is no longer valid."""
+
+
+class DeadlineExceededError(DataFetchError):
+    """Raised when the query deadline created in process() has run out."""
+
+
+def check_deadline(stage):
+    """
+    当前上下文的处理时限已用完时抛出 DeadlineExceededError
+    :param stage: 当前阶段说明，如 登录、楼栋4第2页、生成报表
+    """
+    current = deadline.current()
+    if current is not None and current.expired():
+        raise DeadlineExceededError(f"查询超过处理时限 {current.seconds} 秒，{stage}已中止")
+
+
 def _response_is_login_page(response):
     """Detect CAS redirects that requests follows and reports as HTTP 200."""
     final_url = getattr(response, 'url', '') or ''
@@ -21,14 +64,14 @@ def _response_is_login_page(response):
     return False
 
 
-def _raise_fetch_error(message, response=None, error=None):
+def _raise_fetch_error(message, response=None, error=None, error_class=DataFetchError):
     if response is not None:
         logger.error(f"响应状态码: {response.status_code}")
         logger.error(f"响应最终URL: {getattr(response, 'url', '')}")
         logger.error(f"响应内容前500字符: {response.text[:500]}")
     if error is not None:
         logger.error(f"JSON 解析错误: {error}")
-    raise DataFetchError(message)
+    raise error_class(message)
 
 
 def _parse_json_response(response, b_num, page_index=None):
@@ -38,7 +81,7 @@ def _parse_json_response(response, b_num, page_index=None):
         _raise_fetch_error(f"{label}接口状态异常: {response.status_code}", response=response)
     if _response_is_login_page(response):
         logger.error(f"API 请求被重定向到登录页 -{label}")
-        _raise_fetch_error(f"{label}登录态失效，接口返回登录页", response=response)
+        _raise_fetch_error(f"{label}登录态失效，接口返回登录页", response=response, error_class=SessionExpiredError)
     try:
         return response.json()
     except Exception as e:
@@ -46,14 +89,11 @@ def _parse_json_response(response, b_num, page_index=None):
         _raise_fetch_error(f"{label}响应不是有效 JSON", response=response, error=e)
 
 
-def deal(cookie, buildingId, b_num, requst_data, page_size=20):
+def query_window(requst_data):
     """
-    查询指定楼栋的晚归数据。
-    :param cookie: 登录后的 session cookie
-    :param buildingId: 楼栋在公寓系统中的内部 ID
-    :param b_num: 楼栋编号
-    :param requst_data: 请求数据（包含 startTime, endTime 等）
-    :param page_size: 每页数据条数，从调用方传入
+    计算查询时间窗口
+    :param requst_data: 请求数据（包含 startTime, endTime，可选 startDate, endDate）
+    :return: tuple(beginTime, endTime)，格式 YYYY-MM-DD HH:MM:SS
     """
     # 如果请求数据中包含自定义日期则使用，否则自动计算
     if requst_data.get('startDate'):
@@ -64,19 +104,133 @@ def deal(cookie, buildingId, b_num, requst_data, page_size=20):
         current_date = requst_data['endDate']
     else:
         current_date = datetime.now().strftime("%Y-%m-%d")
+    return f"{previous_date} {requst_data['startTime']}", f"{current_date} {requst_data['endTime']}"
+
+
+def split_nights(requst_data):
+    """
+    把跨多天的自定义日期查询拆成逐晚的查询：第 N 天 startTime 到第 N+1 天 endTime
+    :return: 请求数据列表；未指定日期或只有一晚时返回 [requst_data]
+    """
+    if not requst_data.get('startDate') or not requst_data.get('endDate'):
+        return [requst_data]
+    start_date = datetime.strptime(requst_data['startDate'], "%Y-%m-%d")
+    nights = (datetime.strptime(requst_data['endDate'], "%Y-%m-%d") - start_date).days
+    if nights <= 1:
+        return [requst_data]
+    night_requests = []
+    for n in range(nights):
+        night_request = dict(requst_data)
+        night_request['startDate'] = (start_date + timedelta(days=n)).strftime("%Y-%m-%d")
+        night_request['endDate'] = (start_date + timedelta(days=n + 1)).strftime("%Y-%m-%d")
+        night_requests.append(night_request)
+    return night_requests
+
+
+def night_label(requst_data):
+    """夜间查询的显示名，如 4.1-4.2"""
+    start = datetime.strptime(requst_data['startDate'], "%Y-%m-%d")
+    end = datetime.strptime(requst_data['endDate'], "%Y-%m-%d")
+    return f"{start.month}.{start.day}-{end.month}.{end.day}"
+
+
+def get_building_group_id(b_num):
+    """根据楼栋号判断所属楼群ID"""
+    return GROUP_XIYUAN if int(b_num) >= 15 else GROUP_ZHONGYUAN
+
+
+def is_session_valid(cookie):
+    """
+    用 limit=1 的轻量请求校验 sid 是否仍然有效
+    :param cookie: 登录后的 session cookie
+    :return: bool
+    """
+    params = {"offset": 0, "limit": 1, "campusId": CAMPUS_ID}
+    try:
+        response = http_client.get_session().get(API_URL, headers=HEADERS, params=params, cookies={"sid": cookie}, verify=False, timeout=deadline.cap(10))
+    except requests.RequestException as e:
+        logger.warning(f"校验 sid 请求失败: {e}")
+        return False
+    if response.status_code != 200 or _response_is_login_page(response):
+        return False
+    try:
+        return 'total' in response.json()
+    except Exception:
+        return False
+
+
+def _response_signal(response):
+    """需要降低并发的响应异常说明，正常响应返回 None"""
+    if response.status_code != 200:
+        return f"HTTP {response.status_code}"
+    if _response_is_login_page(response):
+        return "CAS 重定向"
+    return None
+
+
+def _send(url, label, **kwargs):
+    """
+    发起 GET 请求。未绑定处理时限时由连接池按 http_retry_total 自动重试；
+    绑定时限时改用不自动重试的会话在这里逐次重试：每次尝试前检查时限，剩余时间平分给剩余的尝试次数，
+    退避等待也不超过剩余时间，连接池重试不会让单次调用超出时限
+    """
+    if deadline.current() is None:
+        return http_client.get_session().get(url, timeout=deadline.request_timeout(), **kwargs)
+    retry_total, retry_backoff = http_client.retry_policy()
+    session = http_client.get_session(retry=False)
+    for attempt in range(retry_total + 1):
+        check_deadline(label)
+        attempts_left = retry_total + 1 - attempt
+        try:
+            response = session.get(url, timeout=deadline.request_timeout(attempts_left), **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempts_left == 1:
+                raise
+        else:
+            if attempts_left == 1 or response.status_code not in http_client.RETRY_STATUSES:
+                return response
+        logger.warning(f"{label}请求失败，第 {attempt + 1}/{retry_total} 次重试")
+        time.sleep(deadline.cap(retry_backoff * (2 ** attempt)))
 
-    # 根据楼栋号判断使用哪个楼群ID
-    # 中院: 1-14 (1栋到12B栋)
-    # 西院: 15-20 (13栋到17B栋)
-    if int(b_num) >= 15:
-        building_group_id = "5760ba66b341e2bb968ea7b990fa873d"  # 西院
-    else:
-        building_group_id = "851c0092fe8a5c4969fd9e8e2b5200e9"  # 中院
 
-    url = "http://gygl.tust.edu.cn:8080/da-roadgate-resident/inout/inout_record/get_inout_list_paged_json"
-    params = {
-        "offset": 0,
-        "limit": page_size,
+def _get(url, label, **kwargs):
+    """
+    占用一个取数请求槽位后发起 GET 请求，槽位已满时排队；排队时长和连接/读取超时都不超过处理时限的剩余时间。
+    每次请求的耗时和结果报告给自适应并发控制，由其调整槽位上限
+    :param label: 错误信息中的请求说明，如 楼栋4第2页
+    :raises admission.AdmissionBusy: 未经 admission.admit() 准入时等待队列已满或排队超时
+    :raises DeadlineExceededError: 处理时限已用完，包括已准入的查询排队直到时限用完
+    :raises DataFetchError: 请求超时、连接失败等请求异常，由调用方计入该楼栋的取数失败
+    """
+    check_deadline(label)
+    try:
+        started = admission.upstream_slots.acquire(max_wait=deadline.remaining())
+    except admission.AdmissionBusy:
+        # 排队直到时限用完时按超时处理，而不是提示稍后重试；已准入的查询只会因时限用完而排队失败
+        check_deadline(label)
+        if admission.is_admitted():
+            raise DeadlineExceededError(f"{label}排队等待请求槽位超过处理时限")
+        raise
+    try:
+        response = _send(url, label, **kwargs)
+    except requests.Timeout as e:
+        adaptive_limit.upstream_limit.observe(started, time.monotonic() - started, False, "超时")
+        check_deadline(label)
+        raise DataFetchError(f"{label}请求超时: {e}")
+    except requests.RequestException as e:
+        adaptive_limit.upstream_limit.observe(started, time.monotonic() - started, False, "连接失败")
+        raise DataFetchError(f"{label}请求失败: {e}")
+    finally:
+        admission.upstream_slots.release(started)
+    signal = _response_signal(response)
+    adaptive_limit.upstream_limit.observe(started, time.monotonic() - started, signal is None, signal)
+    return response
+
+
+def _build_params(buildingId, building_group_id, begin_time, end_time, offset, limit):
+    return {
+        "offset": offset,
+        "limit": limit,
         "studentTypeSearch": "",
         "schoolInstituteNameSearch": "",
         "schoolMajorNameSearch": "",
@@ -87,32 +241,59 @@ def deal(cookie, buildingId, b_num, requst_data, page_size=20):
         "grade": "",
         "schoolClassName": "",
         "keyWords": "",
-        "campusId": "2852cbacb09b6b110f4bb162b636e204",
+        "campusId": CAMPUS_ID,
         "buildingGroupId": building_group_id,
         "buildingId": buildingId,
-        # "beginTime": f"{previous_date} {config_tool.get_beginTime()}",
-        # "endTime": f"{current_date} {config_tool.get_endTime()}",
-        "beginTime": f"{previous_date} {requst_data['startTime']}",
-        "endTime": f"{current_date} {requst_data['endTime']}",
+        "beginTime": begin_time,
+        "endTime": end_time,
         "passDirection": ""
     }
 
-    headers = {
-        "Accept": "application/json, text/javascript, */*; q=0.01",
-        "Accept-Language": "zh-CN,zh;q=0.9",
-        "Content-Type": "application/json",
-        "Proxy-Connection": "keep-alive",
-        "Referer": "http://gygl.tust.edu.cn:8080/da-roadgate-resident/index",
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36",
-        "X-Requested-With": "XMLHttpRequest"
-    }
+
+def fetch_total(cookie, buildingId, b_num, requst_data, building_group_id=None):
+    """
+    用 limit=1 的请求只取楼栋在查询窗口内的记录总数，用于判断本地缓存是否过期
+    :return: int
+    """
+    begin_time, end_time = query_window(requst_data)
+    if building_group_id is None:
+        building_group_id = get_building_group_id(b_num)
+    params = _build_params(buildingId, building_group_id, begin_time, end_time, 0, 1)
+    response = _get(API_URL, f"楼栋{b_num}", headers=HEADERS, params=params, cookies={"sid": cookie}, verify=False)
+    json_data = _parse_json_response(response, b_num)
+    if json_data is None or 'total' not in json_data:
+        logger.error(f"API 响应格式异常 -楼栋{b_num}，缺少 'total' 字段")
+        _raise_fetch_error(f"楼栋{b_num}响应缺少 total 字段", response=response)
+    return json_data['total']
+
+
+def iter_pages(cookie, buildingId, b_num, requst_data, page_size=20, max_workers=1, probe_size=None,
+               building_group_id=None):
+    """
+    按分页顺序逐页产出楼栋的晚归数据，下游可以在后续分页仍在请求时开始处理已到达的数据。
+    参数与 deal 相同
+    :return: 生成器，每次产出一页记录列表
+    """
+    begin_time, end_time = query_window(requst_data)
+
+    # 根据楼栋号判断使用哪个楼群ID
+    if building_group_id is None:
+        building_group_id = get_building_group_id(b_num)
+
+    url = API_URL
+    if not probe_size or probe_size < page_size:
+        probe_size = page_size
+
+    params = _build_params(buildingId, building_group_id, begin_time, end_time, 0, probe_size)
+
+    headers = HEADERS
 
     cookies = {
         "sid": cookie
     }
 
-    all_rows = []
-    response = requests.get(url, headers=headers, params=params, cookies=cookies, verify=False)
+    # 首次请求同时取得 total 和首页数据，首页不再重复请求
+    response = _get(url, f"楼栋{b_num}", headers=headers, params=params, cookies=cookies, verify=False)
     json_data = _parse_json_response(response, b_num)
 
     if json_data is None or 'total' not in json_data:
@@ -120,20 +301,66 @@ def deal(cookie, buildingId, b_num, requst_data, page_size=20):
         _raise_fetch_error(f"楼栋{b_num}响应缺少 total 字段", response=response)
 
     total_rows = json_data['total']
-    page_num = int(total_rows / page_size) if total_rows % page_size == 0 else int(total_rows / page_size) + 1
+    # 取数时即投影为紧凑记录，只保留下游用到的字段
+    first_rows = project_rows(json_data.get('rows') or [])
+    if total_rows > 0 and not first_rows:
+        logger.error(f"第0页响应缺少 'rows' 字段 -楼栋{b_num}")
+        _raise_fetch_error(f"楼栋{b_num}第0页响应缺少 rows 字段", response=response)
+
+    # 剩余数据从首页实际返回的条数处继续分页（服务端可能截断过大的 limit）
+    offsets = list(range(len(first_rows), total_rows, page_size))
+    page_num = len(offsets) + 1
     print(f'处理公寓{b_num}数据，page_num={page_num}')
-    for i in range(page_num):
+    progress.emit('page', f"楼栋{b_num} 第 1/{page_num} 页", building=b_num, page=1, pages=page_num)
+    yield first_rows
+
+    def fetch_page(i, offset):
         print(f'查询第{i}页')
-        params["offset"] = i * page_size
-        response = requests.get(url, headers=headers, params=params, cookies=cookies, verify=False)
+        page_params = dict(params, offset=offset, limit=page_size)
+        response = _get(url, f"楼栋{b_num}第{i}页", headers=headers, params=page_params, cookies=cookies, verify=False)
         page_json = _parse_json_response(response, b_num, page_index=i)
         if page_json and 'rows' in page_json:
-            all_rows += page_json['rows']
-        else:
-            logger.error(f"第{i}页响应缺少 'rows' 字段 -楼栋{b_num}")
-            _raise_fetch_error(f"楼栋{b_num}第{i}页响应缺少 rows 字段", response=response)
+            progress.emit('page', f"楼栋{b_num} 第 {i + 1}/{page_num} 页", building=b_num, page=i + 1, pages=page_num)
+            return project_rows(page_json['rows'])
+        logger.error(f"第{i}页响应缺少 'rows' 字段 -楼栋{b_num}")
+        _raise_fetch_error(f"楼栋{b_num}第{i}页响应缺少 rows 字段", response=response)
+
+    if max_workers <= 1 or len(offsets) <= 1:
+        for i, offset in enumerate(offsets, start=1):
+            yield fetch_page(i, offset)
+    else:
+        # 并发拉取剩余分页，按 offset 顺序产出；任一页失败或下游提前停止时取消其余分页
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(offsets))) as executor:
+            futures = [progress.submit(executor, fetch_page, i, offset) for i, offset in enumerate(offsets, start=1)]
+            try:
+                for future in futures:
+                    yield future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+
+def deal(cookie, buildingId, b_num, requst_data, page_size=20, max_workers=1, probe_size=None,
+         building_group_id=None):
+    """
+    查询指定楼栋的晚归数据。
+    :param cookie: 登录后的 session cookie
+    :param buildingId: 楼栋在公寓系统中的内部 ID
+    :param b_num: 楼栋编号
+    :param requst_data: 请求数据（包含 startTime, endTime 等）
+    :param page_size: 每页数据条数，从调用方传入
+    :param max_workers: 并发拉取分页的线程数，1 表示逐页顺序请求
+    :param probe_size: 首次请求的条数，首页数据直接保留；None 表示与 page_size 相同
+    :param building_group_id: 楼群ID，None 表示按楼栋号推断；整楼群查询时 buildingId 传空字符串
+    """
+    all_rows = []
+    for page in iter_pages(cookie, buildingId, b_num, requst_data, page_size=page_size, max_workers=max_workers,
+                           probe_size=probe_size, building_group_id=building_group_id):
+        all_rows += page
 
     print(f'共{len(all_rows)}条记录')
+    progress.emit('building', f"楼栋{b_num}取数完成，共{len(all_rows)}条", building=b_num, records=len(all_rows))
     return all_rows
 
 # deal('a87653ef-07b6-4ae5-8682-8378cb052e67')
@@ -1,8 +1,14 @@
 import logging
+from functools import partial
 from flask import Blueprint, render_template, request, session, jsonify, current_app
 from database.db import Database
 from routes.auth import admin_required
 from scheduler.task_manager import TaskManager
+from get_excel_data_curr.session_store import session_store
+from get_excel_data_curr.single_flight import query_flight
+from get_excel_data_curr import adaptive_limit, admission
+from scheduler.prefetch import PrefetchJob
+from scheduler.query_jobs import estimate_cost
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 db = Database()
@@ -199,6 +205,14 @@ def trigger_task(task_id):
         return jsonify({'success': False, 'msg': '任务不存在'}), 404
     try:
         tm = TaskManager(db)
+        query_jobs = current_app.config.get('QUERY_JOBS')
+        if query_jobs:
+            # 与页面查询共用按用户公平调度的队列，执行结果见执行记录
+            request_data = {'buildings': task['buildings'], 'startTime': task['start_time'], 'endTime': task['end_time']}
+            queued = query_jobs.scheduler.submit(session['username'], partial(tm.execute_single_task, task),
+                                                 cost=estimate_cost(request_data), label=f"邮件任务 {task['task_name']}")
+            _log_operation('trigger_task', f'手动触发任务: {task["task_name"]}')
+            return jsonify({'success': True, 'msg': f'任务已加入队列（您有 {queued} 个任务排队），执行结果见执行记录'})
         tm.execute_single_task(task)
         _log_operation('trigger_task', f'手动触发任务: {task["task_name"]}')
         return jsonify({'success': True, 'msg': '任务已触发执行'})
@@ -261,6 +275,43 @@ def scheduler_reload():
     return jsonify({'success': False, 'msg': '调度器未初始化'}), 500
 
 
+@admin_bp.route('/api/prefetch/status', methods=['GET'])
+@admin_required
+def prefetch_status():
+    sm = current_app.config.get('SCHEDULER_MANAGER')
+    job = sm.prefetch_job if sm else PrefetchJob(db)
+    return jsonify(job.status())
+
+
+# ==================== 公寓系统登录态 API ====================
+
+@admin_bp.route('/api/upstream/session', methods=['GET'])
+@admin_required
+def upstream_session_stats():
+    return jsonify(session_store.stats())
+
+
+@admin_bp.route('/api/upstream/query-flight', methods=['GET'])
+@admin_required
+def query_flight_stats():
+    return jsonify(query_flight.stats())
+
+
+@admin_bp.route('/api/report-queue', methods=['GET'])
+@admin_required
+def report_queue_stats():
+    """报表任务队列：各用户排队数、执行中任务数和等待时长"""
+    query_jobs = current_app.config.get('QUERY_JOBS')
+    if not query_jobs:
+        return jsonify({'workers': 0, 'queued': 0, 'running': 0, 'users': []})
+    return jsonify(query_jobs.scheduler.stats())
+
+
+@admin_bp.route('/api/upstream/admission', methods=['GET'])
+@admin_required
+def admission_stats():
+    return jsonify(dict(admission.stats(), adaptive=adaptive_limit.upstream_limit.stats()))
+
 
 # ==================== 操作日志 API ====================
 
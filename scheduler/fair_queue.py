@@ -0,0 +1,138 @@
+"""
+报表生成任务的按用户公平调度。
+每个用户一条 FIFO 队列，工作线程按赤字轮转（deficit round robin）在有待执行任务的用户之间轮流取任务：
+所有用户额度都不够时每人累加 quantum，队首任务的成本不超过该用户剩余额度才派发，派发后该用户排到轮转末尾。
+一个用户连续提交的大批量导出不会让其他用户的小查询一直排在后面。
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+DEFAULT_QUANTUM = 10
+WAIT_SAMPLES = 20  # 每个用户保留最近多少次排队时长用于计算平均等待
+
+
+class _Entry:
+    __slots__ = ('func', 'cost', 'label', 'enqueued_at')
+
+    def __init__(self, func, cost, label):
+        self.func = func
+        self.cost = cost
+        self.label = label
+        self.enqueued_at = time.time()
+
+
+class FairScheduler:
+    def __init__(self, workers=2, quantum=DEFAULT_QUANTUM, name='report'):
+        """
+        :param workers: 工作线程数，即同时执行的任务数上限
+        :param quantum: 每轮给每个用户累加的额度，与任务成本同单位
+        :param name: 工作线程名前缀
+        """
+        self.workers = workers
+        self.quantum = quantum
+        self.logger = logging.getLogger(__name__)
+        self._cond = threading.Condition()
+        self._queues = OrderedDict()
+        self._deficit = {}
+        self._running = {}
+        self._waits = {}
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f'{name}-worker-{i}', daemon=True).start()
+
+    def submit(self, user, func, cost=1, label=None):
+        """
+        把任务加入用户的队列
+        :param func: 无参函数，在工作线程中执行
+        :param cost: 估算成本，额度不足时需等待更多轮次
+        :return: 该用户当前排队的任务数（含本任务）
+        """
+        with self._cond:
+            queue = self._queues.get(user)
+            if queue is None:
+                queue = self._queues[user] = deque()
+                self._deficit[user] = 0
+            queue.append(_Entry(func, max(cost, 1), label))
+            self._cond.notify()
+            return len(queue)
+
+    def call(self, user, func, cost=1, label=None):
+        """提交任务并等待执行完成，返回 func 的返回值，异常原样抛出"""
+        future = Future()
+
+        def run():
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func())
+                except Exception as e:
+                    future.set_exception(e)
+
+        self.submit(user, run, cost=cost, label=label)
+        return future.result()
+
+    def _next(self):
+        """按赤字轮转选出下一个任务，调用方需持有锁且至少有一个非空队列"""
+        while True:
+            for user, queue in self._queues.items():
+                entry = queue[0]
+                if self._deficit[user] >= entry.cost:
+                    queue.popleft()
+                    self._deficit[user] -= entry.cost
+                    if queue:
+                        self._queues.move_to_end(user)
+                    else:
+                        # 队列清空的用户不保留剩余额度，避免之后突发提交时插队
+                        del self._queues[user]
+                        del self._deficit[user]
+                    return user, entry
+            for user in self._queues:
+                self._deficit[user] += self.quantum
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queues:
+                    self._cond.wait()
+                user, entry = self._next()
+                waits = self._waits.setdefault(user, deque(maxlen=WAIT_SAMPLES))
+                waits.append(time.time() - entry.enqueued_at)
+                self._running[user] = self._running.get(user, 0) + 1
+            try:
+                entry.func()
+            except Exception as e:
+                self.logger.error(f"任务执行异常: {entry.label or user} - {e}")
+            finally:
+                with self._cond:
+                    self._running[user] -= 1
+                    if not self._running[user]:
+                        del self._running[user]
+
+    def stats(self):
+        """
+        各用户的排队情况
+        :return: dict，users 中每项包含排队数、排队成本、执行中任务数、最早排队任务已等待秒数、最近平均等待秒数
+        """
+        now = time.time()
+        with self._cond:
+            users = set(self._queues) | set(self._running) | set(self._waits)
+            result = []
+            for user in sorted(users, key=str):
+                queue = self._queues.get(user, ())
+                waits = self._waits.get(user, ())
+                result.append({
+                    'user': user,
+                    'queued': len(queue),
+                    'queued_cost': sum(entry.cost for entry in queue),
+                    'running': self._running.get(user, 0),
+                    'oldest_wait_seconds': round(now - queue[0].enqueued_at, 1) if queue else 0,
+                    'avg_wait_seconds': round(sum(waits) / len(waits), 1) if waits else None,
+                })
+            return {
+                'workers': self.workers,
+                'quantum': self.quantum,
+                'queued': sum(len(queue) for queue in self._queues.values()),
+                'running': sum(self._running.values()),
+                'users': result,
+            }
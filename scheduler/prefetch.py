@@ -0,0 +1,85 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import get_excel_data_curr.main as fetch_main
+import get_excel_data_curr.t3 as t3
+from get_excel_data_curr.ConfigTool import ConfigTool
+from get_excel_data_curr.record_store import RecordStore
+
+
+def prefetch_cron(end_time, delay_minutes):
+    """
+    计算预取任务的触发时刻（end_time 之后 delay_minutes 分钟）
+    :param end_time: 查询结束时间，格式 HH:MM:SS
+    :return: tuple(hour, minute)
+    """
+    run_at = datetime.strptime(end_time, '%H:%M:%S') + timedelta(minutes=delay_minutes)
+    return run_at.hour, run_at.minute
+
+
+class PrefetchJob:
+    def __init__(self, db):
+        """
+        :param db: Database 实例
+        """
+        self.db = db
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._running = False
+        self.last_run = None
+
+    def run(self):
+        """预取上一晚全部楼栋数据，同一时刻只允许一次预取"""
+        with self._lock:
+            if self._running:
+                self.logger.info("预取任务正在执行，跳过本次触发")
+                return
+            self._running = True
+
+        started_at = datetime.now()
+        start = time.time()
+        try:
+            self.logger.info("开始预取上一晚出入记录")
+            result = fetch_main.prefetch()
+        except Exception as e:
+            result = {'msg': str(e), 'status': 'false'}
+        finally:
+            with self._lock:
+                self._running = False
+
+        result['started_at'] = started_at.strftime('%Y-%m-%d %H:%M:%S')
+        result['elapsed'] = round(time.time() - start, 2)
+        self.last_run = result
+        if result['status'] == 'success':
+            self.logger.info(f"预取完成: {len(result.get('buildings', []))} 栋，耗时 {result['elapsed']} 秒")
+        else:
+            self.logger.error(f"预取失败: {result.get('msg')}")
+
+    def status(self):
+        """
+        预热状态：默认查询窗口内每栋楼是否已完整缓存，以及最近一次预取结果
+        """
+        config_tool = ConfigTool(self.db)
+        begin_time, end_time = t3.query_window(
+            {'startTime': config_tool.get_beginTime(), 'endTime': config_tool.get_endTime()})
+        store = RecordStore(self.db)
+        buildings = []
+        for b_num in config_tool.get_bid_dict():
+            missing = store.missing_ranges(b_num, begin_time, end_time)
+            buildings.append({
+                'building': b_num,
+                'covered': not missing,
+                'record_count': self.db.count_inout_records(b_num, begin_time, end_time),
+                'missing': [list(gap) for gap in missing],
+            })
+        return {
+            'enabled': config_tool.get_prefetch_enabled() and config_tool.get_record_store_enabled(),
+            'running': self._running,
+            'window': [begin_time, end_time],
+            'covered_count': sum(1 for b in buildings if b['covered']),
+            'total': len(buildings),
+            'buildings': buildings,
+            'last_run': self.last_run,
+        }
@@ -0,0 +1,138 @@
+"""
+页面查询后台任务。
+POST /query 把 process() 提交到按用户公平调度的工作线程后立即返回任务 ID，页面通过 GET /jobs/<id> 轮询进度；
+任务状态保存在 query_jobs 表，服务重启后未完成的任务重新入队；
+已结束的任务超过 report_cache_max_age_hours 后连同其报表目录一起删除；
+执行过程中的细粒度进度事件以任务 ID 为频道发布到 progress_bus，页面经 SSE 订阅。
+"""
+import json
+import logging
+import shutil
+import uuid
+from functools import partial
+
+import get_excel_data_curr.main as fetch_main
+import get_excel_data_curr.t3 as t3
+from get_excel_data_curr import progress
+from get_excel_data_curr.ConfigTool import ConfigTool
+from get_excel_data_curr.single_flight import query_flight, query_key
+from scheduler.fair_queue import FairScheduler
+
+RESULT_DIR = './result-files'
+
+
+def job_output_dir(username, job_id):
+    """任务报表的输出目录：./result-files/<用户>/<任务 ID>"""
+    return f"{RESULT_DIR}/{username}/{job_id}"
+
+
+def estimate_cost(data):
+    """估算报表任务的成本：楼栋数 × 查询夜数"""
+    return max(len(data.get('buildings', [])), 1) * len(t3.split_nights(data))
+
+
+class QueryJobManager:
+    def __init__(self, db, max_workers=None):
+        """
+        :param db: Database 实例
+        :param max_workers: 同时执行的任务数上限，默认读取 query_job_workers 配置
+        """
+        self.db = db
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max_workers or ConfigTool(db).get_query_job_workers()
+        # 页面查询和管理页面手动触发的邮件任务共用，按提交用户轮转派发
+        self.scheduler = FairScheduler(workers=self.max_workers, name='query-job')
+
+    def submit(self, username, data):
+        """
+        保存任务并提交到线程池
+        :param data: process() 的请求数据
+        :return: 任务 ID
+        :raises ValueError: 日期格式错误，此时不保存任务
+        """
+        # 先校验日期并计算成本，日期格式错误时不留下永远排队的任务记录
+        cost = estimate_cost(data)
+        self.sweep()
+        job_id = uuid.uuid4().hex
+        self.db.create_query_job(job_id, username, data)
+        queued = self.scheduler.submit(username, partial(self._run, job_id, data), cost=cost, label=job_id)
+        self.logger.info(f"查询任务已入队: {job_id} (用户: {username}，该用户排队 {queued} 个)")
+        return job_id
+
+    def _run(self, job_id, data):
+        def report(percent, message):
+            self.db.update_query_job(job_id, progress=percent, message=message)
+            progress.emit('stage', message, percent=percent)
+
+        self.db.update_query_job(job_id, status='running', progress=0, message='开始处理')
+        token = progress.bind(job_id)
+        try:
+            progress.emit('start', '开始处理')
+            # 启用报表缓存时楼栋和时间窗口相同的任务与同步请求共用一次执行结果（进度事件只发布到发起执行的任务）
+            key = query_key(data, ConfigTool(self.db).get_report_cache_enabled())
+            # 未启用报表缓存时每个任务写入自己的目录，同一用户并发的任务不会覆盖彼此的同名报表
+            output_dir = job_output_dir(data['username'], job_id)
+            result, shared = query_flight.do(
+                key, lambda: fetch_main.process(data, on_progress=report, output_dir=output_dir))
+        except Exception as e:
+            result = {'msg': str(e), 'status': 'false'}
+        finally:
+            progress.unbind(token)
+
+        if result.get('status') == 'success':
+            self.db.update_query_job(job_id, status='success', progress=100, message='完成',
+                                     file_name=result['file_name'])
+            progress.progress_bus.close(job_id, {'message': '完成', 'state': 'success',
+                                                 'file_name': result['file_name']})
+            self.logger.info(f"查询任务完成: {job_id}")
+        else:
+            message = str(result.get('msg', '数据处理失败'))
+            self.db.update_query_job(job_id, status='failed', message=message)
+            progress.progress_bus.close(job_id, {'message': message, 'state': 'failed'})
+            self.logger.error(f"查询任务失败: {job_id} - {result.get('msg')}")
+
+    def get(self, job_id):
+        """
+        任务状态
+        :return: dict 或 None（任务不存在）
+        """
+        job = self.db.get_query_job(job_id)
+        if not job:
+            return None
+        return {
+            'job_id': job['id'],
+            'username': job['username'],
+            'state': job['status'],
+            'progress': job['progress'],
+            'message': job['message'],
+            'file_name': job['file_name'],
+            'created_at': job['created_at'],
+            'updated_at': job['updated_at'],
+        }
+
+    def sweep(self):
+        """
+        删除超过保留时长（report_cache_max_age_hours）的已结束任务及其报表目录
+        :return: 删除的任务数
+        """
+        jobs = self.db.get_expired_query_jobs(ConfigTool(self.db).get_report_cache_max_age_hours())
+        for job in jobs:
+            username = json.loads(job['request_json']).get('username', job['username'])
+            shutil.rmtree(job_output_dir(username, job['id']), ignore_errors=True)
+            self.db.delete_query_job(job['id'])
+        if jobs:
+            self.logger.info(f"已删除 {len(jobs)} 个过期的查询任务")
+        return len(jobs)
+
+    def recover(self):
+        """服务启动时清理过期任务，并把上次未完成（排队中或执行中被中断）的任务重新入队"""
+        self.sweep()
+        jobs = self.db.get_unfinished_query_jobs()
+        for job in jobs:
+            self.db.update_query_job(job['id'], status='pending', progress=0, message='服务重启，重新排队')
+            data = json.loads(job['request_json'])
+            self.scheduler.submit(job['username'], partial(self._run, job['id'], data), cost=estimate_cost(data),
+                                  label=job['id'])
+        if jobs:
+            self.logger.info(f"已重新入队 {len(jobs)} 个未完成的查询任务")
+        return len(jobs)
@@ -3,6 +3,8 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from database.db import Database
 from scheduler.task_manager import TaskManager
+from scheduler.prefetch import PrefetchJob, prefetch_cron
+from get_excel_data_curr.ConfigTool import ConfigTool
 
 
 class SchedulerManager:
@@ -13,6 +15,8 @@ class SchedulerManager:
         self.db = db
         self.logger = logging.getLogger(__name__)
         self.scheduler = None
+        # 跨 reload 保留，便于管理页面查看最近一次预取结果
+        self.prefetch_job = PrefetchJob(db)
 
     def start(self):
         """启动定时调度器，根据数据库中的配置加载任务"""
@@ -29,8 +33,9 @@ class SchedulerManager:
 
             # 获取所有启用的邮件任务，为每个任务创建独立的调度
             email_tasks = self.db.get_enabled_email_tasks()
+            prefetch_enabled = self._prefetch_enabled()
 
-            if not email_tasks:
+            if not email_tasks and not prefetch_enabled:
                 self.logger.info("没有启用的邮件任务，调度器不启动")
                 return
 
@@ -57,12 +62,32 @@ class SchedulerManager:
                 )
                 self.logger.info(f"已添加定时任务: {task['task_name']} (cron: {cron_expr})")
 
+            if prefetch_enabled:
+                self._add_prefetch_job()
+
             self.scheduler.start()
             self.logger.info(f"定时调度器已启动，共 {len(email_tasks)} 个任务")
 
         except Exception as e:
             self.logger.error(f"启动调度器失败: {str(e)}")
 
+    def _prefetch_enabled(self):
+        config_tool = ConfigTool(self.db)
+        return config_tool.get_prefetch_enabled() and config_tool.get_record_store_enabled()
+
+    def _add_prefetch_job(self):
+        """在 end_time 之后预取上一晚全部楼栋数据，早高峰的默认查询直接命中缓存"""
+        config_tool = ConfigTool(self.db)
+        hour, minute = prefetch_cron(config_tool.get_endTime(), config_tool.get_prefetch_delay_minutes())
+        self.scheduler.add_job(
+            func=self.prefetch_job.run,
+            trigger=CronTrigger(minute=minute, hour=hour),
+            id='prefetch_last_night',
+            name='预取上一晚出入记录',
+            replace_existing=True
+        )
+        self.logger.info(f"已添加预取任务 (每天 {hour:02d}:{minute:02d})")
+
     def stop(self):
         """停止调度器"""
         if self.scheduler and self.scheduler.running:
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+报表生成耗时基准：用合成数据分别生成 N 条记录的晚归名单，输出每次耗时。
+用法: python scripts/bench_gen_excel.py [--write-only] [行数 ...]，默认 1000 10000
+--write-only 表示强制使用流式只写模式
+"""
+import os
+import sys
+import random
+import shutil
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from get_excel_data_curr.gen_excel_data_v1 import gen_excel_data_v1
+
+INSTITUTES = ['计算机科学与信息工程学院', '经济与管理学院', '化工与材料学院', '机械工程学院', '生物工程学院']
+REQUEST = {'startDate': '2026-04-01', 'endDate': '2026-04-02', 'startTime': '23:20:00', 'endTime': '05:30:00'}
+
+
+def make_ret_dict(rows, buildings=('4', '5', '11', '15')):
+    """合成 rows 条记录（每个学生一条，均匀分布在各楼栋）"""
+    rng = random.Random(rows)
+    ret_dict = {b: [] for b in buildings}
+    for i in range(rows):
+        b_num = buildings[i % len(buildings)]
+        ret_dict[b_num].append({
+            'userId': f'2023{i:06d}',
+            'userName': f'学生{i}',
+            'passTimeText': f'2026-04-0{1 + i % 2} {23 if i % 2 == 0 else 1:02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}',
+            'roomName': str(100 + i % 600),
+            'schoolInstituteName': INSTITUTES[i % len(INSTITUTES)],
+            'grade': str(2021 + i % 4),
+            'studentType': '本科生' if i % 5 else '研究生',
+        })
+    return ret_dict
+
+
+def bench(rows, write_only=False):
+    ret_dict = make_ret_dict(rows)
+    output_dir = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        gen_excel_data_v1(ret_dict, 'bench', data_cfg={}, request_data=REQUEST, output_dir=output_dir,
+                          write_only_threshold=1 if write_only else 0)
+        return time.perf_counter() - start
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def main():
+    write_only = '--write-only' in sys.argv[1:]
+    sizes = [int(arg) for arg in sys.argv[1:] if arg != '--write-only'] or [1000, 10000]
+    for rows in sizes:
+        print(f"{rows:>7} 行: {bench(rows, write_only):.2f} 秒")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+验证公寓系统请求的自适应并发：成功时加性增、异常和响应变慢时乘性减、旧请求不重复减半、上下限，
+t3 取数请求把超时/HTTP 异常/CAS 重定向报告给控制器，以及学到的并发数写回 system_config 后下次从该值开始。
+不访问公寓系统。
+"""
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+import requests
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+PASS = 0
+FAIL = 0
+
+REQUEST_DATA = {'startDate': '2026-04-25', 'endDate': '2026-04-26', 'startTime': '23:20:00', 'endTime': '05:30:00'}
+
+
+def record(test_name, passed, detail=''):
+    global PASS, FAIL
+    if passed:
+        PASS += 1
+        print(f"  ✅ PASS {test_name}")
+    else:
+        FAIL += 1
+        print(f"  ❌ FAIL {test_name} - {detail}")
+
+
+def new_limit(min_limit=2, max_limit=8, saved_level=4, latency_target=3):
+    from get_excel_data_curr.admission import Slots
+    from get_excel_data_curr.adaptive_limit import AdaptiveLimit
+
+    slots = Slots('测试', limit=max_limit, max_waiting=4, wait_seconds=5)
+    limit = AdaptiveLimit(slots)
+    slots.limit = limit.configure(True, min_limit, max_limit, latency_target=latency_target, saved_level=saved_level)
+    return limit, slots
+
+
+def test_increase_and_decrease():
+    print("\n--- 加性增与乘性减 ---")
+    limit, slots = new_limit()
+    record('1.1 从保存的并发数开始', limit.level == 4 and slots.limit == 4, str(limit.stats()))
+
+    for _ in range(4):
+        limit.observe(time.monotonic(), 0.1, True)
+    record('1.2 累计 level 次成功后并发数加 1', limit.level == 5 and slots.limit == 5, str(limit.stats()))
+
+    before = time.monotonic()
+    limit.observe(time.monotonic(), 0.1, False, 'HTTP 503')
+    record('1.3 请求异常时并发数减半', limit.level == 2 and slots.limit == 2 and limit.last_signal == 'HTTP 503',
+           str(limit.stats()))
+
+    limit.observe(before - 1, 0.1, False, '超时')
+    record('1.4 减半之前发出的请求不再重复减半', limit.level == 2 and limit.decreases == 1, str(limit.stats()))
+
+    limit.observe(time.monotonic(), 0.1, False, '超时')
+    record('1.5 不低于下限', limit.level == 2, str(limit.stats()))
+
+    for _ in range(100):
+        limit.observe(time.monotonic(), 0.1, True)
+    record('1.6 不超过上限', limit.level == 8 and slots.limit == 8, str(limit.stats()))
+
+
+def test_latency_signal():
+    print("\n--- 响应变慢 ---")
+    limit, slots = new_limit(saved_level=8, latency_target=1)
+    limit.observe(time.monotonic(), 5, True)
+    record('2.1 样本不足 level 个时单个慢请求不减半', limit.level == 8, str(limit.stats()))
+    for _ in range(7):
+        limit.observe(time.monotonic(), 5, True)
+    record('2.2 积累 level 个样本后平均响应时间超过目标时并发数减半', limit.level == 4 and
+           '平均响应' in limit.last_signal, str(limit.stats()))
+    record('2.3 减半后重新统计响应时间', limit.stats()['avg_latency_seconds'] is None, str(limit.stats()))
+    limit.observe(time.monotonic(), 5, True)
+    record('2.4 减半后单个慢请求不再连续减半', limit.level == 4 and limit.decreases == 1, str(limit.stats()))
+
+
+def test_configure():
+    print("\n--- 配置与保存 ---")
+    from get_excel_data_curr.admission import Slots
+    from get_excel_data_curr.adaptive_limit import AdaptiveLimit
+
+    limit = AdaptiveLimit(Slots('测试', limit=16, max_waiting=4, wait_seconds=5))
+    record('3.1 未保存过时从上限开始', limit.configure(True, 2, 16) == 16)
+    record('3.2 之后的配置沿用学到的并发数并按新上限截断',
+           limit.configure(True, 2, 16, saved_level=3) == 16 and limit.configure(True, 2, 6) == 6)
+    record('3.3 未变化时不需要保存', limit.pop_changed_level() == 6 and limit.pop_changed_level() is None)
+
+    record('3.4 未启用时使用上限', limit.configure(False, 2, 12) == 12)
+    limit.observe(time.monotonic(), 0.1, False, '超时')
+    record('3.5 未启用时不调整也不保存', limit.level == 12 and limit.decreases == 0 and limit.pop_changed_level() is None,
+           str(limit.stats()))
+
+    class FakeDatabase:
+        def __init__(self, config):
+            self.config = config
+
+        def get_config(self, key, default=None):
+            return self.config.get(key, default)
+
+    from get_excel_data_curr.ConfigTool import ConfigTool
+    record('3.6 目标响应时间可配置为小数',
+           ConfigTool(FakeDatabase({'upstream_latency_target_seconds': '0.8'})).get_upstream_latency_target_seconds() == 0.8
+           and ConfigTool(FakeDatabase({})).get_upstream_latency_target_seconds() == 3.0)
+
+
+def test_fetch_signals():
+    print("\n--- 取数请求报告异常 ---")
+    import get_excel_data_curr.t3 as t3_module
+    from get_excel_data_curr import adaptive_limit, admission
+
+    class FakeResponse:
+        history = []
+        text = ''
+
+        def __init__(self, status_code=200, url=t3_module.API_URL, payload=None):
+            self.status_code = status_code
+            self.url = url
+            self.payload = payload or {'total': 1, 'rows': [{'userId': '1', 'passTimeText': '2026-04-25 23:30:00'}]}
+
+        def json(self):
+            return self.payload
+
+    class FakeSession:
+        def __init__(self, response=None, error=None):
+            self.response = response
+            self.error = error
+
+        def get(self, url, **kwargs):
+            if self.error is not None:
+                raise self.error
+            return self.response
+
+    cases = [
+        ('HTTP 503', FakeSession(FakeResponse(status_code=503)), 'HTTP 503'),
+        ('CAS 重定向', FakeSession(FakeResponse(url='http://gygl.tust.edu.cn/cas/login?service=x')), 'CAS 重定向'),
+        ('超时', FakeSession(error=requests.ReadTimeout('read timed out')), '超时'),
+        ('连接失败', FakeSession(error=requests.ConnectionError('refused')), '连接失败'),
+    ]
+    original = t3_module.http_client.get_session
+    controller = adaptive_limit.upstream_limit
+    try:
+        for n, (name, session, signal) in enumerate(cases, start=1):
+            controller.level = None
+            admission.upstream_slots.limit = controller.configure(True, 2, 16)
+            t3_module.http_client.get_session = lambda retry=True: session
+            try:
+                t3_module.fetch_total('sid', 'bid-4', '4', REQUEST_DATA)
+            except Exception:
+                pass
+            record(f'4.{n} {name}时并发数减半', controller.level == 8 and admission.upstream_slots.limit == 8 and
+                   controller.last_signal == signal, str(controller.stats()))
+
+        t3_module.http_client.get_session = lambda retry=True: FakeSession(FakeResponse())
+        for _ in range(8):
+            t3_module.fetch_total('sid', 'bid-4', '4', REQUEST_DATA)
+        record('4.5 正常响应累计后并发数加 1', controller.level == 9, str(controller.stats()))
+    finally:
+        t3_module.http_client.get_session = original
+        controller.configure(False, 2, admission.DEFAULT_UPSTREAM_SLOTS)
+        admission.configure()
+
+
+def test_persist_level():
+    print("\n--- 学到的并发数写回配置 ---")
+    import get_excel_data_curr.main as main_module
+    from get_excel_data_curr import adaptive_limit
+    from get_excel_data_curr.admission import Slots
+    from get_excel_data_curr.ConfigTool import ConfigTool
+    from database.db import Database
+
+    tmp_dir = tempfile.mkdtemp()
+    original = adaptive_limit.upstream_limit
+    try:
+        config_tool = ConfigTool(Database(db_path=os.path.join(tmp_dir, 'test.db')))
+        record('5.1 未保存过时没有学到的并发数', config_tool.get_upstream_adaptive_level() is None)
+
+        limit = adaptive_limit.upstream_limit = adaptive_limit.AdaptiveLimit(Slots('测试', 16, 4, 5))
+        limit.configure(True, 2, 16)
+        limit.observe(time.monotonic(), 0.1, False, 'HTTP 503')
+        main_module._save_upstream_level(config_tool)
+        record('5.2 并发数变化后写回 system_config', config_tool.get_upstream_adaptive_level() == 8,
+               str(config_tool.get_upstream_adaptive_level()))
+
+        restarted = adaptive_limit.AdaptiveLimit(Slots('测试', 16, 4, 5))
+        level = restarted.configure(True, 2, 16, saved_level=config_tool.get_upstream_adaptive_level())
+        record('5.3 重启后从保存的并发数开始', level == 8 and restarted.pop_changed_level() is None, str(level))
+    finally:
+        adaptive_limit.upstream_limit = original
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    print("=" * 60)
+    print("测试公寓系统请求自适应并发")
+    print("=" * 60)
+    test_increase_and_decrease()
+    test_latency_signal()
+    test_configure()
+    test_fetch_signals()
+    test_persist_level()
+    print("\n" + "=" * 60)
+    print(f"测试结果汇总: {PASS} 通过, {FAIL} 失败, 共 {PASS + FAIL} 项")
+    print("=" * 60)
+    return 0 if FAIL == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
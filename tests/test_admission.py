@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+验证准入控制：槽位上限、有界等待队列、排队超时、繁忙提示，
+以及取数请求和浏览器登录经过槽位限制、process() 返回繁忙状态。
+不访问公寓系统。
+"""
+import os
+import sys
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+PASS = 0
+FAIL = 0
+
+REQUEST_DATA = {'startDate': '2026-04-25', 'endDate': '2026-04-26', 'startTime': '23:20:00', 'endTime': '05:30:00'}
+
+
+def record(test_name, passed, detail=''):
+    global PASS, FAIL
+    if passed:
+        PASS += 1
+        print(f"  ✅ PASS {test_name}")
+    else:
+        FAIL += 1
+        print(f"  ❌ FAIL {test_name} - {detail}")
+
+
+def hold_slots(slots, count, release):
+    """启动 count 个线程各占用一个槽位，直到 release 被设置"""
+    threads = []
+    for _ in range(count):
+        def hold():
+            with slots.slot():
+                release.wait(5)
+        thread = threading.Thread(target=hold)
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def wait_until(predicate, timeout=2):
+    deadline = time.time() + timeout
+    while time.time() < deadline and not predicate():
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_slots_queue_and_reject():
+    print("\n--- 槽位上限与等待队列 ---")
+    from get_excel_data_curr.admission import Slots, AdmissionBusy
+
+    slots = Slots('测试', limit=2, max_waiting=1, wait_seconds=5)
+    release = threading.Event()
+    holders = hold_slots(slots, 2, release)
+    wait_until(lambda: slots.stats()['in_use'] == 2)
+
+    queued = {}
+
+    def wait_in_queue():
+        with slots.slot():
+            queued['admitted'] = True
+
+    waiter = threading.Thread(target=wait_in_queue)
+    waiter.start()
+    record('1.1 槽位占满时排队等待', wait_until(lambda: slots.stats()['waiting'] == 1), str(slots.stats()))
+    record('1.2 槽位和队列都满时报告饱和', slots.saturated())
+
+    try:
+        slots.acquire()
+        record('1.3 等待队列已满时立即拒绝', False, '未抛出 AdmissionBusy')
+    except AdmissionBusy as e:
+        record('1.3 等待队列已满时立即拒绝', e.retry_after >= 1 and f'请 {e.retry_after} 秒后重试' in str(e), str(e))
+
+    release.set()
+    for thread in holders + [waiter]:
+        thread.join()
+    stats = slots.stats()
+    record('1.4 槽位释放后排队请求获得槽位', queued.get('admitted') is True, str(queued))
+    record('1.5 统计放行和拒绝次数', stats['admitted'] == 3 and stats['rejected'] == 1 and stats['in_use'] == 0,
+           str(stats))
+
+
+def test_wait_timeout():
+    print("\n--- 排队超时 ---")
+    from get_excel_data_curr.admission import Slots, AdmissionBusy
+
+    slots = Slots('测试', limit=1, max_waiting=5, wait_seconds=0.1)
+    release = threading.Event()
+    holders = hold_slots(slots, 1, release)
+    wait_until(lambda: slots.stats()['in_use'] == 1)
+    start = time.time()
+    try:
+        slots.acquire()
+        record('2.1 排队超时后拒绝', False, '未抛出 AdmissionBusy')
+    except AdmissionBusy:
+        record('2.1 排队超时后拒绝', 0.1 <= time.time() - start < 1, f"{time.time() - start:.2f}s")
+    finally:
+        release.set()
+        for thread in holders:
+            thread.join()
+    record('2.2 超时的请求不占用槽位', slots.stats()['in_use'] == 0 and slots.stats()['waiting'] == 0,
+           str(slots.stats()))
+    record('2.3 按平均占用时长估算重试时间', slots.retry_after() == 1, str(slots.retry_after()))
+
+
+def test_upstream_requests_bounded():
+    print("\n--- 取数请求受槽位限制 ---")
+    import get_excel_data_curr.t3 as t3_module
+    from get_excel_data_curr import admission
+
+    class FakeResponse:
+        status_code = 200
+        url = t3_module.API_URL
+        history = []
+        text = ''
+
+        def __init__(self, payload):
+            self.payload = payload
+
+        def json(self):
+            return self.payload
+
+    class FakeSession:
+        def __init__(self):
+            self.lock = threading.Lock()
+            self.active = 0
+            self.max_active = 0
+
+        def get(self, url, params=None, **kwargs):
+            with self.lock:
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+            time.sleep(0.02)
+            with self.lock:
+                self.active -= 1
+            rows = [{'userId': str(n), 'passTimeText': '2026-04-25 23:30:00'}
+                    for n in range(params['offset'], min(params['offset'] + params['limit'], 100))]
+            return FakeResponse({'total': 100, 'rows': rows})
+
+    session = FakeSession()
+    original = t3_module.http_client.get_session
+    t3_module.http_client.get_session = lambda retry=True: session
+    admission.upstream_slots.configure(2, 64, 5)
+    try:
+        rows = t3_module.deal('sid', 'bid-4', '4', REQUEST_DATA, page_size=10, max_workers=8)
+        record('3.1 并发请求数不超过槽位数', session.max_active == 2, str(session.max_active))
+        record('3.2 数据完整', len(rows) == 100, str(len(rows)))
+    finally:
+        t3_module.http_client.get_session = original
+        admission.configure()
+
+
+def test_busy_response():
+    print("\n--- 繁忙提示 ---")
+    from get_excel_data_curr import admission
+
+    record('4.1 未饱和时不返回繁忙', admission.busy_response() is None)
+    admission.upstream_slots.configure(1, 0, 5)
+    release = threading.Event()
+    holders = hold_slots(admission.upstream_slots, 1, release)
+    wait_until(lambda: admission.upstream_slots.stats()['in_use'] == 1)
+    try:
+        busy = admission.busy_response()
+        record('4.2 饱和时返回繁忙状态和重试秒数', busy is not None and busy['status'] == 'busy' and
+               busy['retry_after'] >= 1 and '秒后重试' in busy['msg'], str(busy))
+    finally:
+        release.set()
+        for thread in holders:
+            thread.join()
+        admission.configure()
+
+
+def test_browser_slots_and_process_busy():
+    print("\n--- 浏览器登录槽位与 process() 繁忙状态 ---")
+    import get_excel_data_curr.main as main_module
+    from get_excel_data_curr import admission
+
+    class FakeConfigTool:
+        def get_binary_location(self):
+            return ''
+
+        def get_driver_location(self):
+            return ''
+
+        def get_query_deadline_seconds(self):
+            return 0
+
+    active = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+
+    class FakeDriver:
+        def __init__(self, *args, **kwargs):
+            with lock:
+                active['now'] += 1
+                active['max'] = max(active['max'], active['now'])
+
+        def quit(self):
+            with lock:
+                active['now'] -= 1
+
+    def slow_login(driver, login_url, username, password):
+        time.sleep(0.05)
+        return (True, '登录成功', [{'name': 'sid', 'value': 'fake-sid'}])
+
+    original_chrome, original_login = main_module.webdriver.Chrome, main_module._login_with_retry
+    main_module.webdriver.Chrome = FakeDriver
+    main_module._login_with_retry = slow_login
+    admission.browser_slots.configure(1, 4, 5)
+    try:
+        threads = [threading.Thread(target=main_module._login_with_browser,
+                                    args=(FakeConfigTool(), 'http://login', 'user', 'pass')) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        record('5.1 同时运行的 Chrome 不超过槽位数', active['max'] == 1, str(active))
+    finally:
+        main_module.webdriver.Chrome, main_module._login_with_retry = original_chrome, original_login
+        admission.configure()
+
+    original_config, original_acquire = main_module._get_config_tool, main_module._acquire_sid
+    main_module._get_config_tool = lambda: FakeConfigTool()
+
+    def busy_acquire(config_tool):
+        raise admission.AdmissionBusy('浏览器登录', 30)
+
+    main_module._acquire_sid = busy_acquire
+    try:
+        result = main_module.process({'buildings': ['4'], 'username': 'admin'})
+        record('5.2 process() 返回繁忙状态', result == {'msg': '系统繁忙（浏览器登录已满），请 30 秒后重试',
+                                                    'status': 'busy', 'retry_after': 30}, str(result))
+    finally:
+        main_module._get_config_tool, main_module._acquire_sid = original_config, original_acquire
+
+
+def test_admitted_query():
+    print("\n--- 按查询准入 ---")
+    import get_excel_data_curr.t3 as t3_module
+    from get_excel_data_curr import admission, deadline
+    from get_excel_data_curr.admission import Slots
+
+    slots = Slots('测试', limit=1, max_waiting=0, wait_seconds=0.05)
+    release = threading.Event()
+    holders = hold_slots(slots, 1, release)
+    wait_until(lambda: slots.stats()['in_use'] == 1)
+    token = admission.admit()
+    try:
+        threading.Timer(0.2, release.set).start()
+        start = time.time()
+        slots.release(slots.acquire())
+        record('6.1 已准入查询的分页请求不受等待队列上限和 wait_seconds 限制',
+               time.time() - start >= 0.15 and slots.stats()['rejected'] == 0, str(slots.stats()))
+    finally:
+        admission.unbind(token)
+        release.set()
+        for thread in holders:
+            thread.join()
+    record('6.2 准入标记随 unbind 清除', not admission.is_admitted())
+
+    admission.upstream_slots.configure(1, 0, 5)
+    release = threading.Event()
+    holders = hold_slots(admission.upstream_slots, 1, release)
+    wait_until(lambda: admission.upstream_slots.stats()['in_use'] == 1)
+    try:
+        try:
+            admission.admit()
+            record('6.3 槽位和队列都满时查询在取数前被拒绝', False, '未抛出 AdmissionBusy')
+        except admission.AdmissionBusy as e:
+            record('6.3 槽位和队列都满时查询在取数前被拒绝', '秒后重试' in str(e), str(e))
+
+        # 槽位已满但等待队列未满时准入，之后的请求排队到处理时限用完，按该楼栋取数超时处理
+        admission.upstream_slots.configure(1, 4, 5)
+        token = admission.admit()
+        deadline_token = deadline.start(0.1)
+        try:
+            t3_module._get(t3_module.API_URL, '楼栋4第1页')
+            record('6.4 排队到时限用完时计为取数失败', False, '未抛出异常')
+        except t3_module.DataFetchError as e:
+            record('6.4 排队到时限用完时计为取数失败', isinstance(e, t3_module.DeadlineExceededError), str(e))
+        finally:
+            deadline.unbind(deadline_token)
+            admission.unbind(token)
+    finally:
+        release.set()
+        for thread in holders:
+            thread.join()
+        admission.configure()
+
+
+def main():
+    print("=" * 60)
+    print("测试准入控制")
+    print("=" * 60)
+    test_slots_queue_and_reject()
+    test_wait_timeout()
+    test_upstream_requests_bounded()
+    test_busy_response()
+    test_browser_slots_and_process_busy()
+    test_admitted_query()
+    print("\n" + "=" * 60)
+    print(f"测试结果汇总: {PASS} 通过, {FAIL} 失败, 共 {PASS + FAIL} 项")
+    print("=" * 60)
+    return 0 if FAIL == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
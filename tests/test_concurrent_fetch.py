@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+验证楼栋分页并发拉取的顺序与失败语义。
+"""
+import os
+import sys
+import random
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+PASS = 0
+FAIL = 0
+
+REQUEST_DATA = {'startTime': '23:20:00', 'endTime': '05:30:00'}
+
+
+def record(test_name, passed, detail=''):
+    global PASS, FAIL
+    if passed:
+        PASS += 1
+        print(f"  ✅ PASS {test_name}")
+    else:
+        FAIL += 1
+        print(f"  ❌ FAIL {test_name} - {detail}")
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None, text='', url='http://gygl.tust.edu.cn/api'):
+        self.status_code = status_code
+        self._payload = payload
+        self.text = text
+        self.url = url
+        self.history = []
+
+    def json(self):
+        return self._payload
+
+
+class FakeSession:
+    """替代共享连接池会话，只需要 get 方法"""
+
+    def __init__(self, get):
+        self.get = get
+
+
+class FakeApi:
+    """按 offset/limit 返回编号连续的记录，可指定失败的 offset 并统计最大并发"""
+
+    def __init__(self, total, fail_offset=None, delay=0.01, max_limit=None):
+        self.total = total
+        self.max_limit = max_limit
+        self.fail_offset = fail_offset
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def get(self, url, params=None, **kwargs):
+        with self.lock:
+            self.calls.append((params['offset'], params['limit']))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(random.uniform(0, self.delay))
+            offset, limit = params['offset'], params['limit']
+            if self.max_limit:
+                limit = min(limit, self.max_limit)
+            if offset == self.fail_offset:
+                return FakeResponse(status_code=500, text='server error')
+            rows = [{'userId': str(n), 'passTimeText': '2026-04-25 23:30:00'}
+                    for n in range(offset, min(offset + limit, self.total))]
+            return FakeResponse(payload={'total': self.total, 'rows': rows})
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def run_deal(api, **kwargs):
+    import get_excel_data_curr.t3 as t3_module
+
+    original_get_session = t3_module.http_client.get_session
+    t3_module.http_client.get_session = lambda retry=True: FakeSession(api.get)
+    try:
+        return t3_module.deal('sid', 'bid-1', '1', REQUEST_DATA, **kwargs)
+    finally:
+        t3_module.http_client.get_session = original_get_session
+
+
+def test_concurrent_pages_keep_offset_order():
+    print("\n--- 并发分页按 offset 顺序拼接 ---")
+    api = FakeApi(total=95)
+    rows = run_deal(api, page_size=10, max_workers=4)
+    record('1.1 记录数正确', len(rows) == 95, str(len(rows)))
+    record('1.2 顺序与 offset 一致', [r['userId'] for r in rows] == [str(n) for n in range(95)])
+    record('1.3 并发数不超过上限', 1 < api.max_active <= 4, str(api.max_active))
+
+
+def test_concurrent_page_failure_raises():
+    print("\n--- 任一分页失败抛出 DataFetchError ---")
+    import get_excel_data_curr.t3 as t3_module
+
+    api = FakeApi(total=95, fail_offset=50)
+    try:
+        run_deal(api, page_size=10, max_workers=4)
+        record('2.1 分页失败应抛 DataFetchError', False, '未抛异常')
+    except t3_module.DataFetchError as e:
+        record('2.1 分页失败抛 DataFetchError', '第5页' in str(e), str(e))
+
+
+def test_sequential_mode_unchanged():
+    print("\n--- max_workers=1 保持顺序请求 ---")
+    api = FakeApi(total=25, delay=0)
+    rows = run_deal(api, page_size=10, max_workers=1)
+    record('3.1 记录完整', [r['userId'] for r in rows] == [str(n) for n in range(25)])
+    record('3.2 无并发请求', api.max_active == 1, str(api.max_active))
+
+
+def test_probe_page_is_reused():
+    print("\n--- 首页数据复用，不重复请求 offset=0 ---")
+    api = FakeApi(total=95, delay=0)
+    rows = run_deal(api, page_size=10, max_workers=4, probe_size=100)
+    record('5.1 小楼栋一次请求取完', len(api.calls) == 1 and len(rows) == 95, str(api.calls))
+
+    api = FakeApi(total=250, delay=0)
+    rows = run_deal(api, page_size=20, max_workers=4, probe_size=100)
+    offsets = sorted(offset for offset, _ in api.calls)
+    record('5.2 剩余数据从 probe_size 处分页', offsets == [0] + list(range(100, 250, 20)), str(offsets))
+    record('5.3 记录完整且有序', [r['userId'] for r in rows] == [str(n) for n in range(250)])
+
+    api = FakeApi(total=120, delay=0, max_limit=50)
+    rows = run_deal(api, page_size=20, max_workers=1, probe_size=100)
+    offsets = [offset for offset, _ in api.calls]
+    record('5.4 服务端截断 limit 时从实际条数继续', offsets == [0, 50, 70, 90, 110] and len(rows) == 120, str(offsets))
+
+
+def test_parallel_buildings():
+    print("\n--- 多楼栋并发拉取 ---")
+    import get_excel_data_curr.main as main_module
+    import get_excel_data_curr.t3 as t3_module
+
+    main_module.session_store.invalidate()
+    main_module.session_store._sid = 'shared-sid'
+    seen_cookies = set()
+
+    def slow_deal(cookie, bid, b_num, request_data, page_size=20, **kwargs):
+        seen_cookies.add(cookie)
+        time.sleep(0.2)
+        if b_num == '3':
+            raise t3_module.SessionExpiredError('楼栋3登录态失效，接口返回登录页')
+        return [{'userId': b_num}]
+
+    original_deal = main_module.t3.deal
+    main_module.t3.deal = slow_deal
+    try:
+        start = time.time()
+        ret_dict, fetch_errors = main_module._fetch_buildings(
+            'shared-sid', {'5': 'bid-5', '1': 'bid-1', '3': 'bid-3', '2': 'bid-2'}, REQUEST_DATA, {'page_size': 20}, 4)
+        elapsed = time.time() - start
+    finally:
+        main_module.t3.deal = original_deal
+
+    record('4.1 楼栋并发执行', elapsed < 0.6, f'{elapsed:.2f}s')
+    record('4.2 结果保持楼栋顺序', list(ret_dict.keys()) == ['5', '1', '2'], str(list(ret_dict.keys())))
+    record('4.3 失败楼栋进入 fetch_errors', len(fetch_errors) == 1 and fetch_errors[0].startswith('楼栋3'), str(fetch_errors))
+    record('4.4 所有楼栋共用同一 sid', seen_cookies == {'shared-sid'}, str(seen_cookies))
+    record('4.5 登录态失效时作废缓存 sid', not main_module.session_store.stats()['has_session'])
+
+
+ALL_BUILDINGS = {str(n): f'bid-{n}' for n in range(1, 21)}
+
+
+def test_fetch_plan():
+    print("\n--- 整楼群 / 逐栋取数计划 ---")
+    from get_excel_data_curr import fetch_planner
+
+    selected = {str(n): f'bid-{n}' for n in list(range(1, 13)) + [15, 16]}
+    tasks = fetch_planner.plan_fetch(selected, ALL_BUILDINGS, 0.7)
+    kinds = [(t.kind, list(t.buildings)) for t in tasks]
+    record('6.1 中院选中 12/14 栋走整楼群查询', kinds[0] == ('group', [str(n) for n in range(1, 13)]), str(kinds))
+    record('6.2 西院选中 2/6 栋逐栋查询', kinds[1:] == [('building', ['15']), ('building', ['16'])], str(kinds))
+
+    tasks = fetch_planner.plan_fetch(selected, ALL_BUILDINGS, 2)
+    record('6.3 阈值大于 1 时全部逐栋查询', all(t.kind == 'building' for t in tasks) and len(tasks) == 14)
+
+    rows = [{'buildingId': 'bid-2', 'userId': 'a'}, {'buildingId': 'bid-9', 'userId': 'b'},
+            {'buildingId': 'bid-1', 'userId': 'c'}]
+    split = fetch_planner.split_rows_by_building(rows, {'1': 'bid-1', '2': 'bid-2', '3': 'bid-3'})
+    record('6.4 按 buildingId 拆分并丢弃未选中楼栋',
+           {k: [r['userId'] for r in v] for k, v in split.items()} == {'1': ['c'], '2': ['a'], '3': []}, str(split))
+    record('6.5 缺少 buildingId 时无法拆分', fetch_planner.split_rows_by_building([{'userId': 'x'}], {'1': 'bid-1'}) is None)
+    record('6.6 buildingId 与配置的楼栋 ID 格式不一致时无法拆分',
+           fetch_planner.split_rows_by_building([{'buildingId': 'xyz', 'userId': 'x'}],
+                                                {'1': 'bid-1', '2': 'bid-2'}) is None)
+    rows = [{'buildingId': 'bid-1', 'userId': 'a'}] + [{'buildingId': 'other', 'userId': str(n)} for n in range(9)]
+    record('6.7 属于选中楼栋的记录少于选中比例时无法拆分',
+           fetch_planner.split_rows_by_building(rows, {'1': 'bid-1', '2': 'bid-2'}, min_share=0.5) is None)
+    record('6.8 整楼群任务带选中比例', fetch_planner.plan_fetch(selected, ALL_BUILDINGS, 0.7)[0].share == 12 / 14)
+
+    class FakeDatabase:
+        def __init__(self, config):
+            self.config = config
+
+        def get_config(self, key, default=None):
+            return self.config.get(key, default)
+
+    from get_excel_data_curr.ConfigTool import ConfigTool
+    record('6.9 整楼群查询默认不启用', ConfigTool(FakeDatabase({})).get_group_fetch_ratio() > 1 and
+           ConfigTool(FakeDatabase({'group_fetch_ratio': '0.7'})).get_group_fetch_ratio() == 0.7)
+
+
+def test_group_fetch_execution():
+    print("\n--- 整楼群查询结果与逐栋查询一致 ---")
+    import get_excel_data_curr.main as main_module
+
+    calls = []
+
+    def fake_deal(cookie, bid, b_num, request_data, building_group_id=None, **kwargs):
+        calls.append((bid, building_group_id))
+        if bid == '':
+            return [{'buildingId': f'bid-{n}', 'userId': f'u{n}'} for n in range(1, 15)]
+        return [{'buildingId': bid, 'userId': f'u{b_num}'}]
+
+    selected = {str(n): f'bid-{n}' for n in [3, 1, 2, 4, 5, 6, 7, 8, 9, 10, 11]}
+    original_deal = main_module.t3.deal
+    main_module.t3.deal = fake_deal
+    try:
+        grouped, _ = main_module._fetch_buildings('sid', selected, REQUEST_DATA, {}, 4,
+                                                  all_bid_dict=ALL_BUILDINGS, group_ratio=0.7)
+        group_calls = len(calls)
+        calls.clear()
+        single, _ = main_module._fetch_buildings('sid', selected, REQUEST_DATA, {}, 4,
+                                                 all_bid_dict=ALL_BUILDINGS, group_ratio=2)
+    finally:
+        main_module.t3.deal = original_deal
+
+    record('7.1 整楼群只请求一次', group_calls == 1, str(group_calls))
+    record('7.2 ret_dict 形状与逐栋查询相同', grouped == single and list(grouped) == list(selected), str(list(grouped)))
+
+    def mismatched_deal(cookie, bid, b_num, request_data, building_group_id=None, **kwargs):
+        calls.append((bid, building_group_id))
+        if bid == '':
+            return [{'buildingId': f'other-{n}', 'userId': f'u{n}'} for n in range(1, 15)]
+        return [{'buildingId': bid, 'userId': f'u{b_num}'}]
+
+    calls.clear()
+    main_module.t3.deal = mismatched_deal
+    try:
+        fallback, errors = main_module._fetch_buildings('sid', selected, REQUEST_DATA, {}, 4,
+                                                        all_bid_dict=ALL_BUILDINGS, group_ratio=0.7)
+    finally:
+        main_module.t3.deal = original_deal
+    record('7.3 buildingId 对不上时改为逐栋查询，不返回空记录',
+           fallback == single and not errors and len(calls) == 1 + len(selected), f"{len(calls)} {errors}")
+
+
+def test_streaming_records():
+    print("\n--- 逐页产出记录 ---")
+    import get_excel_data_curr.t3 as t3_module
+
+    api = FakeApi(total=25, delay=0)
+    original_get_session = t3_module.http_client.get_session
+    t3_module.http_client.get_session = lambda retry=True: FakeSession(api.get)
+    try:
+        pages = t3_module.iter_pages('sid', 'bid-1', '1', REQUEST_DATA, page_size=10)
+        first = next(pages)
+        record('8.1 首页到达时只发出一次请求', len(first) == 10 and len(api.calls) == 1, str(api.calls))
+        rest = [len(page) for page in pages]
+        record('8.2 后续分页按顺序产出', rest == [10, 5], str(rest))
+
+        api.calls.clear()
+        pages = t3_module.iter_pages('sid', 'bid-1', '1', REQUEST_DATA, page_size=10)
+        next(pages)
+        pages.close()
+        record('8.3 下游提前停止时不再请求后续分页', len(api.calls) == 1, str(api.calls))
+    finally:
+        t3_module.http_client.get_session = original_get_session
+
+
+def test_rows_projected_at_ingestion():
+    print("\n--- 取数时投影为紧凑记录 ---")
+    import json
+    from get_excel_data_curr.records import InoutRecord
+
+    api = FakeApi(total=3, delay=0)
+    original_get = api.get
+
+    def get_with_extra_fields(url, params=None, **kwargs):
+        response = original_get(url, params=params, **kwargs)
+        for row in response._payload['rows']:
+            row.update({'schoolInstituteName': '经济与管理学院'.encode().decode(), 'photoUrl': 'http://x/1.jpg'})
+        return response
+    api.get = get_with_extra_fields
+
+    rows = run_deal(api, page_size=1)
+    record('9.1 记录类型为 InoutRecord', all(isinstance(r, InoutRecord) for r in rows), str(type(rows[0])))
+    record('9.2 未使用的字段被丢弃', 'photoUrl' not in rows[0] and rows[0].get('photoUrl') is None)
+    record('9.3 字典式访问', rows[0]['userId'] == '0' and rows[0].get('grade', '') == '' and 'userId' in rows[0])
+    record('9.4 重复字段值驻留为同一对象',
+           rows[0]['schoolInstituteName'] is rows[2]['schoolInstituteName'])
+    rows[0]['roomName'] = '4-101'
+    record('9.5 支持修改字段并可序列化',
+           json.loads(json.dumps(dict(rows[0]), ensure_ascii=False))['roomName'] == '4-101')
+    record('9.6 与等值 dict 比较相等', rows[1] == {'userId': '1', 'passTimeText': '2026-04-25 23:30:00',
+                                               'schoolInstituteName': '经济与管理学院'})
+
+
+def main():
+    print("=" * 60)
+    print("测试楼栋数据并发拉取")
+    print("=" * 60)
+    test_concurrent_pages_keep_offset_order()
+    test_concurrent_page_failure_raises()
+    test_sequential_mode_unchanged()
+    test_probe_page_is_reused()
+    test_parallel_buildings()
+    test_fetch_plan()
+    test_group_fetch_execution()
+    test_streaming_records()
+    test_rows_projected_at_ingestion()
+    print("\n" + "=" * 60)
+    print(f"测试结果汇总: {PASS} 通过, {FAIL} 失败, 共 {PASS + FAIL} 项")
+    print("=" * 60)
+    return 0 if FAIL == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
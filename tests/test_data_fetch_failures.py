@@ -32,6 +32,12 @@ class FakeConfigTool:
     def get_flag(self):
         return 'whosyourdady'
 
+    def get_login_mode(self):
+        return 'selenium'
+
+    def get_session_validate_interval(self):
+        return 30
+
     def get_binary_location(self):
         return ''
 
@@ -44,6 +50,72 @@ class FakeConfigTool:
     def get_pagesize(self):
         return 30
 
+    def get_page_fetch_workers(self):
+        return 1
+
+    def get_building_fetch_workers(self):
+        return 2
+
+    def get_probe_page_size(self):
+        return 100
+
+    def get_group_fetch_ratio(self):
+        return 2
+
+    def get_excel_write_only_threshold(self):
+        return 0
+
+    def get_night_fetch_workers(self):
+        return 1
+
+    def get_report_cache_enabled(self):
+        return False
+
+    def get_record_store_enabled(self):
+        return False
+
+    def get_http_pool_size(self):
+        return 20
+
+    def get_http_retry_total(self):
+        return 0
+
+    def get_browser_slots(self):
+        return 1
+
+    def get_browser_max_waiting(self):
+        return 4
+
+    def get_upstream_slots(self):
+        return 16
+
+    def get_upstream_max_waiting(self):
+        return 64
+
+    def get_admission_wait_seconds(self):
+        return 60
+
+    def get_upstream_adaptive_enabled(self):
+        return False
+
+    def get_upstream_min_slots(self):
+        return 2
+
+    def get_upstream_latency_target_seconds(self):
+        return 3
+
+    def get_upstream_adaptive_level(self):
+        return None
+
+    def get_upstream_connect_timeout(self):
+        return 5
+
+    def get_upstream_read_timeout(self):
+        return 30
+
+    def get_query_deadline_seconds(self):
+        return 600
+
     def get_data_cfg(self):
         return {}
 
@@ -54,6 +126,9 @@ class FakeDriver:
 
 
 def patch_process_runtime(main_module):
+    """替换登录相关依赖，返回恢复函数，避免影响之后运行的其他测试文件"""
+    originals = (main_module._get_config_tool, main_module.webdriver.Chrome, main_module._login_with_retry)
+    main_module.session_store.invalidate()
     main_module._get_config_tool = lambda: FakeConfigTool()
     main_module.webdriver.Chrome = lambda *args, **kwargs: FakeDriver()
     main_module._login_with_retry = lambda *args, **kwargs: (
@@ -62,13 +137,20 @@ def patch_process_runtime(main_module):
         [{'value': 'fake-sid'}],
     )
 
+    def restore():
+        main_module.session_store.invalidate()
+        (main_module._get_config_tool, main_module.webdriver.Chrome,
+         main_module._login_with_retry) = originals
+
+    return restore
+
 
 def test_all_buildings_failed():
     print("\n--- 全部楼栋取数失败 ---")
     import get_excel_data_curr.main as main_module
     import get_excel_data_curr.t3 as t3_module
 
-    patch_process_runtime(main_module)
+    restore_runtime = patch_process_runtime(main_module)
     called = {'excel': False}
     original_deal = main_module.t3.deal
     original_gen_excel = main_module.gen_excel_data_v1
@@ -93,6 +175,7 @@ def test_all_buildings_failed():
     finally:
         main_module.t3.deal = original_deal
         main_module.gen_excel_data_v1 = original_gen_excel
+        restore_runtime()
 
     record('1.1 返回失败状态', result.get('status') == 'false', str(result))
     record('1.2 不返回 file_name', 'file_name' not in result, str(result))
@@ -105,12 +188,12 @@ def test_partial_building_failure_still_succeeds():
     import get_excel_data_curr.main as main_module
     import get_excel_data_curr.t3 as t3_module
 
-    patch_process_runtime(main_module)
+    restore_runtime = patch_process_runtime(main_module)
     captured = {}
     original_deal = main_module.t3.deal
     original_gen_excel = main_module.gen_excel_data_v1
 
-    def mixed_deal(cookie, building_id, b_num, request_data, page_size=20):
+    def mixed_deal(cookie, building_id, b_num, request_data, page_size=20, **kwargs):
         if b_num == '1':
             raise t3_module.DataFetchError('接口返回登录页')
         return [{
@@ -123,7 +206,7 @@ def test_partial_building_failure_still_succeeds():
             'studentType': '研究生',
         }]
 
-    def fake_gen_excel(ret_dict, username, data_cfg=None, request_data=None):
+    def fake_gen_excel(ret_dict, username, data_cfg=None, request_data=None, **kwargs):
         captured['ret_dict'] = ret_dict
         return './result-files/admin/fake.xlsx'
 
@@ -140,12 +223,71 @@ def test_partial_building_failure_still_succeeds():
     finally:
         main_module.t3.deal = original_deal
         main_module.gen_excel_data_v1 = original_gen_excel
+        restore_runtime()
 
     record('2.1 返回成功状态', result.get('status') == 'success', str(result))
     record('2.2 返回 file_name', result.get('file_name') == './result-files/admin/fake.xlsx', str(result))
     record('2.3 只包含成功楼栋', set(captured.get('ret_dict', {}).keys()) == {'2'}, str(captured))
 
 
+def test_split_nights():
+    print("\n--- 跨多天查询按晚拆分 ---")
+    import get_excel_data_curr.t3 as t3_module
+
+    request = {'startDate': '2026-04-01', 'endDate': '2026-04-04', 'startTime': '23:20:00', 'endTime': '05:30:00'}
+    nights = t3_module.split_nights(request)
+    record('6.1 三天拆成三晚', [(n['startDate'], n['endDate']) for n in nights] == [
+        ('2026-04-01', '2026-04-02'), ('2026-04-02', '2026-04-03'), ('2026-04-03', '2026-04-04')], str(nights))
+    record('6.2 每晚保留起止时刻', all(n['startTime'] == '23:20:00' and n['endTime'] == '05:30:00' for n in nights))
+    record('6.3 夜间标签', [t3_module.night_label(n) for n in nights] == ['4.1-4.2', '4.2-4.3', '4.3-4.4'])
+    single = dict(request, endDate='2026-04-02')
+    record('6.4 只有一晚不拆分', t3_module.split_nights(single) == [single])
+    no_date = {'startTime': '23:20:00', 'endTime': '05:30:00'}
+    record('6.5 未指定日期不拆分', t3_module.split_nights(no_date) == [no_date])
+
+
+def test_multi_night_process():
+    print("\n--- 多晚查询逐晚取数 ---")
+    import get_excel_data_curr.main as main_module
+    import get_excel_data_curr.t3 as t3_module
+
+    restore_runtime = patch_process_runtime(main_module)
+    captured = {}
+    original_deal = main_module.t3.deal
+    original_gen_nights = main_module.gen_excel_nights
+
+    def night_deal(cookie, building_id, b_num, request_data, page_size=20, **kwargs):
+        if request_data['startDate'] == '2026-04-02':
+            raise t3_module.DataFetchError('接口返回登录页')
+        return [{'userId': '001', 'passTimeText': f"{request_data['endDate']} 01:00:00", 'buildingId': building_id}]
+
+    def fake_gen_nights(nights, username, **kwargs):
+        captured['nights'] = nights
+        return './result-files/admin/nights.xlsx'
+
+    main_module.t3.deal = night_deal
+    main_module.gen_excel_nights = fake_gen_nights
+    try:
+        result = main_module.process({
+            'buildings': ['1'],
+            'username': 'admin',
+            'startDate': '2026-04-01',
+            'endDate': '2026-04-04',
+            'startTime': '23:20:00',
+            'endTime': '05:30:00',
+        })
+    finally:
+        main_module.t3.deal = original_deal
+        main_module.gen_excel_nights = original_gen_nights
+        restore_runtime()
+
+    nights = captured.get('nights', [])
+    record('7.1 部分夜间失败仍返回成功', result.get('status') == 'success', str(result))
+    record('7.2 只包含取数成功的夜间', [label for label, _ in nights] == ['4.1-4.2', '4.3-4.4'], str(nights))
+    record('7.3 每晚只包含当晚记录', [r['passTimeText'] for _, ret in nights for r in ret['1']] == [
+        '2026-04-02 01:00:00', '2026-04-04 01:00:00'], str(nights))
+
+
 class FakeResponse:
     def __init__(self, status_code=200, payload=None, text='', url='http://gygl.tust.edu.cn/api', history=None):
         self.status_code = status_code
@@ -160,32 +302,40 @@ class FakeResponse:
         return self._payload
 
 
+class FakeSession:
+    """替代共享连接池会话，只需要 get 方法"""
+
+    def __init__(self, get):
+        self.get = get
+
+
 def test_zero_total_is_not_failure():
     print("\n--- total=0 不算取数失败 ---")
     import get_excel_data_curr.t3 as t3_module
 
-    original_get = t3_module.requests.get
-    t3_module.requests.get = lambda *args, **kwargs: FakeResponse(payload={'total': 0, 'rows': []})
+    original_get_session = t3_module.http_client.get_session
+    t3_module.http_client.get_session = lambda retry=True: FakeSession(
+        lambda *args, **kwargs: FakeResponse(payload={'total': 0, 'rows': []}))
     try:
         rows = t3_module.deal('sid', 'bid-1', '1', {'startTime': '23:20:00', 'endTime': '05:30:00'})
         record('3.1 返回空列表', rows == [], str(rows))
     except Exception as e:
         record('3.1 total=0 不应抛异常', False, str(e))
     finally:
-        t3_module.requests.get = original_get
+        t3_module.http_client.get_session = original_get_session
 
 
 def test_login_redirect_is_failure():
     print("\n--- 接口跳转登录页算取数失败 ---")
     import get_excel_data_curr.t3 as t3_module
 
-    original_get = t3_module.requests.get
-    t3_module.requests.get = lambda *args, **kwargs: FakeResponse(
+    original_get_session = t3_module.http_client.get_session
+    t3_module.http_client.get_session = lambda retry=True: FakeSession(lambda *args, **kwargs: FakeResponse(
         status_code=200,
         payload=ValueError('not json'),
         text='<html>login</html>',
         url='http://gygl.tust.edu.cn:8080/cas/login',
-    )
+    ))
     try:
         t3_module.deal('sid', 'bid-1', '1', {'startTime': '23:20:00', 'endTime': '05:30:00'})
         record('4.1 跳转登录页应抛 DataFetchError', False, '未抛异常')
@@ -194,7 +344,7 @@ def test_login_redirect_is_failure():
     except Exception as e:
         record('4.1 异常类型错误', False, type(e).__name__)
     finally:
-        t3_module.requests.get = original_get
+        t3_module.http_client.get_session = original_get_session
 
 
 def test_task_manager_failed_result_does_not_send_email():
@@ -250,6 +400,8 @@ def main():
     test_partial_building_failure_still_succeeds()
     test_zero_total_is_not_failure()
     test_login_redirect_is_failure()
+    test_split_nights()
+    test_multi_night_process()
     test_task_manager_failed_result_does_not_send_email()
     print("\n" + "=" * 60)
     print(f"测试结果汇总: {PASS} 通过, {FAIL} 失败, 共 {PASS + FAIL} 项")
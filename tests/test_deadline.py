@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+验证查询处理时限：每次请求的连接/读取超时不超过剩余时间、线程池子任务共用时限、
+排队等待受时限约束、请求超时和连接失败转为 DataFetchError，以及登录、生成报表和 process() 在时限用完时干净地结束。
+不访问公寓系统。
+"""
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+
+import requests
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+PASS = 0
+FAIL = 0
+
+REQUEST_DATA = {'startDate': '2026-04-25', 'endDate': '2026-04-26', 'startTime': '23:20:00', 'endTime': '05:30:00'}
+
+
+def record(test_name, passed, detail=''):
+    global PASS, FAIL
+    if passed:
+        PASS += 1
+        print(f"  ✅ PASS {test_name}")
+    else:
+        FAIL += 1
+        print(f"  ❌ FAIL {test_name} - {detail}")
+
+
+def with_deadline(seconds, func):
+    """在绑定 seconds 秒时限的上下文中执行 func"""
+    from get_excel_data_curr import deadline
+
+    token = deadline.start(seconds)
+    try:
+        return func()
+    finally:
+        deadline.unbind(token)
+
+
+class FakeResponse:
+    status_code = 200
+    history = []
+    text = ''
+
+    def __init__(self, payload):
+        import get_excel_data_curr.t3 as t3_module
+        self.url = t3_module.API_URL
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """记录每次请求的 timeout，返回 total 条记录"""
+
+    def __init__(self, total=25, delay=0, error=None):
+        self.total = total
+        self.delay = delay
+        self.error = error
+        self.timeouts = []
+        self.lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=None, **kwargs):
+        with self.lock:
+            self.timeouts.append(timeout)
+        if self.error is not None:
+            raise self.error
+        time.sleep(self.delay)
+        rows = [{'userId': str(n), 'passTimeText': '2026-04-25 23:30:00'}
+                for n in range(params['offset'], min(params['offset'] + params['limit'], self.total))]
+        return FakeResponse({'total': self.total, 'rows': rows})
+
+
+def patch_session(session):
+    import get_excel_data_curr.t3 as t3_module
+
+    original = t3_module.http_client.get_session
+    t3_module.http_client.get_session = lambda retry=True: session
+    return lambda: setattr(t3_module.http_client, 'get_session', original)
+
+
+def test_timeout_values():
+    print("\n--- 请求超时取值 ---")
+    from get_excel_data_curr import deadline
+
+    deadline.configure(connect_timeout=5, read_timeout=30)
+    record('1.1 未绑定时限时使用超时上限', deadline.request_timeout() == (5, 30) and deadline.remaining() is None,
+           str(deadline.request_timeout()))
+    connect, read = with_deadline(2, deadline.request_timeout)
+    record('1.2 绑定时限时连接与读取超时之和不超过剩余时间', 0.9 < connect <= 1 and connect + read <= 2 and read > 0.9,
+           f"{connect}, {read}")
+    connect, read = with_deadline(3, lambda: deadline.request_timeout(attempts=3))
+    record('1.2.1 剩余时间平分给剩余的尝试次数', connect + read <= 1 and read > 0.4, f"{connect}, {read}")
+    record('1.3 不限时（0 秒）等同未绑定', with_deadline(0, deadline.current) is None)
+    expired = with_deadline(0.01, lambda: (time.sleep(0.02), deadline.cap(10))[1])
+    record('1.4 时限用完时仍给出最小正数超时', expired == deadline.MIN_TIMEOUT, str(expired))
+    record('1.5 退出上下文后恢复未绑定', deadline.current() is None)
+
+
+def test_fetch_uses_deadline():
+    print("\n--- 分页请求共用时限 ---")
+    import get_excel_data_curr.t3 as t3_module
+
+    session = FakeSession(total=25)
+    restore = patch_session(session)
+    try:
+        rows = with_deadline(3, lambda: t3_module.deal('sid', 'bid-4', '4', REQUEST_DATA, page_size=10, max_workers=2))
+        record('2.1 数据完整', len(rows) == 25, str(len(rows)))
+        record('2.2 首页和并发分页请求都带不超过时限的超时',
+               len(session.timeouts) == 3 and all(t is not None and t[0] <= 3 and t[1] <= 3 for t in session.timeouts),
+               str(session.timeouts))
+
+        session = FakeSession(total=25)
+        restore()
+        restore = patch_session(session)
+        t3_module.deal('sid', 'bid-4', '4', REQUEST_DATA, page_size=10)
+        record('2.3 未绑定时限时使用读取超时上限', all(t == (5, 30) for t in session.timeouts), str(session.timeouts))
+    finally:
+        restore()
+
+
+def test_retries_within_deadline():
+    print("\n--- 时限内逐次重试 ---")
+    import get_excel_data_curr.t3 as t3_module
+    from get_excel_data_curr import http_client
+
+    class FlakySession(FakeSession):
+        """前 failures 次返回 503，之后正常返回"""
+
+        def __init__(self, failures):
+            super().__init__(total=5)
+            self.failures = failures
+
+        def get(self, url, params=None, timeout=None, **kwargs):
+            if len(self.timeouts) < self.failures:
+                self.timeouts.append(timeout)
+                response = FakeResponse({})
+                response.status_code = 503
+                return response
+            return super().get(url, params=params, timeout=timeout, **kwargs)
+
+    class HangingSession(FakeSession):
+        """每次都等满超时后抛出 ReadTimeout"""
+
+        def get(self, url, params=None, timeout=None, **kwargs):
+            self.timeouts.append(timeout)
+            time.sleep(sum(timeout))
+            raise requests.ReadTimeout('read timed out')
+
+    http_client.configure(retry_total=2, retry_backoff=0)
+    session = FlakySession(failures=2)
+    restore = patch_session(session)
+    try:
+        total = with_deadline(3, lambda: t3_module.fetch_total('sid', 'bid-4', '4', REQUEST_DATA))
+        record('2.4 绑定时限时 503 在时限内重试', total == 5 and len(session.timeouts) == 3, str(session.timeouts))
+        record('2.5 每次尝试的超时不超过剩余时间的份额',
+               sum(session.timeouts[0]) <= 1 and sum(session.timeouts[1]) <= 1.5, str(session.timeouts))
+    finally:
+        restore()
+
+    http_client.configure(retry_total=5, retry_backoff=0)
+    session = HangingSession()
+    restore = patch_session(session)
+    start = time.time()
+    try:
+        with_deadline(0.3, lambda: t3_module.fetch_total('sid', 'bid-4', '4', REQUEST_DATA))
+        record('2.6 重试不超出时限', False, '未抛出异常')
+    except t3_module.DataFetchError as e:
+        record('2.6 重试不超出时限', time.time() - start < 0.45 and isinstance(e, t3_module.DeadlineExceededError),
+               f"{time.time() - start:.2f}s {e} {session.timeouts}")
+    finally:
+        restore()
+        http_client.configure()
+
+
+def test_expired_and_timeout_errors():
+    print("\n--- 时限用完与请求超时 ---")
+    import get_excel_data_curr.t3 as t3_module
+
+    session = FakeSession(total=25)
+    restore = patch_session(session)
+
+    def expired_deal():
+        time.sleep(0.02)
+        return t3_module.deal('sid', 'bid-4', '4', REQUEST_DATA, page_size=10)
+
+    try:
+        with_deadline(0.01, expired_deal)
+        record('3.1 时限用完时抛出 DeadlineExceededError', False, '未抛出异常')
+    except t3_module.DeadlineExceededError as e:
+        record('3.1 时限用完时抛出 DeadlineExceededError',
+               isinstance(e, t3_module.DataFetchError) and '查询超过处理时限' in str(e) and '楼栋4' in str(e), str(e))
+    finally:
+        restore()
+    record('3.2 时限用完后不再发起请求', session.timeouts == [], str(session.timeouts))
+
+    restore = patch_session(FakeSession(error=requests.ReadTimeout('read timed out')))
+    try:
+        t3_module.deal('sid', 'bid-4', '4', REQUEST_DATA, page_size=10)
+        record('3.3 请求超时转为 DataFetchError', False, '未抛出异常')
+    except t3_module.DataFetchError as e:
+        record('3.3 请求超时转为 DataFetchError',
+               not isinstance(e, t3_module.DeadlineExceededError) and str(e).startswith('楼栋4请求超时'), str(e))
+    finally:
+        restore()
+
+    class FlakySession(FakeSession):
+        def get(self, url, params=None, timeout=None, **kwargs):
+            if params['buildingId'] == 'bid-2':
+                raise requests.ConnectionError('connection reset by peer')
+            return super().get(url, params=params, timeout=timeout, **kwargs)
+
+    import get_excel_data_curr.main as main_module
+    restore = patch_session(FlakySession(total=5))
+    try:
+        ret_dict, fetch_errors = main_module._fetch_buildings(
+            'sid', {'1': 'bid-1', '2': 'bid-2'}, REQUEST_DATA, {'page_size': 10}, 2)
+        record('3.4 连接失败计入该楼栋的取数失败，其余楼栋照常返回',
+               list(ret_dict) == ['1'] and len(fetch_errors) == 1 and fetch_errors[0].startswith('楼栋2: 楼栋2请求失败'),
+               f"{list(ret_dict)} {fetch_errors}")
+    finally:
+        restore()
+
+
+def test_admission_wait_bounded():
+    print("\n--- 排队等待受时限约束 ---")
+    import get_excel_data_curr.t3 as t3_module
+    from get_excel_data_curr import admission
+
+    admission.upstream_slots.configure(1, 4, 5)
+    release = threading.Event()
+
+    def hold():
+        with admission.upstream_slots.slot():
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    deadline_at = time.time() + 2
+    while time.time() < deadline_at and admission.upstream_slots.stats()['in_use'] < 1:
+        time.sleep(0.01)
+    restore = patch_session(FakeSession())
+    start = time.time()
+    try:
+        with_deadline(0.2, lambda: t3_module.fetch_total('sid', 'bid-4', '4', REQUEST_DATA))
+        record('4.1 排队直到时限用完时按超时结束', False, '未抛出异常')
+    except t3_module.DeadlineExceededError as e:
+        record('4.1 排队直到时限用完时按超时结束', 0.15 <= time.time() - start < 1, f"{time.time() - start:.2f}s {e}")
+    except admission.AdmissionBusy as e:
+        record('4.1 排队直到时限用完时按超时结束', False, f"抛出了 AdmissionBusy: {e}")
+    finally:
+        restore()
+        release.set()
+        holder.join()
+        admission.configure()
+    record('4.2 超时的请求不占用槽位', admission.upstream_slots.stats()['in_use'] == 0,
+           str(admission.upstream_slots.stats()))
+
+
+def test_login_and_excel_stop():
+    print("\n--- 登录和生成报表检查时限 ---")
+    import get_excel_data_curr.main as main_module
+    import get_excel_data_curr.t3 as t3_module
+    import get_excel_data_curr.gen_excel_data_v1 as gen_module
+
+    from selenium.common.exceptions import TimeoutException
+
+    class FakeDriver:
+        def set_page_load_timeout(self, seconds):
+            raise AssertionError('时限用完后不应再打开登录页')
+
+        def get(self, url):
+            raise AssertionError('时限用完后不应再打开登录页')
+
+    class HangingDriver:
+        """登录页一直加载不完，记录每次设置的页面加载超时"""
+
+        def __init__(self):
+            self.page_load_timeouts = []
+
+        def set_page_load_timeout(self, seconds):
+            self.page_load_timeouts.append(seconds)
+
+        def get(self, url):
+            raise TimeoutException('页面加载超时')
+
+    def expired_login():
+        time.sleep(0.02)
+        return main_module._login_with_retry(FakeDriver(), 'http://login', 'user', 'pass')
+
+    try:
+        with_deadline(0.01, expired_login)
+        record('5.1 时限用完时不再尝试登录', False, '未抛出异常')
+    except t3_module.DeadlineExceededError as e:
+        record('5.1 时限用完时不再尝试登录', '登录已中止' in str(e), str(e))
+
+    hanging = HangingDriver()
+    start = time.time()
+    try:
+        with_deadline(0.3, lambda: main_module._login_with_retry(hanging, 'http://login', 'user', 'pass'))
+        record('5.1.1 登录页加载超时受时限约束', False, '未抛出异常')
+    except t3_module.DeadlineExceededError:
+        record('5.1.1 登录页加载超时受时限约束', bool(hanging.page_load_timeouts) and
+               all(t <= 0.3 for t in hanging.page_load_timeouts) and time.time() - start < 2,
+               str(hanging.page_load_timeouts))
+
+    tmp_dir = tempfile.mkdtemp()
+    report_rows = [{'userId': str(n), 'userName': f'学生{n}', 'passTimeText': '2026-04-25 23:30:00',
+                    'roomName': '101', 'schoolInstituteName': '计算机科学与信息工程学院', 'grade': '2023',
+                    'studentType': '本科生'} for n in range(5)]
+
+    def expired_excel():
+        time.sleep(0.02)
+        return gen_module.gen_excel_data_v1({'4': report_rows}, 'test', data_cfg={}, request_data=REQUEST_DATA,
+                                            output_dir=tmp_dir)
+
+    try:
+        with_deadline(0.01, expired_excel)
+        record('5.2 时限用完时停止生成报表', False, '未抛出异常')
+    except t3_module.DeadlineExceededError as e:
+        record('5.2 时限用完时停止生成报表', '生成报表已中止' in str(e) and os.listdir(tmp_dir) == [], str(e))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def test_process_deadline():
+    print("\n--- process() 处理时限 ---")
+    import get_excel_data_curr.main as main_module
+    from get_excel_data_curr import deadline
+
+    class FakeConfigTool:
+        def get_query_deadline_seconds(self):
+            return 0.1
+
+        def get_bid_dict(self):
+            return {'1': 'bid-1', '2': 'bid-2'}
+
+        def get_pagesize(self):
+            return 30
+
+        def get_page_fetch_workers(self):
+            return 1
+
+        def get_probe_page_size(self):
+            return 100
+
+        def get_data_cfg(self):
+            return {}
+
+        def get_record_store_enabled(self):
+            return False
+
+        def get_building_fetch_workers(self):
+            return 2
+
+        def get_night_fetch_workers(self):
+            return 1
+
+        def get_group_fetch_ratio(self):
+            return 2
+
+    def slow_acquire(config_tool):
+        time.sleep(0.15)
+        return True, '登录成功', 'fake-sid'
+
+    session = FakeSession()
+    restore = patch_session(session)
+    original_config, original_acquire = main_module._get_config_tool, main_module._acquire_sid
+    main_module._get_config_tool = lambda: FakeConfigTool()
+    main_module._acquire_sid = slow_acquire
+    try:
+        result = main_module.process(dict(REQUEST_DATA, buildings=['1', '2'], username='admin'))
+        record('6.1 时限用完时返回失败和超时说明', result['status'] == 'false' and
+               result['msg'].startswith('所有楼栋取数失败') and result['msg'].count('查询超过处理时限') == 2,
+               str(result))
+        record('6.2 不再向公寓系统发请求', session.timeouts == [], str(session.timeouts))
+        record('6.3 处理结束后解除时限绑定', deadline.current() is None)
+    finally:
+        restore()
+        main_module._get_config_tool, main_module._acquire_sid = original_config, original_acquire
+
+
+def main():
+    print("=" * 60)
+    print("测试查询处理时限")
+    print("=" * 60)
+    test_timeout_values()
+    test_fetch_uses_deadline()
+    test_retries_within_deadline()
+    test_expired_and_timeout_errors()
+    test_admission_wait_bounded()
+    test_login_and_excel_stop()
+    test_process_deadline()
+    print("\n" + "=" * 60)
+    print(f"测试结果汇总: {PASS} 通过, {FAIL} 失败, 共 {PASS + FAIL} 项")
+    print("=" * 60)
+    return 0 if FAIL == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
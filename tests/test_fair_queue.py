@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+验证报表任务按用户公平调度：用户间轮转派发、按成本分配额度、排队统计、任务异常不影响工作线程。
+不访问公寓系统。
+"""
+import os
+import sys
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+PASS = 0
+FAIL = 0
+
+
+def record(test_name, passed, detail=''):
+    global PASS, FAIL
+    if passed:
+        PASS += 1
+        print(f"  ✅ PASS {test_name}")
+    else:
+        FAIL += 1
+        print(f"  ❌ FAIL {test_name} - {detail}")
+
+
+def run_order(submissions, quantum=10):
+    """
+    单工作线程先被占住，按顺序提交全部任务后放行，返回实际执行顺序
+    :param submissions: [(用户, 任务名, 成本)]
+    """
+    from scheduler.fair_queue import FairScheduler
+
+    scheduler = FairScheduler(workers=1, quantum=quantum)
+    gate = threading.Event()
+    started = threading.Event()
+    order = []
+    done = threading.Event()
+
+    def blocker():
+        started.set()
+        gate.wait(5)
+
+    scheduler.submit('gate', blocker)
+    started.wait(5)
+    for user, name, cost in submissions:
+        scheduler.submit(user, lambda name=name: order.append(name), cost=cost)
+    scheduler.submit('zz-last', done.set, cost=1000)
+    gate.set()
+    done.wait(5)
+    return order
+
+
+def test_round_robin_between_users():
+    print("\n--- 用户间轮转 ---")
+    order = run_order([('A', 'A1', 1), ('A', 'A2', 1), ('A', 'A3', 1), ('B', 'B1', 1), ('B', 'B2', 1)])
+    record('1.1 成本相同时用户交替执行', order == ['A1', 'B1', 'A2', 'B2', 'A3'], str(order))
+
+
+def test_small_jobs_not_starved():
+    print("\n--- 小任务不被大任务阻塞 ---")
+    order = run_order([('admin', f'big{i}', 10) for i in range(1, 5)] + [('teacher', f'small{i}', 1) for i in range(1, 4)])
+    record('2.1 后提交的小任务在大任务之间得到执行',
+           order == ['big1', 'small1', 'small2', 'small3', 'big2', 'big3', 'big4'], str(order))
+
+    order = run_order([('admin', 'big1', 30), ('admin', 'big2', 30), ('teacher', 'small1', 1), ('teacher', 'small2', 1)])
+    record('2.2 额度不足的大任务累积多轮后执行', order == ['small1', 'small2', 'big1', 'big2'], str(order))
+
+
+def test_stats_and_errors():
+    print("\n--- 排队统计与异常隔离 ---")
+    from scheduler.fair_queue import FairScheduler
+
+    scheduler = FairScheduler(workers=1)
+    gate = threading.Event()
+    started = threading.Event()
+
+    def blocker():
+        started.set()
+        gate.wait(5)
+
+    def broken():
+        raise RuntimeError('boom')
+
+    scheduler.submit('admin', blocker)
+    started.wait(5)
+    scheduler.submit('admin', broken, cost=20)
+    position = scheduler.submit('teacher', lambda: None, cost=2)
+    time.sleep(0.1)
+    stats = scheduler.stats()
+    users = {u['user']: u for u in stats['users']}
+    record('3.1 返回用户排队位置', position == 1, str(position))
+    record('3.2 按用户统计排队数和排队成本',
+           users['admin']['queued'] == 1 and users['admin']['queued_cost'] == 20 and users['admin']['running'] == 1 and
+           users['teacher']['queued'] == 1 and users['teacher']['queued_cost'] == 2, str(stats))
+    record('3.3 统计最早排队任务已等待时长', users['teacher']['oldest_wait_seconds'] >= 0.1, str(users['teacher']))
+    record('3.4 汇总排队和执行中任务数', stats['queued'] == 2 and stats['running'] == 1, str(stats))
+
+    gate.set()
+    deadline = time.time() + 5
+    while time.time() < deadline and scheduler.stats()['queued'] + scheduler.stats()['running']:
+        time.sleep(0.02)
+    stats = scheduler.stats()
+    users = {u['user']: u for u in stats['users']}
+    record('3.5 任务异常不影响后续任务', stats['queued'] == 0 and stats['running'] == 0 and
+           users['teacher']['avg_wait_seconds'] is not None, str(stats))
+
+
+def test_call_waits_for_result():
+    print("\n--- 同步提交等待结果 ---")
+    from scheduler.fair_queue import FairScheduler
+
+    scheduler = FairScheduler(workers=1)
+    record('4.1 返回任务结果', scheduler.call('admin', lambda: {'status': 'success'}) == {'status': 'success'})
+
+    def broken():
+        raise ValueError('bad request')
+
+    try:
+        scheduler.call('admin', broken)
+        record('4.2 任务异常原样抛出', False, '未抛出异常')
+    except ValueError as e:
+        record('4.2 任务异常原样抛出', str(e) == 'bad request', str(e))
+
+
+def test_estimate_cost():
+    print("\n--- 任务成本估算 ---")
+    from scheduler.query_jobs import estimate_cost
+
+    night = {'buildings': ['4', '5', '6'], 'startTime': '23:20:00', 'endTime': '05:30:00'}
+    record('5.1 默认查询按楼栋数计', estimate_cost(night) == 3, str(estimate_cost(night)))
+    month = dict(night, startDate='2026-04-01', endDate='2026-05-01')
+    record('5.2 多天查询乘以夜数', estimate_cost(month) == 90, str(estimate_cost(month)))
+    record('5.3 最小成本为 1', estimate_cost({'buildings': []}) == 1)
+
+
+def main():
+    print("=" * 60)
+    print("测试报表任务公平调度")
+    print("=" * 60)
+    test_round_robin_between_users()
+    test_small_jobs_not_starved()
+    test_stats_and_errors()
+    test_call_waits_for_result()
+    test_estimate_cost()
+    print("\n" + "=" * 60)
+    print(f"测试结果汇总: {PASS} 通过, {FAIL} 失败, 共 {PASS + FAIL} 项")
+    print("=" * 60)
+    return 0 if FAIL == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+验证报表生成：表头、列取值、样式、行高和列宽。
+使用临时目录，不影响 result-files。
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+PASS = 0
+FAIL = 0
+
+
+def record(test_name, passed, detail=''):
+    global PASS, FAIL
+    if passed:
+        PASS += 1
+        print(f"  ✅ PASS {test_name}")
+    else:
+        FAIL += 1
+        print(f"  ❌ FAIL {test_name} - {detail}")
+
+
+REQUEST = {'startDate': '2026-04-01', 'endDate': '2026-04-02', 'startTime': '23:20:00', 'endTime': '05:30:00'}
+
+
+def make_row(user_id, pass_time, institute='计算机科学与信息工程学院', student_type='本科生'):
+    return {'userId': user_id, 'userName': f'学生{user_id}', 'passTimeText': pass_time, 'roomName': '101',
+            'schoolInstituteName': institute, 'grade': '2023', 'studentType': student_type}
+
+
+def generate(ret_dict, data_cfg=None, write_only_threshold=0):
+    """生成报表并用 openpyxl 读回第一个 sheet"""
+    from openpyxl import load_workbook
+    from get_excel_data_curr.gen_excel_data_v1 import gen_excel_data_v1
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        file_path = gen_excel_data_v1(ret_dict, 'test', data_cfg=data_cfg or {}, request_data=REQUEST,
+                                      output_dir=tmp_dir, write_only_threshold=write_only_threshold)
+        return load_workbook(file_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def test_report_content():
+    print("\n--- 报表内容 ---")
+    ret_dict = {
+        '4': [make_row('001', '2026-04-01 23:40:00'), make_row('001', '2026-04-02 01:10:00'),
+              make_row('002', '2026-04-02 00:05:00', institute='经济与管理学院', student_type='研究生')],
+        '11': [make_row('003', '2026-04-01 23:30:00')],
+    }
+    sheet = generate(ret_dict, data_cfg={'经济与管理学院': '经管'}).active
+    rows = [[cell.value for cell in row] for row in sheet.iter_rows()]
+    record('1.1 sheet 名称按楼栋显示名拼接', sheet.title == '4-11A', sheet.title)
+    record('1.2 表头', rows[0] == ['日期', '学院', '学号', '姓名', '宿舍号', '年级', '培养层次', '晚归时间'], str(rows[0]))
+    record('1.3 同一学生只保留最新一条', [r[2] for r in rows[1:]].count('001') == 1, str(rows))
+    record('1.4 按学院、时间排序并转换各列', rows[1:] == [
+        ['4.2', '经管', '002', '学生002', '4-101', '2023', '研究生', ' 00:05'],
+        ['4.1', '计算学院', '003', '学生003', '11A-101', '2023', '本科', ' 23:30'],
+        ['4.2', '计算学院', '001', '学生001', '4-101', '2023', '本科', ' 01:10'],
+    ], str(rows[1:]))
+
+
+def test_report_style():
+    print("\n--- 样式、行高和列宽 ---")
+    ret_dict = {'4': [make_row(f'{i:03d}', '2026-04-01 23:40:00') for i in range(50)]}
+    sheet = generate(ret_dict).active
+    cells = [cell for row in sheet.iter_rows() for cell in row]
+    record('2.1 所有单元格居中', all(c.alignment.horizontal == 'center' and c.alignment.vertical == 'center'
+                                   for c in cells))
+    record('2.2 所有单元格细边框', all(c.border.left.style == 'thin' and c.border.bottom.style == 'thin' for c in cells))
+    record('2.3 所有行高 24', all(sheet.row_dimensions[r].height == 24 for r in range(1, sheet.max_row + 1)))
+    record('2.4 列宽按最长内容计算', sheet.column_dimensions['E'].width == (len('4-101') + 2) * 2 and
+           sheet.column_dimensions['B'].width == (len('计算学院') + 2) * 2,
+           f"E={sheet.column_dimensions['E'].width}, B={sheet.column_dimensions['B'].width}")
+
+
+def test_write_only_mode():
+    print("\n--- 流式只写模式 ---")
+    import copy
+
+    ret_dict = {
+        '4': [make_row(f'{i:03d}', f'2026-04-01 23:{i:02d}:00') for i in range(40)],
+        '11': [make_row(f'1{i:02d}', '2026-04-02 01:10:00', institute='经济与管理学院') for i in range(20)],
+    }
+    normal = generate(copy.deepcopy(ret_dict)).active
+    streamed = generate(copy.deepcopy(ret_dict), write_only_threshold=10).active
+
+    def values(sheet):
+        return [[cell.value for cell in row] for row in sheet.iter_rows()]
+
+    record('3.1 内容与普通模式一致', values(normal) == values(streamed))
+    record('3.2 sheet 名称一致', normal.title == streamed.title, f"{normal.title} / {streamed.title}")
+    record('3.3 列宽一致', all(normal.column_dimensions[c].width == streamed.column_dimensions[c].width
+                            for c in 'ABCDEFGH'))
+    cells = [cell for row in streamed.iter_rows() for cell in row]
+    record('3.4 样式一致', all(c.alignment.horizontal == 'center' and c.border.left.style == 'thin' for c in cells))
+    record('3.5 默认行高 24', streamed.sheet_format.defaultRowHeight == 24 and streamed.sheet_format.customHeight)
+
+
+def test_generator_input():
+    print("\n--- 楼栋记录为生成器 ---")
+    import copy
+
+    rows = [make_row('001', '2026-04-01 23:40:00'), make_row('002', '2026-04-02 00:05:00')]
+    from_list = generate({'4': copy.deepcopy(rows)}).active
+    from_generator = generate({'4': (row for row in copy.deepcopy(rows))}).active
+    record('4.1 生成器输入与列表输入结果一致',
+           [[c.value for c in r] for r in from_list.iter_rows()] ==
+           [[c.value for c in r] for r in from_generator.iter_rows()])
+
+
+def test_latest_record_dedup():
+    print("\n--- 按学生保留最新记录 ---")
+    from get_excel_data_curr.gen_excel_data_v1 import process_data
+
+    rows = [
+        {'userId': '001', 'passTimeText': '2026-04-01 23:40:00', 'tag': 'a'},
+        {'userId': '002', 'passTimeText': '2026-04-02 00:10:00', 'tag': 'b'},
+        {'userId': '001', 'passTimeText': '2026-04-02 01:10:00', 'tag': 'c'},
+        {'userId': '002', 'passTimeText': '2026-04-02 00:10:00', 'tag': 'd'},
+        {'userId': '001', 'passTimeText': '2026-04-01 23:50:00', 'tag': 'e'},
+    ]
+    result = process_data({'4': rows, '5': iter(rows[:1])})
+    record('5.1 每个学生只保留时间最大的一条', [r['tag'] for r in result['4']] == ['c', 'b'], str(result['4']))
+    record('5.2 时间相同保留先到达的记录', result['4'][1]['tag'] == 'b')
+    record('5.3 支持生成器输入', [r['tag'] for r in result['5']] == ['a'], str(result['5']))
+
+
+def test_row_transform():
+    print("\n--- 行转换 ---")
+    from get_excel_data_curr.gen_excel_data_v1 import RowTransform, build_building_show
+
+    record('6.1 楼栋显示名表', build_building_show(['4', '11', '20']) == {'4': '4', '11': '11A', '20': '17B'})
+    transform = RowTransform({'经济与管理学院': '经管'})
+    values = transform(make_row('001', '2026-04-09 23:05:00', institute='经济与管理学院'), '11A')
+    record('6.2 日期切片为 M.D、时间切片为 HH:MM', values[0] == '4.9' and values[7] == ' 23:05', str(values))
+    record('6.3 宿舍号带楼栋显示名', values[4] == '11A-101', values[4])
+    transform(make_row('002', '2026-04-09 23:10:00', institute='计算机科学与信息工程学院'), '4')
+    record('6.4 学院简称按全称缓存', transform._institutes == {'经济与管理学院': '经管', '计算机科学与信息工程学院': '计算学院'},
+           str(transform._institutes))
+    record('6.5 缺少时间时日期和时间为空', transform({'userId': '003'}, '4')[0] == '' and
+           transform({'userId': '003'}, '4')[7] == '')
+
+
+def test_per_night_sheets():
+    print("\n--- 多晚报表每晚一个 sheet ---")
+    from openpyxl import load_workbook
+    from get_excel_data_curr.gen_excel_data_v1 import gen_excel_nights
+
+    nights = [
+        ('4.1-4.2', {'4': [make_row('001', '2026-04-01 23:40:00'), make_row('001', '2026-04-02 01:10:00')]}),
+        ('4.2-4.3', {'4': [make_row('001', '2026-04-02 23:50:00')], '5': [make_row('002', '2026-04-03 00:20:00')]}),
+    ]
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for threshold in (0, 1):
+            workbook = load_workbook(gen_excel_nights(nights, 'test', data_cfg={}, output_dir=tmp_dir,
+                                                      write_only_threshold=threshold))
+            label = '写入模式' if threshold == 0 else '只写模式'
+            record(f'7.1 {label} 每晚一个 sheet 并按夜间命名', workbook.sheetnames == ['4.1-4.2', '4.2-4.3'],
+                   str(workbook.sheetnames))
+            first, second = ([[c.value for c in r] for r in workbook[name].iter_rows(min_row=2)]
+                             for name in workbook.sheetnames)
+            record(f'7.2 {label} 同一学生在每晚内去重', [r[2] for r in first] == ['001'] and first[0][7] == ' 01:10',
+                   str(first))
+            record(f'7.3 {label} 不同夜间不跨晚去重', sorted(r[2] for r in second) == ['001', '002'], str(second))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    print("=" * 60)
+    print("测试报表生成")
+    print("=" * 60)
+    test_report_content()
+    test_report_style()
+    test_write_only_mode()
+    test_generator_input()
+    test_latest_record_dedup()
+    test_row_transform()
+    test_per_night_sheets()
+    print("\n" + "=" * 60)
+    print(f"测试结果汇总: {PASS} 通过, {FAIL} 失败, 共 {PASS + FAIL} 项")
+    print("=" * 60)
+    return 0 if FAIL == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+验证预取上一晚数据：触发时刻计算、预取结果记录、预热覆盖状态、调度器注册预取任务。
+使用临时数据库，不访问公寓系统。
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+PASS = 0
+FAIL = 0
+
+
+def record(test_name, passed, detail=''):
+    global PASS, FAIL
+    if passed:
+        PASS += 1
+        print(f"  ✅ PASS {test_name}")
+    else:
+        FAIL += 1
+        print(f"  ❌ FAIL {test_name} - {detail}")
+
+
+def make_db(tmp_dir):
+    from database.db import Database
+    db = Database(db_path=os.path.join(tmp_dir, 'test.db'))
+    db.set_config('bid_dict', json.dumps({'4': 'bid-4', '5': 'bid-5'}))
+    db.set_config('begin_time', '23:20:00')
+    db.set_config('end_time', '05:30:00')
+    return db
+
+
+def test_prefetch_cron():
+    print("\n--- 预取触发时刻 ---")
+    from scheduler.prefetch import prefetch_cron
+
+    record('1.1 end_time 后延迟 15 分钟', prefetch_cron('05:30:00', 15) == (5, 45), str(prefetch_cron('05:30:00', 15)))
+    record('1.2 跨小时进位', prefetch_cron('05:50:00', 20) == (6, 10), str(prefetch_cron('05:50:00', 20)))
+
+
+def test_run_records_last_result():
+    print("\n--- 预取结果记录 ---")
+    import scheduler.prefetch as prefetch_module
+
+    tmp_dir = tempfile.mkdtemp()
+    original = prefetch_module.fetch_main.prefetch
+    try:
+        job = prefetch_module.PrefetchJob(make_db(tmp_dir))
+        prefetch_module.fetch_main.prefetch = lambda: {'status': 'success', 'msg': '', 'buildings': ['4'], 'failed': ['5']}
+        job.run()
+        record('2.1 记录最近一次预取结果', job.last_run['status'] == 'success' and job.last_run['failed'] == ['5'],
+               str(job.last_run))
+        record('2.2 记录开始时间和耗时', 'started_at' in job.last_run and 'elapsed' in job.last_run, str(job.last_run))
+
+        def boom():
+            raise RuntimeError('网络异常')
+        prefetch_module.fetch_main.prefetch = boom
+        job.run()
+        record('2.3 预取异常不抛出，记录为失败', job.last_run['status'] == 'false' and '网络异常' in job.last_run['msg'],
+               str(job.last_run))
+        record('2.4 执行结束后释放运行标记', job._running is False)
+    finally:
+        prefetch_module.fetch_main.prefetch = original
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def test_status_coverage():
+    print("\n--- 预热覆盖状态 ---")
+    from scheduler.prefetch import PrefetchJob
+    from get_excel_data_curr.record_store import RecordStore
+    import get_excel_data_curr.t3 as t3_module
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db = make_db(tmp_dir)
+        begin_time, end_time = t3_module.query_window({'startTime': '23:20:00', 'endTime': '05:30:00'})
+        store = RecordStore(db, sync_lag_minutes=10)
+        row = {'userId': '001', 'passTimeText': begin_time[:11] + '23:40:00', 'userName': '学生001'}
+        store.save('4', [row], begin_time, end_time, synced_at=datetime.now() + timedelta(days=1))
+
+        status = PrefetchJob(db).status()
+        by_building = {b['building']: b for b in status['buildings']}
+        record('3.1 默认查询窗口', status['window'] == [begin_time, end_time], str(status['window']))
+        record('3.2 已预取楼栋标记为已覆盖', by_building['4']['covered'] and by_building['4']['record_count'] == 1,
+               str(by_building['4']))
+        record('3.3 未预取楼栋列出缺失时间段',
+               not by_building['5']['covered'] and by_building['5']['missing'] == [[begin_time, end_time]],
+               str(by_building['5']))
+        record('3.4 覆盖统计', status['covered_count'] == 1 and status['total'] == 2, str(status))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def test_scheduler_registers_prefetch():
+    print("\n--- 调度器注册预取任务 ---")
+    from scheduler.scheduler import SchedulerManager
+
+    tmp_dir = tempfile.mkdtemp()
+    sm = None
+    try:
+        db = make_db(tmp_dir)
+        db.set_config('scheduler_enabled', 'true')
+        db.set_config('prefetch_delay_minutes', '20')
+        sm = SchedulerManager(db)
+        sm.start()
+        jobs = {job['id']: job for job in sm.get_jobs()}
+        record('4.1 没有邮件任务时仍注册预取任务', 'prefetch_last_night' in jobs, str(jobs))
+        next_run = jobs.get('prefetch_last_night', {}).get('next_run_time') or ''
+        record('4.2 触发时刻为 end_time + 延迟', '05:50:00' in next_run, next_run)
+        sm.stop()
+
+        db.set_config('prefetch_enabled', 'false')
+        sm.start()
+        record('4.3 关闭预取且无邮件任务时不启动', sm.get_jobs() == [] or not sm.scheduler.running)
+    finally:
+        if sm:
+            sm.stop()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    print("=" * 60)
+    print("测试预取上一晚数据")
+    print("=" * 60)
+    test_prefetch_cron()
+    test_run_records_last_result()
+    test_status_coverage()
+    test_scheduler_registers_prefetch()
+    print("\n" + "=" * 60)
+    print(f"测试结果汇总: {PASS} 通过, {FAIL} 失败, 共 {PASS + FAIL} 项")
+    print("=" * 60)
+    return 0 if FAIL == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
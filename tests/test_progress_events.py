@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+验证查询进度事件：事件总线的订阅/回放/结束、线程池子任务继承频道、
+登录/分页取数/写入报表各阶段发布事件，以及 SSE 输出格式。
+不访问公寓系统。
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+PASS = 0
+FAIL = 0
+
+REQUEST_DATA = {'startDate': '2026-04-25', 'endDate': '2026-04-26', 'startTime': '23:20:00', 'endTime': '05:30:00'}
+
+
+def record(test_name, passed, detail=''):
+    global PASS, FAIL
+    if passed:
+        PASS += 1
+        print(f"  ✅ PASS {test_name}")
+    else:
+        FAIL += 1
+        print(f"  ❌ FAIL {test_name} - {detail}")
+
+
+def collect(channel, func):
+    """在绑定 channel 的上下文中执行 func，返回 (func 返回值, 该频道的事件列表)"""
+    from get_excel_data_curr import progress
+
+    token = progress.bind(channel)
+    try:
+        result = func()
+    finally:
+        progress.unbind(token)
+    progress.progress_bus.close(channel, {'message': '完成'})
+    events = []
+    subscriber = progress.progress_bus.subscribe(channel)
+    while not subscriber.empty():
+        events.append(subscriber.get())
+    return result, events[:-1]
+
+
+def test_bus_subscribe_and_replay():
+    print("\n--- 事件总线订阅与回放 ---")
+    from get_excel_data_curr.progress import ProgressBus, END_STAGE
+
+    bus = ProgressBus(history=2, closed_channels=1)
+    bus.publish('job-1', {'stage': 'page', 'message': 'p1'})
+    live = bus.subscribe('job-1')
+    bus.publish('job-1', {'stage': 'page', 'message': 'p2'})
+    bus.publish('job-1', {'stage': 'page', 'message': 'p3'})
+    record('1.1 订阅前的事件先回放', live.get_nowait()['message'] == 'p1')
+    record('1.2 订阅后实时收到新事件', [live.get_nowait()['message'] for _ in range(2)] == ['p2', 'p3'])
+
+    late = bus.subscribe('job-1')
+    record('1.3 回放只保留最近 history 条', [late.get_nowait()['message'] for _ in range(2)] == ['p2', 'p3'] and
+           late.empty())
+
+    bus.close('job-1', {'message': '完成', 'state': 'success'})
+    end = live.get_nowait()
+    record('1.4 结束事件推送给订阅者', end['stage'] == END_STAGE and end['state'] == 'success', str(end))
+    after = bus.subscribe('job-1')
+    record('1.5 结束后订阅回放到结束事件', [e['stage'] for e in list(after.queue)] == ['page', END_STAGE])
+    record('1.6 结束的频道不再保留订阅者', bus.stats()['subscribers'] == 0, str(bus.stats()))
+
+    bus.close('job-2', {'message': '完成'})
+    record('1.7 只保留最近 closed_channels 个已结束频道', bus.stats()['closed_channels'] == 1, str(bus.stats()))
+
+    unknown = bus.subscribe('no-such-job')
+    bus.unsubscribe('no-such-job', unknown)
+    record('1.8 未发布过事件的频道在订阅者离开后删除', bus.stats()['open_channels'] == 0, str(bus.stats()))
+
+    idle_bus = ProgressBus(idle_seconds=0.01)
+    idle_bus.publish('crashed-job', {'stage': 'page', 'message': 'p1'})
+    watched = idle_bus.subscribe('watched-job')
+    time.sleep(0.02)
+    idle_bus.publish('job-3', {'stage': 'page', 'message': 'p1'})
+    record('1.9 长时间无事件且无订阅者的频道被清理', idle_bus.stats()['open_channels'] == 2 and
+           idle_bus.stats()['subscribers'] == 1, str(idle_bus.stats()))
+    idle_bus.unsubscribe('watched-job', watched)
+
+
+def test_emit_context():
+    print("\n--- 发布上下文 ---")
+    from get_excel_data_curr import progress
+
+    before = progress.progress_bus.stats()
+    progress.emit('page', '未绑定频道')
+    record('2.1 未绑定频道时不发布', progress.progress_bus.stats() == before)
+
+    def work():
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [progress.submit(executor, progress.emit, 'page', f'子任务{i}') for i in range(3)]
+            for future in futures:
+                future.result()
+        plain = threading.Thread(target=progress.emit, args=('page', '未继承的线程'))
+        plain.start()
+        plain.join()
+
+    _, events = collect('ctx-job', work)
+    record('2.2 线程池子任务继承调用方频道', sorted(e['message'] for e in events) == ['子任务0', '子任务1', '子任务2'],
+           str(events))
+
+
+def test_fetch_and_excel_events():
+    print("\n--- 分页取数与写入报表事件 ---")
+    import get_excel_data_curr.t3 as t3_module
+    import get_excel_data_curr.gen_excel_data_v1 as gen_module
+
+    class FakeResponse:
+        status_code = 200
+        url = t3_module.API_URL
+        history = []
+
+        def __init__(self, payload):
+            self.payload = payload
+            self.text = json.dumps(payload)
+
+        def json(self):
+            return self.payload
+
+    class FakeSession:
+        def get(self, url, params=None, **kwargs):
+            rows = [{'userId': str(n), 'passTimeText': '2026-04-25 23:30:00'}
+                    for n in range(params['offset'], min(params['offset'] + params['limit'], 25))]
+            return FakeResponse({'total': 25, 'rows': rows})
+
+    original = t3_module.http_client.get_session
+    t3_module.http_client.get_session = lambda retry=True: FakeSession()
+    try:
+        rows, events = collect('fetch-job', lambda: t3_module.deal('sid', 'bid-4', '4', REQUEST_DATA, page_size=10,
+                                                                   max_workers=2))
+    finally:
+        t3_module.http_client.get_session = original
+    pages = sorted(e['page'] for e in events if e['stage'] == 'page')
+    record('3.1 每页发布一次分页事件', pages == [1, 2, 3] and
+           all(e['pages'] == 3 and e['building'] == '4' for e in events if e['stage'] == 'page'), str(events))
+    building = [e for e in events if e['stage'] == 'building']
+    record('3.2 楼栋取完发布记录数', len(building) == 1 and building[0]['records'] == 25 and events[-1] is building[0],
+           str(building))
+
+    tmp_dir = tempfile.mkdtemp()
+    original_every = gen_module.PROGRESS_EVERY_ROWS
+    gen_module.PROGRESS_EVERY_ROWS = 2
+    try:
+        report_rows = [{'userId': str(n), 'userName': f'学生{n}', 'passTimeText': '2026-04-25 23:30:00',
+                        'roomName': '101', 'schoolInstituteName': '计算机科学与信息工程学院', 'grade': '2023',
+                        'studentType': '本科生'} for n in range(5)]
+        for threshold, label in ((0, '写入模式'), (1, '只写模式')):
+            _, events = collect(f'excel-job-{threshold}', lambda: gen_module.gen_excel_data_v1(
+                {'4': report_rows}, 'test', data_cfg={}, request_data=REQUEST_DATA, output_dir=tmp_dir,
+                write_only_threshold=threshold))
+            record(f'3.3 {label} 按行数发布写入进度', [(e['rows'], e['total']) for e in events] ==
+                   [(2, 5), (4, 5), (5, 5)], str(events))
+    finally:
+        gen_module.PROGRESS_EVERY_ROWS = original_every
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def test_login_events():
+    print("\n--- 登录事件 ---")
+    import get_excel_data_curr.main as main_module
+
+    class FakeElement:
+        def send_keys(self, value):
+            pass
+
+        def click(self):
+            pass
+
+    class FakeDriver:
+        title = '公寓出入安全分析系统'
+
+        def set_page_load_timeout(self, seconds):
+            pass
+
+        def get(self, url):
+            pass
+
+        def find_element(self, by, value):
+            return FakeElement()
+
+        def get_cookies(self):
+            return [{'name': 'sid', 'value': 'fake-sid'}]
+
+    result, events = collect('login-job', lambda: main_module._login_with_retry(
+        FakeDriver(), 'http://login', 'user', 'pass'))
+    record('4.1 登录成功', result[0] is True, str(result))
+    record('4.2 发布尝试和成功事件', [e['message'] for e in events] == ['登录公寓系统（第 1/3 次尝试）', '登录成功'] and
+           all(e['stage'] == 'login' for e in events), str(events))
+
+
+def test_sse_stream():
+    print("\n--- SSE 输出 ---")
+    from get_excel_data_curr import progress
+
+    stream = progress.sse_stream('sse-job', keepalive_seconds=0.05)
+    progress.progress_bus.publish('sse-job', {'stage': 'page', 'message': '楼栋4 第 1/1 页'})
+    first = next(stream)
+    record('5.1 事件按 data: JSON 格式输出', first.startswith('data: ') and first.endswith('\n\n') and
+           json.loads(first[6:])['message'] == '楼栋4 第 1/1 页', first)
+    record('5.2 空闲时发送保活注释', next(stream) == ': keep-alive\n\n')
+    progress.progress_bus.close('sse-job', {'message': '完成', 'state': 'success'})
+    rest = list(stream)
+    record('5.3 收到结束事件后停止', len(rest) == 1 and json.loads(rest[0][6:])['stage'] == 'end', str(rest))
+    record('5.4 停止后取消订阅', progress.progress_bus.stats()['subscribers'] == 0, str(progress.progress_bus.stats()))
+
+
+def test_job_publishes_end():
+    print("\n--- 后台任务发布阶段和结束事件 ---")
+    from database.db import Database
+    from get_excel_data_curr import progress
+    import scheduler.query_jobs as jobs_module
+
+    tmp_dir = tempfile.mkdtemp()
+    original = jobs_module.fetch_main.process
+
+    def fake_process(data, on_progress=None, output_dir=None):
+        on_progress(30, '查询出入记录')
+        return {'file_name': './result-files/admin/4.xlsx', 'status': 'success'}
+
+    jobs_module.fetch_main.process = fake_process
+    try:
+        manager = jobs_module.QueryJobManager(Database(db_path=os.path.join(tmp_dir, 'test.db')), max_workers=1)
+        job_id = manager.submit('admin', {'buildings': ['4'], 'username': 'admin',
+                                          'startTime': '23:20:00', 'endTime': '05:30:00'})
+        events = [json.loads(chunk[6:]) for chunk in progress.sse_stream(job_id, keepalive_seconds=5)
+                  if chunk.startswith('data: ')]
+        record('6.1 依次推送开始、阶段和结束事件', [e['stage'] for e in events] == ['start', 'stage', 'end'], str(events))
+        record('6.2 结束事件带 file_name', events[-1].get('file_name') == './result-files/admin/4.xlsx', str(events))
+    finally:
+        jobs_module.fetch_main.process = original
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    print("=" * 60)
+    print("测试查询进度事件")
+    print("=" * 60)
+    test_bus_subscribe_and_replay()
+    test_emit_context()
+    test_fetch_and_excel_events()
+    test_login_events()
+    test_sse_stream()
+    test_job_publishes_end()
+    print("\n" + "=" * 60)
+    print(f"测试结果汇总: {PASS} 通过, {FAIL} 失败, 共 {PASS + FAIL} 项")
+    print("=" * 60)
+    return 0 if FAIL == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
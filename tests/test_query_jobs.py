@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+验证页面查询后台任务：提交后立即返回任务 ID、进度和结果写入 query_jobs 表、重启后未完成任务重新入队、
+同一用户的任务输出到各自的目录、日期格式错误时不保存任务、过期任务连同报表目录一起清理。
+使用临时数据库，不访问公寓系统。
+"""
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+PASS = 0
+FAIL = 0
+
+
+def record(test_name, passed, detail=''):
+    global PASS, FAIL
+    if passed:
+        PASS += 1
+        print(f"  ✅ PASS {test_name}")
+    else:
+        FAIL += 1
+        print(f"  ❌ FAIL {test_name} - {detail}")
+
+
+def wait_for(manager, job_id, timeout=5):
+    """等待任务结束，返回任务状态"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job['state'] in ('success', 'failed'):
+            return job
+        time.sleep(0.02)
+    return manager.get(job_id)
+
+
+def request_data(building):
+    return {'buildings': [building], 'username': 'admin', 'startTime': '23:20:00', 'endTime': '05:30:00'}
+
+
+def test_submit_and_poll():
+    print("\n--- 提交任务并轮询结果 ---")
+    from database.db import Database
+    import scheduler.query_jobs as jobs_module
+
+    tmp_dir = tempfile.mkdtemp()
+    release = threading.Event()
+    original = jobs_module.fetch_main.process
+
+    def fake_process(data, on_progress=None, output_dir=None):
+        on_progress(30, '查询出入记录')
+        release.wait(5)
+        if data['buildings'] == ['9']:
+            return {'msg': '所有楼栋取数失败：楼栋9: 接口返回登录页', 'status': 'false'}
+        return {'file_name': f"./result-files/admin/{data['buildings'][0]}.xlsx", 'status': 'success'}
+
+    jobs_module.fetch_main.process = fake_process
+    try:
+        manager = jobs_module.QueryJobManager(Database(db_path=os.path.join(tmp_dir, 'test.db')), max_workers=1)
+        start = time.time()
+        job_id = manager.submit('admin', request_data('4'))
+        failed_id = manager.submit('admin', request_data('9'))
+        record('1.1 提交立即返回任务 ID', time.time() - start < 1 and len(job_id) == 32, job_id)
+
+        time.sleep(0.2)
+        running = manager.get(job_id)
+        queued = manager.get(failed_id)
+        record('1.2 执行中任务报告阶段进度', running['state'] == 'running' and running['progress'] == 30 and
+               running['message'] == '查询出入记录', str(running))
+        record('1.3 超出线程数的任务排队', queued['state'] == 'pending', str(queued))
+
+        release.set()
+        job = wait_for(manager, job_id)
+        record('1.4 成功任务返回 file_name', job['state'] == 'success' and job['progress'] == 100 and
+               job['file_name'] == './result-files/admin/4.xlsx', str(job))
+        job = wait_for(manager, failed_id)
+        record('1.5 失败任务返回失败原因', job['state'] == 'failed' and '楼栋9' in job['message'] and
+               job['file_name'] is None, str(job))
+        record('1.6 不存在的任务返回 None', manager.get('no-such-job') is None)
+    finally:
+        release.set()
+        jobs_module.fetch_main.process = original
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def test_exception_marks_failed():
+    print("\n--- 执行异常标记为失败 ---")
+    from database.db import Database
+    import scheduler.query_jobs as jobs_module
+
+    tmp_dir = tempfile.mkdtemp()
+    original = jobs_module.fetch_main.process
+
+    def broken_process(data, on_progress=None, output_dir=None):
+        raise RuntimeError('boom')
+
+    jobs_module.fetch_main.process = broken_process
+    try:
+        manager = jobs_module.QueryJobManager(Database(db_path=os.path.join(tmp_dir, 'test.db')), max_workers=1)
+        job = wait_for(manager, manager.submit('admin', request_data('4')))
+        record('2.1 异常任务状态为 failed', job['state'] == 'failed' and job['message'] == 'boom', str(job))
+    finally:
+        jobs_module.fetch_main.process = original
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def test_recover_after_restart():
+    print("\n--- 重启后未完成任务重新入队 ---")
+    from database.db import Database
+    import scheduler.query_jobs as jobs_module
+
+    tmp_dir = tempfile.mkdtemp()
+    original = jobs_module.fetch_main.process
+    calls = []
+
+    def fake_process(data, on_progress=None, output_dir=None):
+        calls.append(data['buildings'][0])
+        return {'file_name': f"./result-files/admin/{data['buildings'][0]}.xlsx", 'status': 'success'}
+
+    jobs_module.fetch_main.process = fake_process
+    try:
+        db = Database(db_path=os.path.join(tmp_dir, 'test.db'))
+        # 模拟上次服务停止时：一个任务执行到一半，一个还在排队，一个已完成
+        db.create_query_job('running-job', 'admin', request_data('4'))
+        db.update_query_job('running-job', status='running', progress=30)
+        db.create_query_job('pending-job', 'admin', request_data('5'))
+        db.create_query_job('done-job', 'admin', request_data('6'))
+        db.update_query_job('done-job', status='success', progress=100, file_name='./result-files/admin/6.xlsx')
+
+        manager = jobs_module.QueryJobManager(Database(db_path=os.path.join(tmp_dir, 'test.db')), max_workers=1)
+        count = manager.recover()
+        record('3.1 只重新入队未完成的任务', count == 2, str(count))
+        jobs = [wait_for(manager, job_id) for job_id in ('running-job', 'pending-job')]
+        record('3.2 重新入队的任务执行完成', all(job['state'] == 'success' for job in jobs), str(jobs))
+        record('3.3 已完成的任务不重复执行', sorted(calls) == ['4', '5'], str(calls))
+        record('3.4 重启后仍能查询已完成任务', manager.get('done-job')['file_name'] == './result-files/admin/6.xlsx')
+    finally:
+        jobs_module.fetch_main.process = original
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def test_job_output_dirs():
+    print("\n--- 同一用户的任务各自输出 ---")
+    from database.db import Database
+    import scheduler.query_jobs as jobs_module
+
+    tmp_dir = tempfile.mkdtemp()
+    original = jobs_module.fetch_main.process
+    output_dirs = {}
+
+    def fake_process(data, on_progress=None, output_dir=None):
+        output_dirs[data['buildings'][0]] = output_dir
+        return {'file_name': f"{output_dir}/滨海校区晚归名单.xlsx", 'status': 'success'}
+
+    jobs_module.fetch_main.process = fake_process
+    try:
+        manager = jobs_module.QueryJobManager(Database(db_path=os.path.join(tmp_dir, 'test.db')), max_workers=2)
+        job_ids = [manager.submit('admin', request_data(b)) for b in ('4', '5')]
+        jobs = [wait_for(manager, job_id) for job_id in job_ids]
+        record('4.1 每个任务的输出目录带任务 ID',
+               [output_dirs['4'], output_dirs['5']] == [f"./result-files/admin/{job_id}" for job_id in job_ids],
+               str(output_dirs))
+        record('4.2 同一用户的任务报表路径互不相同', jobs[0]['file_name'] != jobs[1]['file_name'], str(jobs))
+    finally:
+        jobs_module.fetch_main.process = original
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    import get_excel_data_curr.main as main_module
+
+    class FakeConfigTool:
+        def get_excel_write_only_threshold(self):
+            return 0
+
+        def get_report_cache_enabled(self):
+            return False
+
+    rendered = []
+    main_module._generate_report(FakeConfigTool(), {}, {}, request_data('4'),
+                                 lambda report_dir, threshold: rendered.append(report_dir), output_dir='./job-dir')
+    record('4.3 未启用报表缓存时写入调用方指定的目录', rendered == ['./job-dir'], str(rendered))
+
+
+def test_invalid_dates_and_sweep():
+    print("\n--- 日期格式错误与过期任务清理 ---")
+    from database.db import Database
+    import scheduler.query_jobs as jobs_module
+
+    tmp_dir = tempfile.mkdtemp()
+    original_dir = jobs_module.RESULT_DIR
+    jobs_module.RESULT_DIR = os.path.join(tmp_dir, 'result-files')
+    try:
+        db = Database(db_path=os.path.join(tmp_dir, 'test.db'))
+        manager = jobs_module.QueryJobManager(db, max_workers=1)
+        try:
+            manager.submit('admin', dict(request_data('4'), startDate='2026/04/01', endDate='2026-04-03'))
+            record('5.1 日期格式错误时拒绝提交', False, '未抛出异常')
+        except ValueError:
+            conn = db._get_conn()
+            count = conn.execute("SELECT COUNT(*) FROM query_jobs").fetchone()[0]
+            conn.close()
+            record('5.1 日期格式错误时拒绝提交且不保存任务', count == 0, str(count))
+
+        # 一个过期的已完成任务、一个过期但仍在执行的任务、一个刚完成的任务
+        for job_id, status in (('old-job', 'success'), ('old-running', 'running'), ('new-job', 'failed')):
+            db.create_query_job(job_id, 'admin', request_data('4'))
+            db.update_query_job(job_id, status=status)
+            os.makedirs(jobs_module.job_output_dir('admin', job_id))
+        conn = db._get_conn()
+        conn.execute("UPDATE query_jobs SET updated_at = datetime('now', 'localtime', '-100 hours') "
+                     "WHERE id IN ('old-job', 'old-running')")
+        conn.commit()
+        conn.close()
+
+        removed = manager.sweep()
+        record('5.2 只删除过期的已结束任务', removed == 1 and manager.get('old-job') is None and
+               manager.get('old-running') is not None and manager.get('new-job') is not None, str(removed))
+        record('5.3 同时删除任务的报表目录',
+               not os.path.exists(jobs_module.job_output_dir('admin', 'old-job')) and
+               os.path.isdir(jobs_module.job_output_dir('admin', 'new-job')))
+    finally:
+        jobs_module.RESULT_DIR = original_dir
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    print("=" * 60)
+    print("测试页面查询后台任务")
+    print("=" * 60)
+    test_submit_and_poll()
+    test_exception_marks_failed()
+    test_recover_after_restart()
+    test_job_output_dirs()
+    test_invalid_dates_and_sweep()
+    print("\n" + "=" * 60)
+    print(f"测试结果汇总: {PASS} 通过, {FAIL} 失败, 共 {PASS + FAIL} 项")
+    print("=" * 60)
+    return 0 if FAIL == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+验证出入记录本地缓存：已同步窗口直接读本地，重叠查询只补拉缺失时间段。
+使用临时数据库，不影响正式数据。
+"""
+import os
+import sys
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+PASS = 0
+FAIL = 0
+
+
+def record(test_name, passed, detail=''):
+    global PASS, FAIL
+    if passed:
+        PASS += 1
+        print(f"  ✅ PASS {test_name}")
+    else:
+        FAIL += 1
+        print(f"  ❌ FAIL {test_name} - {detail}")
+
+
+class FakeUpstream:
+    """按时间窗口返回预置记录，记录每次请求的窗口"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.windows = []
+
+    def deal(self, cookie, bid, b_num, request_data, **kwargs):
+        import get_excel_data_curr.t3 as t3_module
+        begin_time, end_time = t3_module.query_window(request_data)
+        self.windows.append((begin_time, end_time))
+        return [dict(r) for r in self.rows if begin_time <= r['passTimeText'] <= end_time]
+
+
+def make_row(user_id, pass_time):
+    return {'userId': user_id, 'passTimeText': pass_time, 'userName': f'学生{user_id}', 'roomName': '101'}
+
+
+def night(start_date, end_date):
+    return {'startDate': start_date, 'endDate': end_date, 'startTime': '23:20:00', 'endTime': '05:30:00'}
+
+
+def test_subtract_ranges():
+    print("\n--- 计算缺失时间段 ---")
+    from get_excel_data_curr.record_store import subtract_ranges
+
+    begin, end = '2026-04-01 23:20:00', '2026-04-03 05:30:00'
+    record('1.1 无缓存时整段缺失', subtract_ranges(begin, end, []) == [(begin, end)])
+    covered = [('2026-04-01 23:20:00', '2026-04-02 05:30:00')]
+    record('1.2 前段已同步只缺后段',
+           subtract_ranges(begin, end, covered) == [('2026-04-02 05:30:01', end)], str(subtract_ranges(begin, end, covered)))
+    covered = [('2026-04-02 00:00:00', '2026-04-02 01:00:00')]
+    record('1.3 中间已同步缺两端', subtract_ranges(begin, end, covered) == [
+        (begin, '2026-04-01 23:59:59'), ('2026-04-02 01:00:01', end)], str(subtract_ranges(begin, end, covered)))
+    covered = [('2026-04-01 00:00:00', '2026-04-05 00:00:00')]
+    record('1.4 完全覆盖无缺失', subtract_ranges(begin, end, covered) == [])
+
+
+def test_incremental_sync():
+    print("\n--- 增量同步 ---")
+    from database.db import Database
+    from get_excel_data_curr.record_store import RecordStore
+    import get_excel_data_curr.record_store as record_store_module
+
+    tmp_dir = tempfile.mkdtemp()
+    upstream = FakeUpstream([
+        make_row('001', '2026-04-01 23:40:00'),
+        make_row('002', '2026-04-02 01:10:00'),
+        make_row('003', '2026-04-02 23:50:00'),
+        make_row('001', '2026-04-03 00:30:00'),
+    ])
+    original_deal = record_store_module.t3.deal
+    record_store_module.t3.deal = upstream.deal
+    try:
+        store = RecordStore(Database(db_path=os.path.join(tmp_dir, 'test.db')), sync_lag_minutes=10)
+
+        rows = store.fetch('sid', 'bid-4', '4', night('2026-04-01', '2026-04-02'), {})
+        record('2.1 首次查询返回接口数据', [r['userId'] for r in rows] == ['001', '002'], str(rows))
+        record('2.2 首次查询请求整窗口', upstream.windows == [('2026-04-01 23:20:00', '2026-04-02 05:30:00')],
+               str(upstream.windows))
+
+        upstream.windows.clear()
+        rows = store.fetch('sid', 'bid-4', '4', night('2026-04-01', '2026-04-02'), {})
+        record('2.3 重复查询不请求接口', upstream.windows == [], str(upstream.windows))
+        record('2.4 重复查询结果一致', [r['userId'] for r in rows] == ['001', '002'], str(rows))
+
+        rows = store.fetch('sid', 'bid-4', '4', night('2026-04-01', '2026-04-03'), {})
+        record('2.5 扩大范围只补拉缺失时间段',
+               upstream.windows == [('2026-04-02 05:30:01', '2026-04-03 05:30:00')], str(upstream.windows))
+        record('2.6 合并后记录完整', [(r['userId'], r['passTimeText']) for r in rows] == [
+            ('001', '2026-04-01 23:40:00'), ('002', '2026-04-02 01:10:00'),
+            ('003', '2026-04-02 23:50:00'), ('001', '2026-04-03 00:30:00')], str(rows))
+        record('2.7 其他楼栋不受影响', store.missing_ranges('5', '2026-04-01 23:20:00', '2026-04-02 05:30:00') != [])
+    finally:
+        record_store_module.t3.deal = original_deal
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def test_recent_window_not_marked_complete():
+    print("\n--- 未稳定的数据不标记为已同步 ---")
+    from database.db import Database
+    from get_excel_data_curr.record_store import RecordStore, TIME_FORMAT
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        store = RecordStore(Database(db_path=os.path.join(tmp_dir, 'test.db')), sync_lag_minutes=10)
+        now = datetime.now()
+        begin = (now - timedelta(hours=2)).strftime(TIME_FORMAT)
+        end = (now + timedelta(hours=2)).strftime(TIME_FORMAT)
+        store.save('4', [make_row('001', (now - timedelta(hours=1)).strftime(TIME_FORMAT))], begin, end, synced_at=now)
+        gaps = store.missing_ranges('4', begin, end)
+        expected_start = (now - timedelta(minutes=10) + timedelta(seconds=1)).strftime(TIME_FORMAT)
+        record('3.1 只标记到同步时刻减入库延迟', gaps == [(expected_start, end)], str(gaps))
+
+        store.save('6', [{'userId': '001'}], begin, begin, synced_at=now)
+        record('3.2 记录缺少 passTimeText 时不标记', store.missing_ranges('6', begin, begin) == [(begin, begin)])
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+class ProbeUpstream(FakeUpstream):
+    """在 FakeUpstream 基础上支持 limit=1 探测"""
+
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.probes = 0
+
+    def fetch_total(self, cookie, bid, b_num, request_data, building_group_id=None):
+        import get_excel_data_curr.t3 as t3_module
+        self.probes += 1
+        begin_time, end_time = t3_module.query_window(request_data)
+        return sum(1 for r in self.rows if begin_time <= r['passTimeText'] <= end_time)
+
+
+def test_change_detection_probe():
+    print("\n--- 近期窗口复用前探测变化 ---")
+    from database.db import Database
+    from get_excel_data_curr.record_store import RecordStore, TIME_FORMAT
+    import get_excel_data_curr.record_store as record_store_module
+
+    tmp_dir = tempfile.mkdtemp()
+    now = datetime.now()
+    start = now - timedelta(hours=6)
+    end = now - timedelta(hours=1)
+    request = {'startDate': start.strftime('%Y-%m-%d'), 'startTime': start.strftime('%H:%M:%S'),
+               'endDate': end.strftime('%Y-%m-%d'), 'endTime': end.strftime('%H:%M:%S')}
+
+    def at(hours):
+        return (now - timedelta(hours=hours)).strftime(TIME_FORMAT)
+
+    upstream = ProbeUpstream([make_row('001', at(5)), make_row('002', at(4))])
+    original_deal, original_total = record_store_module.t3.deal, record_store_module.t3.fetch_total
+    record_store_module.t3.deal = upstream.deal
+    record_store_module.t3.fetch_total = upstream.fetch_total
+    try:
+        store = RecordStore(Database(db_path=os.path.join(tmp_dir, 'test.db')), sync_lag_minutes=10, probe_hours=24)
+        store.fetch('sid', 'bid-4', '4', request, {})
+
+        upstream.windows.clear()
+        rows = store.fetch('sid', 'bid-4', '4', request, {})
+        record('4.1 total 未变化只探测不重拉', upstream.probes == 1 and upstream.windows == [],
+               f"probes={upstream.probes}, windows={upstream.windows}")
+        record('4.2 total 未变化返回本地记录', [r['userId'] for r in rows] == ['001', '002'], str(rows))
+
+        # 新增记录不在末尾：接口未保证按时间升序，只能整窗口重拉
+        upstream.rows.insert(0, make_row('003', at(2)))
+        upstream.windows.clear()
+        rows = store.fetch('sid', 'bid-4', '4', request, {})
+        record('4.3 total 增长时整窗口重拉', len(upstream.windows) == 1, str(upstream.windows))
+        record('4.4 重拉后记录完整', [r['userId'] for r in rows] == ['003', '001', '002'] and
+               [r['userId'] for r in store.load('4', *record_store_module.t3.query_window(request))] ==
+               ['001', '002', '003'], str(rows))
+
+        upstream.rows.pop(1)
+        upstream.windows.clear()
+        rows = store.fetch('sid', 'bid-4', '4', request, {})
+        record('4.5 total 减少时整窗口重拉', len(upstream.windows) == 1, str(upstream.windows))
+        record('4.6 重拉后本地与接口一致', sorted(r['userId'] for r in rows) == ['002', '003'] and
+               [r['userId'] for r in store.load('4', *record_store_module.t3.query_window(request))] == ['002', '003'],
+               str(rows))
+
+        # 接口返回重复记录时本地去重后条数少于 total，按同步时的原始条数比较不应反复重拉
+        upstream.rows.append(make_row('002', at(4)))
+        store.fetch('sid', 'bid-4', '4', request, {})
+        upstream.windows.clear()
+        store.fetch('sid', 'bid-4', '4', request, {})
+        record('4.7 含重复记录的窗口 total 未变化时不重拉', upstream.windows == [], str(upstream.windows))
+
+        old_store = RecordStore(store.db, sync_lag_minutes=10, probe_hours=0)
+        upstream.probes = 0
+        old_store.fetch('sid', 'bid-4', '4', request, {})
+        record('4.8 probe_hours=0 时不探测', upstream.probes == 0)
+    finally:
+        record_store_module.t3.deal = original_deal
+        record_store_module.t3.fetch_total = original_total
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def test_fetch_total():
+    print("\n--- limit=1 探测记录总数 ---")
+    import get_excel_data_curr.t3 as t3_module
+
+    class FakeResponse:
+        status_code = 200
+        url = t3_module.API_URL
+        text = '{"total": 42, "rows": [{}]}'
+
+        def json(self):
+            return {'total': 42, 'rows': [{}]}
+
+    class FakeSession:
+        def __init__(self):
+            self.params = []
+
+        def get(self, url, params=None, **kwargs):
+            self.params.append(params)
+            return FakeResponse()
+
+    fake = FakeSession()
+    original = t3_module.http_client.get_session
+    t3_module.http_client.get_session = lambda retry=True: fake
+    try:
+        total = t3_module.fetch_total('sid', 'bid-4', '4', night('2026-04-01', '2026-04-02'))
+        record('5.1 返回接口 total', total == 42, str(total))
+        record('5.2 只请求 1 条', len(fake.params) == 1 and fake.params[0]['limit'] == 1, str(fake.params))
+    finally:
+        t3_module.http_client.get_session = original
+
+
+def main():
+    print("=" * 60)
+    print("测试出入记录本地缓存")
+    print("=" * 60)
+    test_subtract_ranges()
+    test_incremental_sync()
+    test_recent_window_not_marked_complete()
+    test_change_detection_probe()
+    test_fetch_total()
+    print("\n" + "=" * 60)
+    print(f"测试结果汇总: {PASS} 通过, {FAIL} 失败, 共 {PASS + FAIL} 项")
+    print("=" * 60)
+    return 0 if FAIL == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+验证报表缓存：相同输入复用同一文件，输入变化时重新生成，按大小和保留时长淘汰。
+使用临时目录，不影响 result-files。
+"""
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+PASS = 0
+FAIL = 0
+
+
+def record(test_name, passed, detail=''):
+    global PASS, FAIL
+    if passed:
+        PASS += 1
+        print(f"  ✅ PASS {test_name}")
+    else:
+        FAIL += 1
+        print(f"  ❌ FAIL {test_name} - {detail}")
+
+
+REQUEST = {'buildings': ['4'], 'startDate': '2026-04-01', 'endDate': '2026-04-02',
+           'startTime': '23:20:00', 'endTime': '05:30:00', 'username': 'alice'}
+
+
+def make_ret_dict():
+    return {'4': [{'userId': '001', 'userName': '张三', 'passTimeText': '2026-04-01 23:40:00', 'roomName': '101',
+                   'schoolInstituteName': '计算机科学与信息工程学院', 'grade': '2023', 'studentType': '本科生'}]}
+
+
+def test_report_key():
+    print("\n--- 缓存键 ---")
+    from get_excel_data_curr.report_cache import report_key
+
+    key = report_key(make_ret_dict(), {}, REQUEST)
+    record('1.1 相同输入键相同（与用户名无关）', key == report_key(make_ret_dict(), {}, dict(REQUEST, username='bob')))
+    changed = make_ret_dict()
+    changed['4'][0]['passTimeText'] = '2026-04-01 23:50:00'
+    record('1.2 记录变化键不同', key != report_key(changed, {}, REQUEST))
+    record('1.3 学院映射变化键不同', key != report_key(make_ret_dict(), {'计算机科学与信息工程学院': '计算机'}, REQUEST))
+    record('1.4 查询窗口变化键不同', key != report_key(make_ret_dict(), {}, dict(REQUEST, endTime='06:00:00')))
+
+
+def test_get_or_create_with_real_report():
+    print("\n--- 相同输入只渲染一次 ---")
+    from get_excel_data_curr.report_cache import ReportCache, report_key
+    from get_excel_data_curr.gen_excel_data_v1 import gen_excel_data_v1
+
+    tmp_dir = tempfile.mkdtemp()
+    renders = []
+    try:
+        cache = ReportCache(cache_dir=tmp_dir)
+
+        def render_for(username):
+            ret_dict = make_ret_dict()
+            key = report_key(ret_dict, {}, REQUEST)
+
+            def render(output_dir):
+                renders.append(username)
+                return gen_excel_data_v1(ret_dict, username, data_cfg={}, request_data=REQUEST, output_dir=output_dir)
+            return cache.get_or_create(key, render)
+
+        first = render_for('alice')
+        second = render_for('bob')
+        record('2.1 第一次生成报表文件', os.path.exists(first), first)
+        record('2.2 其他用户相同请求拿到同一文件', first == second, f"{first} / {second}")
+        record('2.3 只渲染一次', renders == ['alice'], str(renders))
+        record('2.4 不残留临时目录', not any('.tmp-' in name for name in os.listdir(tmp_dir)), str(os.listdir(tmp_dir)))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def put(cache, key, size):
+    def render(output_dir):
+        file_path = f"{output_dir}/report.xlsx"
+        with open(file_path, 'wb') as f:
+            f.write(b'x' * size)
+        return file_path
+    return cache.get_or_create(key, render)
+
+
+def test_eviction():
+    print("\n--- 淘汰 ---")
+    from get_excel_data_curr.report_cache import ReportCache
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        cache = ReportCache(cache_dir=tmp_dir, max_bytes=2500, max_age_hours=1)
+        put(cache, 'a', 1000)
+        put(cache, 'b', 1000)
+        past = time.time() - 10
+        os.utime(os.path.join(tmp_dir, 'a'), (past, past))
+        os.utime(os.path.join(tmp_dir, 'b'), (past + 5, past + 5))
+        cache.get('a')  # a 最近被使用
+        put(cache, 'c', 1000)
+        record('3.1 超过大小上限时删除最久未用的报表', sorted(os.listdir(tmp_dir)) == ['a', 'c'],
+               str(sorted(os.listdir(tmp_dir))))
+
+        old = time.time() - 2 * 3600
+        os.utime(os.path.join(tmp_dir, 'a'), (old, old))
+        cache.evict()
+        record('3.2 超过保留时长的报表被删除', sorted(os.listdir(tmp_dir)) == ['c'], str(sorted(os.listdir(tmp_dir))))
+
+        path = put(cache, 'big', 3000)
+        record('3.3 刚生成的报表超过大小上限时不被淘汰', os.path.exists(path) and sorted(os.listdir(tmp_dir)) == ['big'],
+               str(sorted(os.listdir(tmp_dir))))
+
+        original_utime = os.utime
+
+        def utime_after_evicted(path, *args, **kwargs):
+            shutil.rmtree(path, ignore_errors=True)
+            return original_utime(path, *args, **kwargs)
+
+        os.utime = utime_after_evicted
+        try:
+            hit = cache.get('big')
+        finally:
+            os.utime = original_utime
+        record('3.4 读取时条目被并发淘汰按未命中处理', hit is None, str(hit))
+
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        cache.evict()
+        record('3.5 缓存目录不存在时淘汰不报错', True)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    import get_excel_data_curr.main as main_module
+    from get_excel_data_curr import report_cache as report_cache_module
+
+    class FakeConfigTool:
+        def __init__(self, max_mb):
+            self.max_mb = max_mb
+
+        def get_report_cache_enabled(self):
+            return True
+
+        def get_report_cache_max_mb(self):
+            return self.max_mb
+
+        def get_report_cache_max_age_hours(self):
+            return 72
+
+    first = main_module._get_report_cache(FakeConfigTool(100))
+    second = main_module._get_report_cache(FakeConfigTool(50))
+    try:
+        record('3.6 各次查询共用同一个缓存实例（同一把淘汰锁）',
+               first is second is report_cache_module.report_cache and second.max_bytes == 50 * 1024 * 1024)
+    finally:
+        second.configure(200 * 1024 * 1024, 72)
+
+
+def main():
+    print("=" * 60)
+    print("测试报表缓存")
+    print("=" * 60)
+    test_report_key()
+    test_get_or_create_with_real_report()
+    test_eviction()
+    print("\n" + "=" * 60)
+    print(f"测试结果汇总: {PASS} 通过, {FAIL} 失败, 共 {PASS + FAIL} 项")
+    print("=" * 60)
+    return 0 if FAIL == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
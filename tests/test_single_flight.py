@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+验证相同查询合并执行：并发的相同请求只执行一次，结果和异常由所有等待者共用。
+"""
+import os
+import sys
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+PASS = 0
+FAIL = 0
+
+
+def record(test_name, passed, detail=''):
+    global PASS, FAIL
+    if passed:
+        PASS += 1
+        print(f"  ✅ PASS {test_name}")
+    else:
+        FAIL += 1
+        print(f"  ❌ FAIL {test_name} - {detail}")
+
+
+def run_concurrently(flight, key, func, count):
+    """同时发起 count 个相同调用，返回 [(result, shared) 或异常]"""
+    results = [None] * count
+    started = threading.Barrier(count)
+
+    def worker(i):
+        started.wait()
+        try:
+            results[i] = flight.do(key, func)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_query_key():
+    print("\n--- 合并键 ---")
+    from get_excel_data_curr.single_flight import query_key
+
+    a = {'buildings': ['5', '4'], 'startDate': '2026-04-01', 'endDate': '2026-04-02',
+         'startTime': '23:20:00', 'endTime': '05:30:00', 'username': 'alice'}
+    b = dict(a, buildings=['4', '5'], username='bob')
+    record('1.1 楼栋顺序和用户名不影响合并键', query_key(a) == query_key(b), f"{query_key(a)} / {query_key(b)}")
+    record('1.2 时间不同不合并', query_key(a) != query_key(dict(a, endTime='06:00:00')))
+    record('1.3 楼栋不同不合并', query_key(a) != query_key(dict(a, buildings=['4'])))
+    record('1.4 报表缓存未启用时不合并', query_key(a, report_cache_enabled=False) is None)
+
+
+def test_concurrent_calls_share_result():
+    print("\n--- 并发相同请求只执行一次 ---")
+    from get_excel_data_curr.single_flight import SingleFlight
+
+    flight = SingleFlight()
+    calls = []
+
+    def slow_process():
+        calls.append(1)
+        time.sleep(0.3)
+        return {'status': 'success', 'file_name': 'a.xlsx'}
+
+    results = run_concurrently(flight, ('4',), slow_process, 5)
+    record('2.1 process 只执行一次', len(calls) == 1, f"calls={len(calls)}")
+    record('2.2 所有请求拿到同一结果', all(r[0] == {'status': 'success', 'file_name': 'a.xlsx'} for r in results),
+           str(results))
+    record('2.3 只有一个请求是发起者', sum(1 for r in results if not r[1]) == 1, str(results))
+    record('2.4 执行结束后不再占用', flight.stats()['in_flight'] == 0, str(flight.stats()))
+
+    flight.do(('4',), slow_process)
+    record('2.5 之后的请求重新执行', len(calls) == 2, f"calls={len(calls)}")
+
+
+def test_different_keys_run_separately():
+    print("\n--- 不同请求互不合并 ---")
+    from get_excel_data_curr.single_flight import SingleFlight
+
+    flight = SingleFlight()
+    calls = []
+
+    def make(key):
+        def func():
+            calls.append(key)
+            time.sleep(0.1)
+            return key
+        return func
+
+    threads = [threading.Thread(target=flight.do, args=(k, make(k))) for k in ('a', 'b')]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    record('3.1 两个不同请求各执行一次', sorted(calls) == ['a', 'b'], str(calls))
+
+
+def test_error_shared():
+    print("\n--- 异常由所有等待者共用 ---")
+    from get_excel_data_curr.single_flight import SingleFlight
+
+    flight = SingleFlight()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        time.sleep(0.2)
+        raise RuntimeError('上游不可用')
+
+    results = run_concurrently(flight, 'k', failing, 3)
+    record('4.1 失败时也只执行一次', len(calls) == 1, f"calls={len(calls)}")
+    record('4.2 所有请求都收到异常', all(isinstance(r, RuntimeError) for r in results), str(results))
+    record('4.3 失败后键被释放', flight.stats()['in_flight'] == 0)
+
+
+def test_no_key_runs_directly():
+    print("\n--- 不合并的请求 ---")
+    from get_excel_data_curr.single_flight import SingleFlight
+
+    flight = SingleFlight()
+    calls = []
+
+    def slow_process():
+        calls.append(1)
+        time.sleep(0.2)
+        return {'status': 'success', 'file_name': f'{len(calls)}.xlsx'}
+
+    results = run_concurrently(flight, None, slow_process, 3)
+    record('5.1 合并键为 None 时各自执行', len(calls) == 3 and all(not r[1] for r in results), str(results))
+    record('5.2 不计入合并统计', flight.stats() == {'in_flight': 0, 'executions': 0, 'coalesced': 0},
+           str(flight.stats()))
+
+
+def main():
+    print("=" * 60)
+    print("测试相同查询合并执行")
+    print("=" * 60)
+    test_query_key()
+    test_concurrent_calls_share_result()
+    test_different_keys_run_separately()
+    test_error_shared()
+    test_no_key_runs_directly()
+    print("\n" + "=" * 60)
+    print(f"测试结果汇总: {PASS} 通过, {FAIL} 失败, 共 {PASS + FAIL} 项")
+    print("=" * 60)
+    return 0 if FAIL == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
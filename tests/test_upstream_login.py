@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+验证不启动浏览器的 CAS HTTP 登录流程、共享登录态缓存及共享连接池。
+"""
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+PASS = 0
+FAIL = 0
+
+CAS_URL = 'http://gygl.tust.edu.cn:8080/cas/login?service=http%3A%2F%2Fgygl.tust.edu.cn%3A8080%2Fda-roadgate-resident%2Findex'
+INDEX_URL = 'http://gygl.tust.edu.cn:8080/da-roadgate-resident/index'
+CAS_PAGE = """
+<html><body>
+<form id="fm1" action="/cas/login?service=http%3A%2F%2Fgygl.tust.edu.cn%3A8080%2Fda-roadgate-resident%2Findex" method="post">
+  <input id="username" name="username" type="text" value="">
+  <input id="password" name="password" type="password" value="">
+  <input type="checkbox" name="rememberMe" value="true">
+  <input type="hidden" name="lt" value="LT-123-abc">
+  <input type="hidden" name="execution" value="e1s1">
+  <input type="hidden" name="_eventId" value="submit">
+  <input class="btn-submit" name="submit" type="submit" value="登录">
+</form>
+</body></html>
+"""
+
+
+def record(test_name, passed, detail=''):
+    global PASS, FAIL
+    if passed:
+        PASS += 1
+        print(f"  ✅ PASS {test_name}")
+    else:
+        FAIL += 1
+        print(f"  ❌ FAIL {test_name} - {detail}")
+
+
+class FakeResponse:
+    def __init__(self, url, text='', status_code=200):
+        self.url = url
+        self.text = text
+        self.status_code = status_code
+
+
+class FakeSession:
+    """替代共享连接池会话，只需要 get 方法"""
+
+    def __init__(self, get):
+        self.get = get
+
+
+class FakeCasSession:
+    """模拟 CAS：正确密码时在 cookie 中写入 sid 并跳回业务系统"""
+    posts = []
+
+    def __init__(self, accept_password='right-pass'):
+        import requests
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self.headers = {}
+        self.accept_password = accept_password
+
+    def get(self, url, **kwargs):
+        return FakeResponse(CAS_URL, text=CAS_PAGE)
+
+    def post(self, url, data=None, **kwargs):
+        FakeCasSession.posts.append((url, dict(data)))
+        if data.get('password') != self.accept_password:
+            return FakeResponse(CAS_URL, text=CAS_PAGE)
+        self.cookies.set('JSESSIONID', 'cas-session', domain='gygl.tust.edu.cn', path='/cas')
+        self.cookies.set('sid', 'http-sid', domain='gygl.tust.edu.cn', path='/')
+        return FakeResponse(INDEX_URL, text='<title>公寓出入安全分析系统</title>')
+
+    def close(self):
+        pass
+
+
+def test_http_login_submits_hidden_fields():
+    print("\n--- HTTP 登录提交隐藏字段并取得 sid ---")
+    import get_excel_data_curr.cas_login as cas_login
+    from get_excel_data_curr import progress
+
+    original_session = cas_login.requests.Session
+    FakeCasSession.posts = []
+    cas_login.requests.Session = FakeCasSession
+    token = progress.bind('http-login-job')
+    try:
+        success, message, cookies, failure = cas_login.login_with_requests(INDEX_URL, 'user', 'right-pass',
+                                                                           retry_delay=0)
+    finally:
+        progress.unbind(token)
+        cas_login.requests.Session = original_session
+    subscriber = progress.progress_bus.subscribe('http-login-job')
+    events = []
+    while not subscriber.empty():
+        events.append(subscriber.get())
+    progress.progress_bus.close('http-login-job', {'message': '完成'})
+
+    posted_url, posted = FakeCasSession.posts[-1] if FakeCasSession.posts else ('', {})
+    record('1.1 登录成功', success is True and failure is None, message)
+    record('1.2 sid 排在第一位', bool(cookies) and cookies[0]['name'] == 'sid' and cookies[0]['value'] == 'http-sid', str(cookies))
+    record('1.3 提交 lt/execution/_eventId', posted.get('lt') == 'LT-123-abc' and posted.get('execution') == 'e1s1'
+           and posted.get('_eventId') == 'submit', str(posted))
+    record('1.4 提交账号密码', posted.get('username') == 'user' and posted.get('password') == 'right-pass', str(posted))
+    record('1.5 未勾选的 checkbox 不提交', 'rememberMe' not in posted, str(posted))
+    record('1.6 表单 action 解析为绝对地址', posted_url.startswith('http://gygl.tust.edu.cn:8080/cas/login'), posted_url)
+    record('1.7 发布登录尝试和成功事件', [(e['stage'], e['message']) for e in events] == [
+        ('login', '登录公寓系统（第 1/3 次尝试）'), ('login', '登录成功')], str(events))
+
+
+def test_http_login_wrong_password_not_retried():
+    print("\n--- 密码错误不重试 ---")
+    import get_excel_data_curr.cas_login as cas_login
+
+    original_session = cas_login.requests.Session
+    FakeCasSession.posts = []
+    cas_login.requests.Session = FakeCasSession
+    try:
+        success, message, cookies, failure = cas_login.login_with_requests(INDEX_URL, 'user', 'wrong-pass',
+                                                                           retry_delay=0)
+    finally:
+        cas_login.requests.Session = original_session
+
+    record('2.1 登录失败', success is False and cookies is None, message)
+    record('2.2 只提交一次', len(FakeCasSession.posts) == 1, str(len(FakeCasSession.posts)))
+    record('2.3 归类为账号密码错误', failure == cas_login.BAD_CREDENTIALS, str(failure))
+
+    class EncryptedFormSession(FakeCasSession):
+        """登录页要求页面脚本用 pwdEncryptSalt 加密密码"""
+        gets = 0
+
+        def get(self, url, **kwargs):
+            EncryptedFormSession.gets += 1
+            salt = '<input type="hidden" id="pwdEncryptSalt" name="pwdEncryptSalt" value="k">'
+            return FakeResponse(CAS_URL, text=CAS_PAGE.replace('</form>', salt + '</form>'))
+
+    FakeCasSession.posts = []
+    cas_login.requests.Session = EncryptedFormSession
+    try:
+        success, message, cookies, failure = cas_login.login_with_requests(INDEX_URL, 'user', 'right-pass',
+                                                                           retry_delay=0)
+    finally:
+        cas_login.requests.Session = original_session
+    record('2.4 密码需脚本加密的表单归类为不支持且不重试',
+           not success and failure == cas_login.UNSUPPORTED_FORM and EncryptedFormSession.gets == 1 and
+           FakeCasSession.posts == [], f"{failure}, gets={EncryptedFormSession.gets}, {message}")
+    record('2.5 未找到登录表单时归类为不支持', cas_login._unsupported_form_reason(None) is not None and
+           cas_login._unsupported_form_reason({'fields': {'username': '', 'password': ''}}) is None)
+
+
+def test_login_mode_dispatch():
+    print("\n--- login_mode 选择登录方式 ---")
+    import get_excel_data_curr.main as main_module
+
+    class ModeConfig:
+        def __init__(self, mode):
+            self.mode = mode
+
+        def get_login_mode(self):
+            return self.mode
+
+    calls = []
+    original_http = main_module.cas_login.login_with_requests
+    original_browser = main_module._login_with_browser
+    http_failure = [main_module.cas_login.RETRYABLE]
+    main_module.cas_login.login_with_requests = lambda *args, **kwargs: (
+        calls.append('http') or (False, 'HTTP 失败', None, http_failure[0]))
+    main_module._login_with_browser = lambda *args, **kwargs: (calls.append('browser') or (True, '登录成功', [{'name': 'sid', 'value': 's'}]))
+    try:
+        calls.clear()
+        success, _, _ = main_module._login(ModeConfig('auto'), INDEX_URL, 'u', 'p')
+        record('3.1 auto 模式 HTTP 失败后回退浏览器', success and calls == ['http', 'browser'], str(calls))
+
+        calls.clear()
+        success, _, _ = main_module._login(ModeConfig('http'), INDEX_URL, 'u', 'p')
+        record('3.2 http 模式不回退浏览器', not success and calls == ['http'], str(calls))
+
+        calls.clear()
+        main_module._login(ModeConfig('selenium'), INDEX_URL, 'u', 'p')
+        record('3.3 selenium 模式只走浏览器', calls == ['browser'], str(calls))
+
+        calls.clear()
+        http_failure[0] = main_module.cas_login.BAD_CREDENTIALS
+        success, _, _ = main_module._login(ModeConfig('auto'), INDEX_URL, 'u', 'p')
+        record('3.5 auto 模式账号密码错误时不回退浏览器', not success and calls == ['http'], str(calls))
+
+        calls.clear()
+        http_failure[0] = main_module.cas_login.UNSUPPORTED_FORM
+        success, _, _ = main_module._login(ModeConfig('auto'), INDEX_URL, 'u', 'p')
+        record('3.6 auto 模式表单不支持时直接改用浏览器', success and calls == ['http', 'browser'], str(calls))
+    finally:
+        main_module.cas_login.login_with_requests = original_http
+        main_module._login_with_browser = original_browser
+
+    record('3.4 _extract_sid 按名称取 sid',
+           main_module._extract_sid([{'name': 'JSESSIONID', 'value': 'x'}, {'name': 'sid', 'value': 'y'}]) == 'y')
+
+
+def test_session_store_reuse_and_refresh():
+    print("\n--- 共享登录态缓存 ---")
+    from get_excel_data_curr.session_store import SessionStore
+
+    store = SessionStore()
+    logins = []
+    valid = {'ok': True}
+
+    def login_func():
+        logins.append(1)
+        return (True, '登录成功', f'sid-{len(logins)}')
+
+    _, _, sid1 = store.get_sid(login_func, lambda sid: valid['ok'], validate_interval=0)
+    _, _, sid2 = store.get_sid(login_func, lambda sid: valid['ok'], validate_interval=0)
+    record('4.1 第二次复用同一 sid', sid1 == sid2 == 'sid-1' and len(logins) == 1, f'{sid1} {sid2} {len(logins)}')
+
+    valid['ok'] = False
+    _, _, sid3 = store.get_sid(login_func, lambda sid: valid['ok'], validate_interval=0)
+    record('4.2 校验失败后重新登录', sid3 == 'sid-2' and len(logins) == 2, sid3)
+
+    _, _, sid4 = store.get_sid(login_func, lambda sid: False, validate_interval=3600)
+    record('4.3 免校验窗口内不发探测请求', sid4 == 'sid-2', sid4)
+
+    store.invalidate('other-sid')
+    record('4.4 作废其他 sid 不影响当前缓存', store.stats()['has_session'])
+    store.invalidate('sid-2')
+    record('4.5 作废当前 sid', not store.stats()['has_session'])
+
+    stats = store.stats()
+    record('4.6 统计计数', (stats['hits'], stats['misses'], stats['refreshes']) == (2, 2, 2), str(stats))
+
+    failed = store.get_sid(lambda: (False, '登录失败', None), lambda sid: True)
+    record('4.7 登录失败透传错误', failed == (False, '登录失败', None) and store.stats()['login_failures'] == 1, str(failed))
+
+    store = SessionStore()
+    checks = []
+
+    def validate(sid):
+        checks.append(sid)
+        return True
+
+    store.get_sid(lambda: (True, '登录成功', 'sid-steady'), validate, validate_interval=0.2)
+    deadline = time.time() + 0.5
+    while time.time() < deadline:
+        store.get_sid(login_func, validate, validate_interval=0.2)
+        time.sleep(0.05)
+    record('4.8 持续复用时每隔 validate_interval 仍会校验', len(checks) >= 2, str(len(checks)))
+
+
+def test_is_session_valid():
+    print("\n--- limit=1 校验 sid ---")
+    import get_excel_data_curr.t3 as t3_module
+
+    class ApiResponse:
+        def __init__(self, url, payload):
+            self.url = url
+            self.status_code = 200
+            self.history = []
+            self._payload = payload
+
+        def json(self):
+            if isinstance(self._payload, Exception):
+                raise self._payload
+            return self._payload
+
+    captured = {}
+
+    def fake_get(url, params=None, **kwargs):
+        captured['params'] = params
+        return ApiResponse(url, {'total': 3, 'rows': []})
+
+    original_get_session = t3_module.http_client.get_session
+    try:
+        t3_module.http_client.get_session = lambda retry=True: FakeSession(fake_get)
+        record('5.1 有效 sid 返回 True', t3_module.is_session_valid('sid') is True)
+        record('5.2 探测请求 limit=1', captured['params'].get('limit') == 1, str(captured))
+        t3_module.http_client.get_session = lambda retry=True: FakeSession(lambda *args, **kwargs: ApiResponse(CAS_URL, ValueError('not json')))
+        record('5.3 跳转登录页返回 False', t3_module.is_session_valid('sid') is False)
+    finally:
+        t3_module.http_client.get_session = original_get_session
+
+    record('5.4 SessionExpiredError 属于 DataFetchError',
+           issubclass(t3_module.SessionExpiredError, t3_module.DataFetchError))
+
+
+def test_shared_http_session():
+    print("\n--- 共享 HTTP 连接池 ---")
+    from get_excel_data_curr import http_client
+
+    http_client.configure(pool_size=8, retry_total=1)
+    session = http_client.get_session()
+    adapter = session.get_adapter('http://gygl.tust.edu.cn:8080/')
+    record('6.1 多次获取为同一会话', http_client.get_session() is session)
+    record('6.2 连接池大小按配置', adapter._pool_maxsize == 8, str(adapter._pool_maxsize))
+    record('6.3 重试次数按配置', adapter.max_retries.total == 1, str(adapter.max_retries.total))
+
+    http_client.configure(pool_size=8, retry_total=1)
+    record('6.4 配置不变时保留原会话', http_client.get_session() is session)
+    http_client.configure(pool_size=4, retry_total=1)
+    record('6.5 配置变化时重建会话', http_client.get_session() is not session)
+
+    import email
+    import requests
+    from requests.cookies import extract_cookies_to_jar
+
+    class OriginalResponse:
+        msg = email.message_from_string('Set-Cookie: sid=leaked; Path=/\n\n')
+
+    class SetCookieResponse:
+        _original_response = OriginalResponse()
+
+    request = requests.Request('GET', 'http://gygl.tust.edu.cn:8080/da-roadgate-resident/index').prepare()
+    plain_jar = requests.cookies.RequestsCookieJar()
+    extract_cookies_to_jar(plain_jar, request, SetCookieResponse())
+    session = http_client.get_session()
+    extract_cookies_to_jar(session.cookies, request, SetCookieResponse())
+    record('6.6 响应中的 Set-Cookie 不写入共享会话',
+           plain_jar.get('sid') == 'leaked' and session.cookies.get('sid') is None)
+    http_client.configure()
+
+
+def main():
+    print("=" * 60)
+    print("测试 CAS HTTP 登录")
+    print("=" * 60)
+    test_http_login_submits_hidden_fields()
+    test_http_login_wrong_password_not_retried()
+    test_login_mode_dispatch()
+    test_session_store_reuse_and_refresh()
+    test_is_session_valid()
+    test_shared_http_session()
+    print("\n" + "=" * 60)
+    print(f"测试结果汇总: {PASS} 通过, {FAIL} 失败, 共 {PASS + FAIL} 项")
+    print("=" * 60)
+    return 0 if FAIL == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())